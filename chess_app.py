@@ -1,199 +1,139 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, Response, render_template, request, jsonify, session
 from flask_socketio import SocketIO, emit, join_room, leave_room
+from socketio import PubSubManager
 import json
+import os
 import uuid
 from datetime import datetime
 
+from chess_engine import ChessGame
+from chess_engine.analysis import (
+    DEFAULT_ANALYSIS_DEPTH, DEFAULT_ANALYSIS_TIME, MAX_ANALYSIS_DEPTH, MAX_ANALYSIS_TIME, MAX_BATCH_POSITIONS,
+    MAX_BATCH_TIME,
+    BatchAnalyzer,
+)
+from chess_engine.archive import ArchivedGame, open_archive
+from chess_engine.book import DEFAULT_BOOK_PATH, load_opening_book
+from chess_engine.clock import FlagScheduler, TimeControl
+from chess_engine.cluster import create_message_queue
+from chess_engine.fanout import DEFAULT_INTERVAL, SpectatorFanout
+from chess_engine.game import TIME_FORFEIT
+from chess_engine.game_index import FINISHED_RESULTS, MemoryGameIndex, create_game_index, opening_key
+from chess_engine.locks import GameLocks
+from chess_engine.matchmaking import DEFAULT_RATING, MATCH_TICK, MAX_RATING, MIN_RATING, MatchmakingQueue
+from chess_engine.parallel import create_parallel_search
+from chess_engine.rules import TERMINATIONS
+from chess_engine.search import DIFFICULTY_LEVELS, search_position
+from chess_engine.store import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, SEAT_BITS, STATUSES, GameConflictError, MemoryGameStore,
+    create_game_store,
+)
+from chess_engine.tablebase import load_tablebase
+
+# Queues Flask-SocketIO connects to itself
+BROKER_SCHEMES = ('redis', 'rediss', 'amqp', 'kafka')
+
+class QueueClientManager(PubSubManager):
+    """Socket.IO client manager that relays emits through a chess_engine.cluster queue"""
+    name = 'chess_queue'
+
+    def __init__(self, queue, channel='socketio', write_only=False):
+        self.queue = queue
+        super().__init__(channel=channel, write_only=write_only)
+
+    def _publish(self, data):
+        self.queue.publish(data)
+
+    def _listen(self):
+        yield from self.queue.listen()
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
-socketio = SocketIO(app, cors_allowed_origins="*")
-
-# Store active games
-games = {}
-
-class ChessGame:
-    def __init__(self, game_id):
-        self.game_id = game_id
-        self.board = self.initialize_board()
-        self.current_player = 'white'
-        self.move_history = []
-        self.game_over = False
-        self.players = {'white': None, 'black': None}
-        self.created_at = datetime.now()
-        
-    def initialize_board(self):
-        return [
-            ['r', 'n', 'b', 'q', 'k', 'b', 'n', 'r'],
-            ['p', 'p', 'p', 'p', 'p', 'p', 'p', 'p'],
-            ['', '', '', '', '', '', '', ''],
-            ['', '', '', '', '', '', '', ''],
-            ['', '', '', '', '', '', '', ''],
-            ['', '', '', '', '', '', '', ''],
-            ['P', 'P', 'P', 'P', 'P', 'P', 'P', 'P'],
-            ['R', 'N', 'B', 'Q', 'K', 'B', 'N', 'R']
-        ]
-    
-    def make_move(self, from_row, from_col, to_row, to_col, promotion_piece=None):
-        piece = self.board[from_row][from_col]
-        if not piece:
-            return False, "No piece at source position"
-            
-        # Validate move
-        if not self.is_valid_move(from_row, from_col, to_row, to_col):
-            return False, "Invalid move"
-            
-        # Execute move
-        target_piece = self.board[to_row][to_col]
-        self.board[from_row][from_col] = ''
-        
-        if promotion_piece and piece.lower() == 'p' and (to_row == 0 or to_row == 7):
-            self.board[to_row][to_col] = promotion_piece
-        else:
-            self.board[to_row][to_col] = piece
-            
-        # Record move
-        move_data = {
-            'from': [from_row, from_col],
-            'to': [to_row, to_col],
-            'piece': piece,
-            'captured': target_piece,
-            'promotion': promotion_piece,
-            'timestamp': datetime.now().isoformat()
-        }
-        self.move_history.append(move_data)
-        
-        # Switch players
-        self.current_player = 'black' if self.current_player == 'white' else 'white'
-        
-        # Check game end conditions
-        self.check_game_end()
-        
-        return True, "Move successful"
-    
-    def is_valid_move(self, from_row, from_col, to_row, to_col):
-        piece = self.board[from_row][from_col]
-        if not piece:
-            return False
-            
-        # Basic validation - piece belongs to current player
-        is_white_piece = piece == piece.upper()
-        if (self.current_player == 'white' and not is_white_piece) or \
-           (self.current_player == 'black' and is_white_piece):
-            return False
-            
-        # Check if target is own piece
-        target_piece = self.board[to_row][to_col]
-        if target_piece:
-            is_target_white = target_piece == target_piece.upper()
-            if is_white_piece == is_target_white:
-                return False
-                
-        # Piece-specific validation
-        piece_type = piece.lower()
-        if piece_type == 'p':
-            return self.is_valid_pawn_move(from_row, from_col, to_row, to_col)
-        elif piece_type == 'r':
-            return self.is_valid_rook_move(from_row, from_col, to_row, to_col)
-        elif piece_type == 'n':
-            return self.is_valid_knight_move(from_row, from_col, to_row, to_col)
-        elif piece_type == 'b':
-            return self.is_valid_bishop_move(from_row, from_col, to_row, to_col)
-        elif piece_type == 'q':
-            return self.is_valid_queen_move(from_row, from_col, to_row, to_col)
-        elif piece_type == 'k':
-            return self.is_valid_king_move(from_row, from_col, to_row, to_col)
-            
-        return False
-    
-    def is_valid_pawn_move(self, from_row, from_col, to_row, to_col):
-        piece = self.board[from_row][from_col]
-        is_white = piece == 'P'
-        direction = -1 if is_white else 1
-        start_row = 6 if is_white else 1
-        
-        row_diff = to_row - from_row
-        col_diff = abs(to_col - from_col)
-        target_piece = self.board[to_row][to_col]
-        
-        # Forward move
-        if col_diff == 0 and not target_piece:
-            if row_diff == direction:
-                return True
-            if from_row == start_row and row_diff == 2 * direction:
-                return not self.board[from_row + direction][from_col]
-        
-        # Capture move
-        if col_diff == 1 and row_diff == direction and target_piece:
-            return True
-            
-        return False
-    
-    def is_valid_rook_move(self, from_row, from_col, to_row, to_col):
-        if from_row != to_row and from_col != to_col:
-            return False
-        return self.is_path_clear(from_row, from_col, to_row, to_col)
-    
-    def is_valid_knight_move(self, from_row, from_col, to_row, to_col):
-        row_diff = abs(to_row - from_row)
-        col_diff = abs(to_col - from_col)
-        return (row_diff == 2 and col_diff == 1) or (row_diff == 1 and col_diff == 2)
-    
-    def is_valid_bishop_move(self, from_row, from_col, to_row, to_col):
-        if abs(to_row - from_row) != abs(to_col - from_col):
-            return False
-        return self.is_path_clear(from_row, from_col, to_row, to_col)
-    
-    def is_valid_queen_move(self, from_row, from_col, to_row, to_col):
-        return self.is_valid_rook_move(from_row, from_col, to_row, to_col) or \
-               self.is_valid_bishop_move(from_row, from_col, to_row, to_col)
-    
-    def is_valid_king_move(self, from_row, from_col, to_row, to_col):
-        row_diff = abs(to_row - from_row)
-        col_diff = abs(to_col - from_col)
-        return row_diff <= 1 and col_diff <= 1
-    
-    def is_path_clear(self, from_row, from_col, to_row, to_col):
-        row_step = 0 if from_row == to_row else (to_row - from_row) // abs(to_row - from_row)
-        col_step = 0 if from_col == to_col else (to_col - from_col) // abs(to_col - from_col)
-        
-        current_row = from_row + row_step
-        current_col = from_col + col_step
-        
-        while current_row != to_row or current_col != to_col:
-            if self.board[current_row][current_col]:
-                return False
-            current_row += row_step
-            current_col += col_step
-            
-        return True
-    
-    def check_game_end(self):
-        # Basic implementation - could be enhanced with proper checkmate detection
-        if not self.has_valid_moves():
-            self.game_over = True
-    
-    def has_valid_moves(self):
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece:
-                    is_white_piece = piece == piece.upper()
-                    if ((self.current_player == 'white' and is_white_piece) or
-                        (self.current_player == 'black' and not is_white_piece)):
-                        for to_row in range(8):
-                            for to_col in range(8):
-                                if self.is_valid_move(row, col, to_row, to_col):
-                                    return True
-        return False
-    
-    def get_game_state(self):
-        return {
-            'board': self.board,
-            'current_player': self.current_player,
-            'move_history': self.move_history,
-            'game_over': self.game_over,
-            'players': self.players
-        }
+
+# Cross-worker room broadcasts: CHESS_MESSAGE_QUEUE=redis://..., amqp://...,
+# unix:///path/to/hub.sock (python -m chess_engine.cluster hub) or local
+message_queue = os.environ.get('CHESS_MESSAGE_QUEUE')
+if not message_queue:
+    socketio = SocketIO(app, cors_allowed_origins="*")
+elif message_queue.split(':', 1)[0] in BROKER_SCHEMES:
+    socketio = SocketIO(app, cors_allowed_origins="*", message_queue=message_queue)
+else:
+    socketio = SocketIO(app, cors_allowed_origins="*",
+                        client_manager=QueueClientManager(create_message_queue(message_queue)))
+
+# Game store: in-memory LRU by default, or CHESS_GAME_STORE=sqlite:///games.db
+games = create_game_store(os.environ.get('CHESS_GAME_STORE', 'memory'))
+
+# Workers behind a load balancer must share games and broadcasts
+if int(os.environ.get('CHESS_WORKERS', '1')) > 1:
+    if isinstance(games, MemoryGameStore):
+        raise RuntimeError("CHESS_WORKERS > 1 needs a shared CHESS_GAME_STORE, e.g. sqlite:///games.db")
+    if not message_queue:
+        raise RuntimeError("CHESS_WORKERS > 1 needs CHESS_MESSAGE_QUEUE for cross-worker broadcasts")
+
+# Opening book consulted before searching: CHESS_OPENING_BOOK=path/to/book.bin,
+# or the bundled book of main lines
+opening_book = load_opening_book(os.environ.get('CHESS_OPENING_BOOK', DEFAULT_BOOK_PATH))
+
+# Endgame tables (python -m chess_engine.tablebase build tablebases/); the
+# engine answers covered positions from them instead of searching
+tablebase = load_tablebase(os.environ.get('CHESS_TABLEBASE_DIR', 'tablebases'))
+
+# Lazy SMP: CHESS_SEARCH_WORKERS=N searches each engine move on N processes
+# sharing one transposition table; 1 (the default) searches in the request
+search_pool = create_parallel_search(int(os.environ.get('CHESS_SEARCH_WORKERS', '1')), tablebase)
+
+# Process pool behind /api/analyze/batch: CHESS_ANALYSIS_WORKERS processes
+# (default: one per core), started on the first batch
+batch_analyzer = BatchAnalyzer(int(os.environ.get('CHESS_ANALYSIS_WORKERS', '0')) or None, tablebase)
+
+# Finished games are appended to a compact binary archive when
+# CHESS_ARCHIVE=path/to/games.archive (one file per worker process)
+game_archive = open_archive(os.environ.get('CHESS_ARCHIVE'))
+
+# Finished games indexed for /api/search/games, next to the games in SQLite
+# or in memory; an in-memory index holds the newest games and is rebuilt
+# from the end of the archive
+game_index = create_game_index(os.environ.get('CHESS_GAME_STORE', 'memory'))
+if game_archive is not None and isinstance(game_index, MemoryGameIndex):
+    game_index.add_all(game_archive.recent(game_index.max_games))
+
+# Flag-fall of every timed game is watched by one heap and one thread
+flag_scheduler = FlagScheduler(lambda game_id: on_flag_deadline(game_id))
+
+# Spectators (watch_game) get one coalesced spectator_update frame per game
+# every CHESS_SPECTATOR_INTERVAL seconds (0 sends each change at once),
+# flushed by a background task started with the first frame
+spectators = SpectatorFanout(
+    socketio.server, float(os.environ.get('CHESS_SPECTATOR_INTERVAL', DEFAULT_INTERVAL)),
+    relay=(lambda event, data, room: socketio.emit(event, data, room=room)) if message_queue else None,
+    start_flusher=lambda fanout: socketio.start_background_task(spectator_loop, fanout))
+
+# Players waiting for an opponent through the seek event, paired in
+# batches every MATCH_TICK seconds by a background task started on the first seek
+matchmaker = MatchmakingQueue()
+matchmaking_task = None
+
+# Changes to one game run one at a time under its lock; different games
+# change in parallel. Reads of a game's state take it too, so they never
+# see a half-played move.
+game_locks = GameLocks()
+
+# Returned when another worker changed a game first; the client resyncs and retries
+CONFLICT_MESSAGE = 'Game changed on another worker; sync and retry'
+# Returned when a request's expected_ply no longer matches the game
+STALE_PLY_MESSAGE = 'Game is no longer at the expected ply; sync and retry'
+# Returned when a move lands on the game while the engine was searching
+SEARCH_CONFLICT_MESSAGE = 'Game changed during the engine search; sync and retry'
+RETRY_MESSAGES = (CONFLICT_MESSAGE, STALE_PLY_MESSAGE, SEARCH_CONFLICT_MESSAGE)
+
+# Longest player name accepted by join_game and seek
+MAX_PLAYER_NAME = 64
+
+# The lobby polls the same few listing queries; each page is kept, already
+# serialized, until the store's listing version moves on
+listing_cache = {}
+LISTING_CACHE_SIZE = 256
 
 @app.route('/')
 def home():
@@ -201,82 +141,713 @@ def home():
 
 @app.route('/api/games', methods=['GET'])
 def get_games():
-    game_list = []
-    for game_id, game in games.items():
-        game_list.append({
-            'id': game_id,
-            'players': game.players,
-            'created_at': game.created_at.isoformat(),
-            'game_over': game.game_over
-        })
-    return jsonify(game_list)
+    args = request.args
+    status = args.get('status')
+    if status is not None and status not in STATUSES:
+        return jsonify({'error': f"Unknown status '{status}'"}), 400
+    open_seat = args.get('open_seat')
+    if open_seat is not None and open_seat != 'any' and open_seat not in SEAT_BITS:
+        return jsonify({'error': f"Unknown seat '{open_seat}'"}), 400
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+        created_after = _timestamp_arg('created_after')
+        created_before = _timestamp_arg('created_before')
+    except ValueError:
+        return jsonify({'error': 'Invalid limit or timestamp'}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
+
+    query = (status, open_seat, created_after, created_before, args.get('cursor'), limit)
+    version = games.listing_version()
+    cached = listing_cache.get(query)
+    if cached is None or cached[0] != version:
+        try:
+            page, next_cursor = games.list_games(*query)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if len(listing_cache) >= LISTING_CACHE_SIZE:
+            listing_cache.clear()
+        cached = listing_cache[query] = (version, json.dumps({'games': page, 'next_cursor': next_cursor}))
+
+    response = Response(cached[1], mimetype='application/json')
+    response.set_etag(str(version))
+    return response.make_conditional(request)
+
+def _timestamp_arg(name):
+    # Normalized so stores can compare ISO timestamps as strings
+    value = request.args.get(name)
+    return None if value is None else datetime.fromisoformat(value).isoformat()
 
 @app.route('/api/games', methods=['POST'])
 def create_game():
+    data = request.get_json(silent=True) or {}
     game_id = str(uuid.uuid4())
-    games[game_id] = ChessGame(game_id)
+    game = ChessGame(game_id)
+    if data.get('time_control') is not None:
+        try:
+            game.set_time_control(TimeControl.parse(data['time_control']))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    games[game_id] = game
     return jsonify({'game_id': game_id})
 
+@app.route('/api/games/from_fen', methods=['POST'])
+def create_game_from_fen():
+    data = request.get_json(silent=True) or {}
+    fen = data.get('fen')
+    if not isinstance(fen, str):
+        return jsonify({'error': 'Missing fen'}), 400
+    game_id = str(uuid.uuid4())
+    try:
+        game = ChessGame.from_fen(game_id, fen)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    games[game_id] = game
+    return jsonify({'game_id': game_id, 'fen': game.to_fen()})
+
+@app.route('/api/games/from_pgn', methods=['POST'])
+def create_game_from_pgn():
+    data = request.get_json(silent=True)
+    pgn = data.get('pgn') if isinstance(data, dict) else request.get_data(as_text=True)
+    if not pgn or not isinstance(pgn, str):
+        return jsonify({'error': 'Missing pgn'}), 400
+    game_id = str(uuid.uuid4())
+    try:
+        game = ChessGame.from_pgn(game_id, pgn)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    games[game_id] = game
+    return jsonify({'game_id': game_id, 'fen': game.to_fen(), 'moves': len(game.move_history)})
+
 @app.route('/api/games/<game_id>', methods=['GET'])
 def get_game(game_id):
-    if game_id not in games:
-        return jsonify({'error': 'Game not found'}), 404
-    return jsonify(games[game_id].get_game_state())
+    with game_locks(game_id):
+        game = games.get(game_id)
+        if game is None:
+            return jsonify({'error': 'Game not found'}), 404
+        return jsonify(game.get_game_state())
+
+@app.route('/api/games/<game_id>/fen', methods=['GET'])
+def get_game_fen(game_id):
+    with game_locks(game_id):
+        game = games.get(game_id)
+        if game is None:
+            return jsonify({'error': 'Game not found'}), 404
+        return jsonify({'fen': game.to_fen()})
+
+@app.route('/api/games/<game_id>/pgn', methods=['GET'])
+def download_pgn(game_id):
+    with game_locks(game_id):
+        game = games.get(game_id)
+        if game is None:
+            return jsonify({'error': 'Game not found'}), 404
+        pgn = game.to_pgn()
+    return Response(pgn, mimetype='application/x-chess-pgn',
+                    headers={'Content-Disposition': f'attachment; filename="{game_id}.pgn"'})
 
 @app.route('/api/games/<game_id>/move', methods=['POST'])
 def make_move(game_id):
-    if game_id not in games:
-        return jsonify({'error': 'Game not found'}), 404
-        
-    data = request.get_json()
-    from_row = data.get('from_row')
-    from_col = data.get('from_col')
-    to_row = data.get('to_row')
-    to_col = data.get('to_col')
-    promotion_piece = data.get('promotion_piece')
-    
-    game = games[game_id]
-    success, message = game.make_move(from_row, from_col, to_row, to_col, promotion_piece)
-    
-    if success:
-        # Emit move to all players in the game room
-        socketio.emit('move_made', {
+    data = request.get_json(silent=True) or {}
+    # Held through the broadcast, so the room hears moves in the order they were played
+    with game_locks(game_id):
+        game = games.get(game_id)
+        if game is None:
+            return jsonify({'error': 'Game not found'}), 404
+
+        success, message = play_requested_move(game, data)
+
+        if success:
+            broadcast_move(game_id, game)
+            return jsonify({'success': True, 'message': message, 'version': game.version, 'ply': game.ply})
+        else:
+            return refused(game_id, message)
+
+@app.route('/api/games/<game_id>/engine_move', methods=['POST'])
+def engine_move(game_id):
+    data = request.get_json(silent=True) or {}
+    difficulty = data.get('difficulty', 'medium')
+    if difficulty not in DIFFICULTY_LEVELS:
+        return jsonify({'error': f"Unknown difficulty '{difficulty}'"}), 400
+
+    with game_locks(game_id):
+        game = games.get(game_id)
+        if game is None:
+            return jsonify({'error': 'Game not found'}), 404
+        if game.game_over:
+            return jsonify({'success': False, 'message': 'Game is over'}), 400
+        if game.check_flag():
+            announce_flag(game)
+            return jsonify({'success': False, 'message': TIME_FORFEIT}), 400
+        error = ply_mismatch(game, data)
+        if error:
+            return refused(game_id, error)
+        # The search runs on a copy without the lock, so moves on other
+        # requests are not held up behind it
+        position = game.position.copy()
+        version = game.version
+
+    # Book hits skip the search entirely
+    move = None
+    if opening_book is not None and data.get('use_book', True):
+        move = opening_book.choose(position)
+    result = None
+    if move is None:
+        if search_pool is not None:
+            result = search_pool.search_position(position, difficulty)
+        else:
+            result = search_position(position, difficulty, tablebase=tablebase)
+        move = result.move
+    from_row, from_col = divmod(move & 63, 8)
+    to_row, to_col = divmod((move >> 6) & 63, 8)
+
+    with game_locks(game_id):
+        game = games.get(game_id)
+        if game is None:
+            return jsonify({'error': 'Game not found'}), 404
+        if game.version != version:
+            return refused(game_id, SEARCH_CONFLICT_MESSAGE)
+        success, message = game.play_move(move)
+        if not success:
+            return jsonify({'success': False, 'message': message}), 500
+        try:
+            games.save_move(game)
+        except GameConflictError:
+            return refused(game_id, CONFLICT_MESSAGE)
+
+        record_finished(game)
+        schedule_flag(game)
+        broadcast_move(game_id, game)
+        return jsonify({
+            'success': True,
+            'version': game.version,
+            'ply': game.ply,
             'from': [from_row, from_col],
             'to': [to_row, to_col],
-            'piece': game.board[to_row][to_col],
+            'promotion': game.move_history[-1]['promotion'],
+            'book': result is None,
+            'search': result.to_dict() if result else None,
             'current_player': game.current_player,
             'game_over': game.game_over
-        }, room=game_id)
-        
-        return jsonify({'success': True, 'message': message})
-    else:
+        })
+
+@app.route('/api/games/<game_id>/book', methods=['GET'])
+def get_book_moves(game_id):
+    # book_moves plays and takes back moves on the game's position
+    with game_locks(game_id):
+        game = games.get(game_id)
+        if game is None:
+            return jsonify({'error': 'Game not found'}), 404
+        if opening_book is None:
+            return jsonify({'moves': []})
+        return jsonify({'moves': game.book_moves(opening_book)})
+
+@app.route('/api/games/<game_id>/tablebase', methods=['GET'])
+def get_tablebase_result(game_id):
+    # Probing plays and takes back moves on the game's position
+    with game_locks(game_id):
+        game = games.get(game_id)
+        if game is None:
+            return jsonify({'error': 'Game not found'}), 404
+        result = game.probe_tablebase(tablebase) if tablebase is not None else None
+    return jsonify({'result': result})
+
+@app.route('/api/search/games', methods=['GET'])
+def search_games():
+    args = request.args
+    result = args.get('result')
+    if result is not None and result not in FINISHED_RESULTS:
+        return jsonify({'error': f"Unknown result '{result}'"}), 400
+    termination = args.get('termination')
+    if termination is not None and termination not in TERMINATIONS:
+        return jsonify({'error': f"Unknown termination '{termination}'"}), 400
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+        created_after = _timestamp_arg('created_after')
+        created_before = _timestamp_arg('created_before')
+    except ValueError:
+        return jsonify({'error': 'Invalid limit or timestamp'}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
+    try:
+        opening = opening_key(args['opening']) if 'opening' in args else None
+        page, next_cursor = game_index.search(
+            args.get('player'), args.get('white'), args.get('black'), result, termination, opening,
+            created_after, created_before, args.get('cursor'), limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'games': page, 'next_cursor': next_cursor})
+
+@app.route('/api/archive/<game_id>', methods=['GET'])
+def get_archived_game(game_id):
+    record = game_archive.get(game_id) if game_archive is not None else None
+    if record is None:
+        return jsonify({'error': 'Game not archived'}), 404
+    return jsonify(record.to_dict())
+
+@app.route('/api/archive/<game_id>/pgn', methods=['GET'])
+def download_archived_pgn(game_id):
+    record = game_archive.get(game_id) if game_archive is not None else None
+    if record is None:
+        return jsonify({'error': 'Game not archived'}), 404
+    return Response(record.to_game().to_pgn(), mimetype='application/x-chess-pgn',
+                    headers={'Content-Disposition': f'attachment; filename="{game_id}.pgn"'})
+
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch():
+    data = request.get_json(silent=True)
+    positions = data.get('positions') if isinstance(data, dict) else None
+    if not isinstance(positions, list) or not positions:
+        return jsonify({'error': 'Missing positions'}), 400
+    if len(positions) > MAX_BATCH_POSITIONS:
+        return jsonify({'error': f'At most {MAX_BATCH_POSITIONS} positions per batch'}), 400
+    depth = data.get('depth', DEFAULT_ANALYSIS_DEPTH)
+    time_limit = data.get('time_limit', DEFAULT_ANALYSIS_TIME)
+    if not isinstance(depth, int) or isinstance(depth, bool) or not 1 <= depth <= MAX_ANALYSIS_DEPTH:
+        return jsonify({'error': f'depth must be between 1 and {MAX_ANALYSIS_DEPTH}'}), 400
+    if (not isinstance(time_limit, (int, float)) or isinstance(time_limit, bool)
+            or not 0 < time_limit <= MAX_ANALYSIS_TIME):
+        return jsonify({'error': f'time_limit must be above 0 and at most {MAX_ANALYSIS_TIME}'}), 400
+    if len(positions) * time_limit > MAX_BATCH_TIME:
+        return jsonify({'error': f'positions x time_limit must be at most {MAX_BATCH_TIME:g} seconds; '
+                                 'lower time_limit or split the batch'}), 400
+
+    # Items are FEN strings or {"game_id": ...}; games are read here, once,
+    # and unknown ones answered straight away
+    fens, errors = [], []
+    for index, item in enumerate(positions):
+        if isinstance(item, str):
+            fens.append(item)
+            continue
+        game_id = item.get('game_id') if isinstance(item, dict) else None
+        fen = game_fen(game_id) if isinstance(game_id, str) else None
+        fens.append(fen)
+        if fen is None:
+            errors.append({'index': index, 'game_id': game_id, 'error': 'Game not found'})
+
+    def stream():
+        for error in errors:
+            yield json.dumps(error) + '\n'
+        pending = [(index, fen) for index, fen in enumerate(fens) if fen is not None]
+        for result in batch_analyzer.analyze([fen for _, fen in pending], depth, time_limit):
+            index = pending[result['index']][0]
+            result['index'] = index
+            if not isinstance(positions[index], str):
+                result['game_id'] = positions[index]['game_id']
+            yield json.dumps(result) + '\n'
+
+    # One JSON object per line, in the order positions finish
+    return Response(stream(), mimetype='application/x-ndjson')
+
+@app.route('/api/games/<game_id>/undo', methods=['POST'])
+def undo_move(game_id):
+    data = request.get_json(silent=True) or {}
+    count = data.get('count', 1)
+    with game_locks(game_id):
+        game = games.get(game_id)
+        if game is None:
+            return jsonify({'error': 'Game not found'}), 404
+        error = ply_mismatch(game, data)
+        if error:
+            return refused(game_id, error)
+        if not isinstance(count, int) or count < 1 or count > len(game.move_history):
+            return jsonify({'success': False, 'message': 'Invalid undo count'}), 400
+
+        was_over = game.game_over
+        for _ in range(count):
+            success, message = game.unmake_move()
+            if not success:
+                return jsonify({'success': False, 'message': message}), 400
+        try:
+            games.save(game)
+        except GameConflictError:
+            return refused(game_id, CONFLICT_MESSAGE)
+        if was_over and not game.game_over:
+            unrecord_finished(game)
+
+        # Deltas cannot be rewound, so clients reset to the FEN at the new version
+        emit_to_room('move_undone', {
+            'version': game.version,
+            'ply': game.ply,
+            'count': count,
+            'fen': game.to_fen(),
+            'current_player': game.current_player,
+            'game_over': game.game_over
+        }, game_id)
+        notify_spectators(game)
+        return jsonify({'success': True, 'message': 'Move undone', 'game_state': game.get_game_state()})
+
+def ply_mismatch(game, data):
+    """Error message if data carries an expected_ply the game is not at, else None
+
+    expected_ply is optional: a client that sends it is refused instead of
+    having its move applied to a position it has not seen.
+    """
+    expected_ply = data.get('expected_ply')
+    if expected_ply is None:
+        return None
+    if not isinstance(expected_ply, int) or isinstance(expected_ply, bool) or expected_ply < 0:
+        return 'expected_ply must be a non-negative integer'
+    if expected_ply != game.ply:
+        return STALE_PLY_MESSAGE
+    return None
+
+def refused(game_id, message):
+    """Error response for a refused move or undo; 409s carry the stored version and ply to sync from"""
+    if message not in RETRY_MESSAGES:
         return jsonify({'success': False, 'message': message}), 400
+    body = {'success': False, 'message': message}
+    stored = games.get(game_id)
+    if stored is not None:
+        body.update(version=stored.version, ply=stored.ply)
+    return jsonify(body), 409
+
+def play_requested_move(game, data, sid=None):
+    """Validate and play a from/to/promotion move request; returns (success, message)
+
+    Socket clients (sid given) may only move for a side whose seat they hold
+    or that nobody holds. Callers hold the game's lock.
+    """
+    holder = game.players[game.current_player]
+    if sid is not None and holder is not None and holder != sid:
+        return False, 'Not your turn'
+    error = ply_mismatch(game, data)
+    if error:
+        return False, error
+    success, message = game.make_move(data.get('from_row'), data.get('from_col'),
+                                      data.get('to_row'), data.get('to_col'),
+                                      data.get('promotion_piece'))
+    if success:
+        try:
+            games.save_move(game)
+        except GameConflictError:
+            return False, CONFLICT_MESSAGE
+        record_finished(game)
+        schedule_flag(game)
+    elif message == TIME_FORFEIT:
+        announce_flag(game)
+    return success, message
+
+def record_finished(game):
+    """Index a game that just ended and copy it into the archive
+
+    A game whose end was taken back and that ended again replaces its
+    index entry and is archived again; the archive serves the latest copy.
+    """
+    if not game.game_over:
+        return
+    record = ArchivedGame.from_game(game)
+    # Like a broadcast, a failed write must not fail the saved move
+    try:
+        game_index.add(record)
+        if game_archive is not None:
+            game_archive.add(record)
+    except Exception:
+        app.logger.exception(f"Recording finished game {game.game_id} failed")
+
+def unrecord_finished(game):
+    """Drop the index entry of a game whose end was just taken back"""
+    try:
+        game_index.remove(game.game_id)
+    except Exception:
+        app.logger.exception(f"Removing game {game.game_id} from the index failed")
+
+def schedule_flag(game):
+    """Watch the running clock of a timed game, or stop watching once it is over"""
+    if game.clock is None:
+        return
+    deadline = game.clock.deadline()
+    if game.game_over or deadline is None:
+        flag_scheduler.cancel(game.game_id)
+    else:
+        flag_scheduler.schedule(game.game_id, deadline)
+
+def announce_flag(game):
+    """Save, record and broadcast a game that just ended on time"""
+    flag_scheduler.cancel(game.game_id)
+    try:
+        games.save(game)
+    except GameConflictError:
+        # Another worker moved first; the store serves its version of the game
+        return
+    record_finished(game)
+    emit_to_room('flag_fell', {
+        'version': game.version,
+        'termination': game.termination,
+        'result': game.result,
+        'clock': game.clock_state()
+    }, game.game_id)
+    notify_spectators(game)
+
+def on_flag_deadline(game_id):
+    # Runs on the scheduler thread; the game may have moved on since it was scheduled
+    with game_locks(game_id):
+        game = games.get(game_id)
+        if game is None or game.game_over:
+            return
+        if game.check_flag():
+            announce_flag(game)
+        else:
+            schedule_flag(game)
+
+def socket_move(game_id, data, sid):
+    """Play a make_move event; returns (ack, delta for the rest of the room or None)"""
+    with game_locks(game_id):
+        game = games.get(game_id)
+        if game is None:
+            return {'success': False, 'message': 'Game not found'}, None
+        success, message = play_requested_move(game, data, sid)
+        if not success:
+            ack = {'success': False, 'message': message}
+            if message in RETRY_MESSAGES:
+                # The mover is behind (or another worker won a race on the
+                # game); bring it up to date with what is stored
+                stored = games.get(game_id)
+                if stored is not None:
+                    ack['sync'] = stored.sync_payload(data.get('version'))
+            return ack, None
+        # Built once: the mover gets it in the ack, everyone else as move_made
+        delta = game.move_delta()
+        notify_spectators(game)
+        return {'success': True, 'message': message, 'move': delta}, delta
+
+def game_fen(game_id):
+    """FEN of a game's current position, or None if the game does not exist"""
+    with game_locks(game_id):
+        game = games.get(game_id)
+        return None if game is None else game.to_fen()
+
+def spectator_frame(game_id):
+    """spectator_update frame of a game, or None if the game does not exist"""
+    with game_locks(game_id):
+        game = games.get(game_id)
+        return None if game is None else game.spectator_frame()
+
+def sync_payload(game_id, version=None):
+    """game_sync payload for a client at version, or None if the game does not exist"""
+    with game_locks(game_id):
+        game = games.get(game_id)
+        return None if game is None else game.sync_payload(version)
+
+def broadcast_move(game_id, game):
+    # Emit only the last move; clients that see a version gap send sync_game
+    emit_to_room('move_made', game.move_delta(), game_id)
+    notify_spectators(game)
+
+def _socketio_room_emit(event, data, game_id):
+    socketio.emit(event, data, room=game_id)
+
+# REST-side broadcasts go to whichever server runs the sockets; chess_asgi
+# swaps in its asyncio server
+room_emitter = _socketio_room_emit
+
+def set_room_emitter(emitter):
+    global room_emitter
+    room_emitter = emitter
+
+def set_spectator_fanout(fanout):
+    global spectators
+    spectators = fanout
+
+def notify_spectators(game):
+    # Like a room broadcast, a lost frame only costs spectators a late update
+    try:
+        spectators.publish(game.game_id, 'spectator_update', game.spectator_frame())
+    except Exception:
+        app.logger.exception(f"Publishing to the spectators of game {game.game_id} failed")
+
+def spectator_loop(fanout):
+    while True:
+        socketio.sleep(fanout.interval)
+        try:
+            fanout.flush()
+        except Exception:
+            app.logger.exception("Flushing spectator frames failed")
+
+def emit_to_room(event, data, game_id):
+    # The change is already saved; a lost broadcast only costs clients a resync
+    try:
+        room_emitter(event, data, game_id)
+    except Exception:
+        app.logger.exception(f"Broadcasting {event} to game {game_id} failed")
+
+def seat_player(game_id, color, sid, player=None):
+    """Seat sid at color, or as a spectator when color is None; returns (game, error)
+
+    player, a name that outlives the socket, goes into the seat's PGN tag,
+    where game search finds it.
+    """
+    with game_locks(game_id):
+        game = games.get(game_id)
+        if game is None:
+            return None, 'Game not found'
+        if color is not None:
+            if color not in ('white', 'black'):
+                return None, 'Invalid color'
+            if game.players[color] is not None:
+                return None, 'Color already taken'
+            game.players[color] = sid
+            if player is not None:
+                game.pgn_tags[color.capitalize()] = player
+            try:
+                games.save(game)
+            except GameConflictError:
+                return None, CONFLICT_MESSAGE
+            notify_spectators(game)
+        return game, None
+
+def joined_message(game, color):
+    # The joiner gets a game_sync of its own; the room only learns who joined
+    return {'color': color, 'version': game.version, 'players': game.players}
+
+def free_seats(game_id, sid, retry=True):
+    """Release the seats sid held so the lobby lists them as open again"""
+    with game_locks(game_id):
+        game = games.get(game_id)
+        if game is None:
+            return None
+        freed = [color for color, holder in game.players.items() if holder == sid]
+        for color in freed:
+            game.players[color] = None
+        if freed:
+            try:
+                games.save(game)
+            except GameConflictError:
+                # The store has reloaded the game; leaving is always safe to redo
+                return free_seats(game_id, sid, retry=False) if retry else []
+            notify_spectators(game)
+        return freed
+
+def parse_player(data):
+    """Optional player name of a join_game or seek event; raises ValueError"""
+    player = data.get('player')
+    if player is not None and (not isinstance(player, str) or not 0 < len(player.strip()) <= MAX_PLAYER_NAME):
+        raise ValueError(f'player must be a name of 1 to {MAX_PLAYER_NAME} characters')
+    return player.strip() if player is not None else None
+
+def parse_seek(data):
+    """(rating, time_control) of a seek event; raises ValueError"""
+    rating = data.get('rating', DEFAULT_RATING)
+    if not isinstance(rating, int) or not MIN_RATING <= rating <= MAX_RATING:
+        raise ValueError(f'rating must be an integer between {MIN_RATING} and {MAX_RATING}')
+    time_control = data.get('time_control')
+    if time_control is not None:
+        # Normalized, since seekers are pooled by time control
+        time_control = str(TimeControl.parse(time_control))
+    return rating, time_control
+
+def pair_seekers():
+    """One batch pairing pass: a new game with both seats taken per pair; returns the games"""
+    matched = []
+    for white, black in matchmaker.tick():
+        game = ChessGame(str(uuid.uuid4()))
+        if white.time_control is not None:
+            game.set_time_control(TimeControl.parse(white.time_control))
+        game.players = {'white': white.sid, 'black': black.sid}
+        for color, seeker in (('White', white), ('Black', black)):
+            if seeker.player is not None:
+                game.pgn_tags[color] = seeker.player
+        games[game.game_id] = game
+        matched.append(game)
+    return matched
+
+def match_found_message(game, color):
+    return {'game_id': game.game_id, 'color': color,
+            'time_control': None if game.clock is None else str(game.clock.time_control)}
+
+def run_matchmaking_tick():
+    # Both players enter the game room as if they had sent join_game
+    for game in pair_seekers():
+        for color, sid in game.players.items():
+            socketio.server.enter_room(sid, game.game_id, namespace='/')
+            socketio.emit('match_found', match_found_message(game, color), to=sid)
+            socketio.emit('game_sync', sync_payload(game.game_id), to=sid)
+
+def matchmaking_loop():
+    while True:
+        socketio.sleep(MATCH_TICK)
+        try:
+            run_matchmaking_tick()
+        except Exception:
+            app.logger.exception("Matchmaking tick failed")
+
+@socketio.on('watch_game')
+def on_watch_game(data):
+    # Spectators get their own room and coalesced frames, not the players' events
+    game_id = data['game_id']
+    frame = spectator_frame(game_id)
+    if frame is None:
+        emit('error', {'message': 'Game not found'})
+        return
+    join_room(SpectatorFanout.room(game_id))
+    emit('spectator_update', frame)
+
+@socketio.on('unwatch_game')
+def on_unwatch_game(data):
+    leave_room(SpectatorFanout.room(data['game_id']))
+
+@socketio.on('seek')
+def on_seek(data):
+    global matchmaking_task
+    try:
+        rating, time_control = parse_seek(data or {})
+        player = parse_player(data or {})
+    except ValueError as e:
+        emit('error', {'message': str(e)})
+        return
+    matchmaker.add(request.sid, rating, time_control, player)
+    if matchmaking_task is None:
+        matchmaking_task = socketio.start_background_task(matchmaking_loop)
+    emit('seeking', {'rating': rating, 'time_control': time_control})
+
+@socketio.on('cancel_seek')
+def on_cancel_seek(data=None):
+    emit('seek_cancelled', {'cancelled': matchmaker.remove(request.sid)})
+
+@socketio.on('disconnect')
+def on_disconnect():
+    matchmaker.remove(request.sid)
 
 @socketio.on('join_game')
 def on_join_game(data):
     game_id = data['game_id']
-    player_color = data['color']
-    
-    if game_id in games:
-        game = games[game_id]
-        if game.players[player_color] is None:
-            game.players[player_color] = request.sid
-            join_room(game_id)
-            emit('player_joined', {
-                'color': player_color,
-                'game_state': game.get_game_state()
-            }, room=game_id)
-        else:
-            emit('error', {'message': 'Color already taken'})
-    else:
+    player_color = data.get('color')
+    try:
+        player = parse_player(data)
+    except ValueError as e:
+        emit('error', {'message': str(e)})
+        return
+    game, error = seat_player(game_id, player_color, request.sid, player)
+    if error:
+        emit('error', {'message': error})
+        return
+    join_room(game_id)
+    emit('game_sync', sync_payload(game_id, data.get('version')))
+    emit('player_joined', joined_message(game, player_color), room=game_id)
+
+@socketio.on('sync_game')
+def on_sync_game(data):
+    payload = sync_payload(data['game_id'], data.get('version'))
+    if payload is None:
         emit('error', {'message': 'Game not found'})
+        return
+    emit('game_sync', payload)
+
+@socketio.on('make_move')
+def on_make_move(data):
+    # The return value is the client's acknowledgement callback payload
+    game_id = data.get('game_id')
+    ack, delta = socket_move(game_id, data, request.sid)
+    if delta is not None:
+        emit('move_made', delta, room=game_id, skip_sid=request.sid)
+    return ack
 
 @socketio.on('leave_game')
 def on_leave_game(data):
     game_id = data['game_id']
-    if game_id in games:
+    freed = free_seats(game_id, request.sid)
+    if freed is not None:
         leave_room(game_id)
-        emit('player_left', {'sid': request.sid}, room=game_id)
+        emit('player_left', {'sid': request.sid, 'colors': freed}, room=game_id)
 
 if __name__ == '__main__':
-    socketio.run(app, debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
+    socketio.run(app, debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 5000))) 
\ No newline at end of file
@@ -0,0 +1,217 @@
+"""
+ASGI entry point for chess_app: the REST routes behind python-socketio's
+asyncio server
+
+Idle sockets cost a coroutine instead of a thread, so one process can hold
+tens of thousands of spectators. Flask routes run unchanged in asgiref's
+thread pool, and their room broadcasts are handed back to the event loop.
+
+    uvicorn chess_asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import logging
+import os
+
+import socketio
+from asgiref.wsgi import WsgiToAsgi
+from socketio.asyncio_pubsub_manager import AsyncPubSubManager
+
+import chess_app
+from chess_app import (
+    BROKER_SCHEMES, free_seats, joined_message, match_found_message, matchmaker, pair_seekers, parse_player,
+    parse_seek, seat_player, socket_move, spectator_frame, sync_payload,
+)
+from chess_engine.cluster import create_message_queue
+from chess_engine.fanout import DEFAULT_INTERVAL, AsyncSpectatorFanout
+from chess_engine.matchmaking import MATCH_TICK
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncQueueClientManager(AsyncPubSubManager):
+    """Async counterpart of chess_app.QueueClientManager; queue I/O runs in threads"""
+    name = 'chess_queue'
+
+    def __init__(self, queue, channel='socketio', write_only=False):
+        self.queue = queue
+        super().__init__(channel=channel, write_only=write_only)
+
+    async def _publish(self, data):
+        await asyncio.to_thread(self.queue.publish, data)
+
+    async def _listen(self):
+        messages = self.queue.listen()
+        while True:
+            message = await asyncio.to_thread(next, messages, None)
+            if message is None:
+                return
+            yield message
+
+
+def create_client_manager(url):
+    """Async Socket.IO client manager for a CHESS_MESSAGE_QUEUE setting, or None"""
+    if not url:
+        return None
+    scheme = url.split(':', 1)[0]
+    if scheme in ('redis', 'rediss'):
+        return socketio.AsyncRedisManager(url)
+    if scheme == 'amqp':
+        return socketio.AsyncAioPikaManager(url)
+    if scheme in BROKER_SCHEMES:
+        raise ValueError(f"Message queue '{url}' is not supported in ASGI mode")
+    return AsyncQueueClientManager(create_message_queue(url))
+
+
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*',
+                           client_manager=create_client_manager(os.environ.get('CHESS_MESSAGE_QUEUE')))
+event_loop = None
+matchmaking_task = None
+spectator_task = None
+
+
+async def _relay_to_room(event, data, room):
+    await sio.emit(event, data, room=room)
+
+
+spectators = AsyncSpectatorFanout(
+    sio, float(os.environ.get('CHESS_SPECTATOR_INTERVAL', DEFAULT_INTERVAL)),
+    relay=_relay_to_room if os.environ.get('CHESS_MESSAGE_QUEUE') else None)
+
+
+def _on_startup():
+    global event_loop, spectator_task
+    event_loop = asyncio.get_running_loop()
+    spectators.set_loop(event_loop)
+    # Moves queue frames from worker threads, so flushing starts with the
+    # server rather than with the first local watcher
+    if spectators.interval:
+        spectator_task = sio.start_background_task(spectator_loop)
+
+
+def _emit_from_thread(event, data, game_id):
+    # Called from Flask routes running in the WSGI thread pool
+    future = asyncio.run_coroutine_threadsafe(sio.emit(event, data, room=game_id), event_loop)
+    future.add_done_callback(_log_emit_failure)
+
+
+def _log_emit_failure(future):
+    if future.exception() is not None:
+        logger.error(f"Room broadcast failed: {future.exception()}")
+
+
+chess_app.set_room_emitter(_emit_from_thread)
+chess_app.set_spectator_fanout(spectators)
+app = socketio.ASGIApp(sio, other_asgi_app=WsgiToAsgi(chess_app.app), on_startup=_on_startup)
+
+
+@sio.event
+async def join_game(sid, data):
+    game_id = data['game_id']
+    player_color = data.get('color')
+    try:
+        player = parse_player(data)
+    except ValueError as e:
+        await sio.emit('error', {'message': str(e)}, to=sid)
+        return
+    # Store calls may hit SQLite, so they stay off the event loop
+    game, error = await asyncio.to_thread(seat_player, game_id, player_color, sid, player)
+    if error:
+        await sio.emit('error', {'message': error}, to=sid)
+        return
+    sio.enter_room(sid, game_id)
+    # Game locks are thread locks, so payloads are built off the loop too
+    payload = await asyncio.to_thread(sync_payload, game_id, data.get('version'))
+    await sio.emit('game_sync', payload, to=sid)
+    await sio.emit('player_joined', joined_message(game, player_color), room=game_id)
+
+
+@sio.event
+async def sync_game(sid, data):
+    payload = await asyncio.to_thread(sync_payload, data['game_id'], data.get('version'))
+    if payload is None:
+        await sio.emit('error', {'message': 'Game not found'}, to=sid)
+        return
+    await sio.emit('game_sync', payload, to=sid)
+
+
+@sio.event
+async def make_move(sid, data):
+    game_id = data.get('game_id')
+    ack, delta = await asyncio.to_thread(socket_move, game_id, data, sid)
+    if delta is not None:
+        await sio.emit('move_made', delta, room=game_id, skip_sid=sid)
+    return ack
+
+
+@sio.event
+async def leave_game(sid, data):
+    game_id = data['game_id']
+    freed = await asyncio.to_thread(free_seats, game_id, sid)
+    if freed is not None:
+        sio.leave_room(sid, game_id)
+        await sio.emit('player_left', {'sid': sid, 'colors': freed}, room=game_id)
+
+
+async def spectator_loop():
+    while True:
+        await sio.sleep(spectators.interval)
+        try:
+            await spectators.flush()
+        except Exception:
+            logger.exception("Flushing spectator frames failed")
+
+
+@sio.event
+async def watch_game(sid, data):
+    game_id = data['game_id']
+    frame = await asyncio.to_thread(spectator_frame, game_id)
+    if frame is None:
+        await sio.emit('error', {'message': 'Game not found'}, to=sid)
+        return
+    sio.enter_room(sid, spectators.room(game_id))
+    await sio.emit('spectator_update', frame, to=sid)
+
+
+@sio.event
+async def unwatch_game(sid, data):
+    sio.leave_room(sid, spectators.room(data['game_id']))
+
+
+async def matchmaking_loop():
+    while True:
+        await sio.sleep(MATCH_TICK)
+        try:
+            for game in await asyncio.to_thread(pair_seekers):
+                payload = await asyncio.to_thread(sync_payload, game.game_id)
+                for color, sid in game.players.items():
+                    sio.enter_room(sid, game.game_id)
+                    await sio.emit('match_found', match_found_message(game, color), to=sid)
+                    await sio.emit('game_sync', payload, to=sid)
+        except Exception:
+            logger.exception("Matchmaking tick failed")
+
+
+@sio.event
+async def seek(sid, data):
+    global matchmaking_task
+    try:
+        rating, time_control = parse_seek(data or {})
+        player = parse_player(data or {})
+    except ValueError as e:
+        await sio.emit('error', {'message': str(e)}, to=sid)
+        return
+    matchmaker.add(sid, rating, time_control, player)
+    if matchmaking_task is None:
+        matchmaking_task = sio.start_background_task(matchmaking_loop)
+    await sio.emit('seeking', {'rating': rating, 'time_control': time_control}, to=sid)
+
+
+@sio.event
+async def cancel_seek(sid, data=None):
+    await sio.emit('seek_cancelled', {'cancelled': matchmaker.remove(sid)}, to=sid)
+
+
+@sio.event
+async def disconnect(sid):
+    matchmaker.remove(sid)
@@ -0,0 +1,8 @@
+"""
+Chess engine core used by the Flask chess server
+"""
+
+from chess_engine.bitboard import Position
+from chess_engine.game import ChessGame
+
+__all__ = ['ChessGame', 'Position']
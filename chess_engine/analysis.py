@@ -0,0 +1,89 @@
+"""
+Batch analysis: evaluate many positions at once on a process pool
+
+Positions are searched in chunks so each worker round trip carries several
+of them, and results are yielded as chunks finish rather than in request
+order; every result carries the index of its position in the batch.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from chess_engine.evaluation import evaluate
+from chess_engine.game import ChessGame
+from chess_engine.search import SearchEngine
+from chess_engine.tablebase import load_tablebase
+
+MAX_BATCH_POSITIONS = 10000
+MAX_ANALYSIS_DEPTH = 6
+MAX_ANALYSIS_TIME = 10.0
+DEFAULT_ANALYSIS_DEPTH = 3
+DEFAULT_ANALYSIS_TIME = 2.0
+# Search seconds one batch may ask for in total (positions x time_limit),
+# so a single request cannot hold the pool for hours
+MAX_BATCH_TIME = 300.0
+
+# Positions per task sent to a worker
+CHUNK_SIZE = 8
+
+# Set in each worker process by _init_worker
+_tablebase = None
+
+
+def analyze_position(fen, depth, time_limit=None, tablebase=None):
+    """Static evaluation, legal move count and searched best move for a FEN
+
+    Raises ValueError for an invalid FEN.
+    """
+    game = ChessGame.from_fen('analysis', fen)
+    result = {
+        'fen': game.to_fen(),
+        'legal_moves': len(game.legal_moves()),
+        'static_eval': evaluate(game.position),
+        'game_over': game.game_over,
+        'search': None
+    }
+    if not game.game_over:
+        result['search'] = SearchEngine(tablebase=tablebase).search(game.position, depth, time_limit).to_dict()
+    return result
+
+
+def _init_worker(tablebase_directory):
+    global _tablebase
+    _tablebase = load_tablebase(tablebase_directory)
+
+
+def _analyze_chunk(chunk, depth, time_limit):
+    results = []
+    for index, fen in chunk:
+        try:
+            result = analyze_position(fen, depth, time_limit, _tablebase)
+        except ValueError as e:
+            result = {'fen': fen, 'error': str(e)}
+        result['index'] = index
+        results.append(result)
+    return results
+
+
+class BatchAnalyzer:
+    """Process pool that analyzes batches of FENs; workers start on first use"""
+
+    def __init__(self, workers=None, tablebase=None):
+        directory = tablebase.directory if tablebase is not None else None
+        self.executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(directory,))
+
+    def analyze(self, fens, depth=DEFAULT_ANALYSIS_DEPTH, time_limit=DEFAULT_ANALYSIS_TIME,
+                chunk_size=CHUNK_SIZE):
+        """Yield one result dict per FEN, in the order they finish"""
+        jobs = list(enumerate(fens))
+        futures = [self.executor.submit(_analyze_chunk, jobs[start:start + chunk_size], depth, time_limit)
+                   for start in range(0, len(jobs), chunk_size)]
+        try:
+            for future in as_completed(futures):
+                yield from future.result()
+        finally:
+            # A caller that stops early (a client hanging up) frees the pool
+            for future in futures:
+                future.cancel()
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
@@ -0,0 +1,560 @@
+"""
+Compact binary archive of finished games
+
+An archive file is a run of zlib-compressed blocks of up to BLOCK_GAMES
+game records, each followed by the ids of its games, then a compressed
+index footer and a fixed trailer:
+
+    (block ids)*  footer  trailer: footer offset (u64 LE), MAGIC
+
+A block holds a varint record count and then each record prefixed with
+its varint length. A record is the game id, creation time (varint
+milliseconds since the epoch), result byte, starting FEN ('' for the
+standard start), player ids, extra PGN tags, and the moves: 16 bits each
+(from | to << 6 | promotion << 12, as the move generator encodes them),
+followed by the clock of every move as varint milliseconds since the
+previous move (or the game's creation). The result byte is the PGN
+result's index in RESULTS plus 4 * (index + 1) of the termination in
+TERMINATIONS (0 when there is none). Strings are varint length plus
+UTF-8. The footer lists every block's offset, sizes and game count.
+Opening an archive reads only the footer and the id lists, after which a
+reader finds any game with one block read, and scans run block by block.
+
+Writers append: the last block stays open until it holds BLOCK_GAMES
+games and is rewritten, with the footer, on every flush, so each flushed
+game is on disk without leaving a trail of tiny blocks.
+
+Blocks and id lists are zlib streams, which carry a checksum, laid end to
+end from the start of the file. If a crash tears the tail, opening the
+file walks those streams to rebuild the index, keeping every block that
+is whole; only games of an open block caught mid-rewrite are lost.
+
+Usage:
+    python -m chess_engine.archive stats games.archive
+    python -m chess_engine.archive export games.archive <game_id>
+"""
+
+import argparse
+import logging
+import os
+import struct
+import sys
+import threading
+import zlib
+from datetime import datetime
+
+from chess_engine.bitboard import STARTING_FEN, square
+from chess_engine.game import ChessGame
+from chess_engine.movegen import encode_move, move_to_uci
+from chess_engine.notation import RESULTS
+from chess_engine.rules import TERMINATIONS
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CHSA'
+_TRAILER = struct.Struct('<Q4s')
+_MOVE = struct.Struct('<H')
+BLOCK_GAMES = 256
+COMPRESSION_LEVEL = 6
+SCAN_CHUNK = 64 * 1024
+ZLIB_HEADER = b'\x78'
+PROMOTION_CODES = {'n': 1, 'b': 2, 'r': 3, 'q': 4}
+
+
+def write_varint(out, value):
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, offset):
+    """(value, offset after it)"""
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _write_string(out, text):
+    encoded = text.encode()
+    write_varint(out, len(encoded))
+    out += encoded
+
+
+def _read_string(data, offset):
+    length, offset = read_varint(data, offset)
+    return data[offset:offset + length].decode(), offset + length
+
+
+def _millis(moment):
+    return int(moment.timestamp() * 1000)
+
+
+class ArchivedGame:
+    """One archive record, decoded without replaying its moves"""
+
+    def __init__(self, game_id, created_at, result, initial_fen, players, tags, moves, clocks,
+                 termination=None):
+        self.game_id = game_id
+        self.created_at = created_at
+        self.result = result
+        self.termination = termination
+        self.initial_fen = initial_fen
+        self.players = players
+        self.tags = tags
+        # Encoded moves, and milliseconds each took since the previous one
+        self.moves = moves
+        self.clocks = clocks
+
+    @classmethod
+    def from_game(cls, game):
+        moves, clocks = [], []
+        previous = _millis(game.created_at)
+        for data in game.move_history:
+            promotion = PROMOTION_CODES[data['promotion'].lower()] if data['promotion'] else 0
+            moves.append(encode_move(square(*data['from']), square(*data['to']), promotion))
+            moment = _millis(datetime.fromisoformat(data['timestamp']))
+            clocks.append(max(moment - previous, 0))
+            previous = moment
+        return cls(game.game_id, game.created_at, game.result, game.initial_fen, dict(game.players),
+                   dict(game.pgn_tags), moves, clocks, game.termination)
+
+    def encode(self):
+        out = bytearray()
+        _write_string(out, self.game_id)
+        write_varint(out, _millis(self.created_at))
+        termination = TERMINATIONS.index(self.termination) + 1 if self.termination else 0
+        out.append(RESULTS.index(self.result) | termination << 2)
+        _write_string(out, '' if self.initial_fen == STARTING_FEN else self.initial_fen)
+        for color in ('white', 'black'):
+            _write_string(out, self.players.get(color) or '')
+        write_varint(out, len(self.tags))
+        for name, value in self.tags.items():
+            _write_string(out, name)
+            _write_string(out, value)
+        write_varint(out, len(self.moves))
+        for move in self.moves:
+            out += _MOVE.pack(move)
+        for clock in self.clocks:
+            write_varint(out, clock)
+        return bytes(out)
+
+    @classmethod
+    def decode(cls, data):
+        game_id, offset = _read_string(data, 0)
+        created, offset = read_varint(data, offset)
+        result = RESULTS[data[offset] & 3]
+        termination = TERMINATIONS[(data[offset] >> 2) - 1] if data[offset] >> 2 else None
+        initial_fen, offset = _read_string(data, offset + 1)
+        players = {}
+        for color in ('white', 'black'):
+            players[color], offset = _read_string(data, offset)
+            players[color] = players[color] or None
+        tags = {}
+        count, offset = read_varint(data, offset)
+        for _ in range(count):
+            name, offset = _read_string(data, offset)
+            tags[name], offset = _read_string(data, offset)
+        count, offset = read_varint(data, offset)
+        moves = [_MOVE.unpack_from(data, offset + 2 * index)[0] for index in range(count)]
+        offset += 2 * count
+        clocks = []
+        for _ in range(count):
+            clock, offset = read_varint(data, offset)
+            clocks.append(clock)
+        return cls(game_id, datetime.fromtimestamp(created / 1000), result, initial_fen or STARTING_FEN,
+                   players, tags, moves, clocks, termination)
+
+    def to_dict(self):
+        return {
+            'game_id': self.game_id,
+            'created_at': self.created_at.isoformat(),
+            'result': self.result,
+            'termination': self.termination,
+            'initial_fen': self.initial_fen,
+            'players': self.players,
+            'tags': self.tags,
+            'moves': [move_to_uci(move) for move in self.moves],
+            'clocks': self.clocks
+        }
+
+    def to_game(self):
+        """ChessGame replayed from the record, with the original timestamps and termination"""
+        game = ChessGame(self.game_id, fen=None if self.initial_fen == STARTING_FEN else self.initial_fen)
+        game.created_at = self.created_at
+        game.players = dict(self.players)
+        game.pgn_tags = dict(self.tags)
+        moment = _millis(self.created_at)
+        for move, clock in zip(self.moves, self.clocks):
+            success, message = game.play_move(move)
+            if not success:
+                raise ValueError(f"Archived game {self.game_id} does not replay: {message}")
+            moment += clock
+            game.move_history[-1]['timestamp'] = datetime.fromtimestamp(moment / 1000).isoformat()
+        game.restore_termination(self.termination)
+        return game
+
+
+def _encode_block(records):
+    out = bytearray()
+    write_varint(out, len(records))
+    for record in records:
+        write_varint(out, len(record))
+        out += record
+    return zlib.compress(bytes(out), COMPRESSION_LEVEL)
+
+
+def _decode_block(data):
+    return _split_records(zlib.decompress(data))
+
+
+def _split_records(data):
+    count, offset = read_varint(data, 0)
+    records = []
+    for _ in range(count):
+        length, offset = read_varint(data, offset)
+        records.append(data[offset:offset + length])
+        offset += length
+    return records
+
+
+def _encode_ids(game_ids):
+    out = bytearray()
+    for game_id in game_ids:
+        _write_string(out, game_id)
+    return zlib.compress(bytes(out), COMPRESSION_LEVEL)
+
+
+def _decode_ids(data, count):
+    data = zlib.decompress(data)
+    game_ids, offset = [], 0
+    for _ in range(count):
+        game_id, offset = _read_string(data, offset)
+        game_ids.append(game_id)
+    return game_ids
+
+
+def _read_index(f):
+    """Block table [(offset, size, ids_size, count)] and {game_id: (block, slot)} of an open file
+
+    Raises ValueError, zlib.error or OSError if the trailer or footer is
+    unreadable.
+    """
+    f.seek(-_TRAILER.size, os.SEEK_END)
+    footer_offset, magic = _TRAILER.unpack(f.read(_TRAILER.size))
+    if magic != MAGIC:
+        raise ValueError("Not a game archive")
+    f.seek(footer_offset)
+    data = zlib.decompress(f.read()[:-_TRAILER.size])
+    blocks = []
+    count, offset = read_varint(data, 0)
+    for _ in range(count):
+        entry = []
+        for _ in range(4):
+            value, offset = read_varint(data, offset)
+            entry.append(value)
+        blocks.append(tuple(entry))
+    return blocks, _locate(f, blocks)
+
+
+def _locate(f, blocks):
+    locations = {}
+    for block_number, (block_offset, size, ids_size, count) in enumerate(blocks):
+        f.seek(block_offset + size)
+        for slot, game_id in enumerate(_decode_ids(f.read(ids_size), count)):
+            locations[game_id] = (block_number, slot)
+    return locations
+
+
+def _read_stream(f, offset):
+    """(decompressed data, end offset) of the zlib stream at offset; raises zlib.error if it is cut short"""
+    f.seek(offset)
+    decompressor = zlib.decompressobj()
+    parts = []
+    end = offset
+    while not decompressor.eof:
+        chunk = f.read(SCAN_CHUNK)
+        if not chunk:
+            raise zlib.error("Stream cut short")
+        parts.append(decompressor.decompress(chunk))
+        end += len(chunk)
+    return b''.join(parts), end - len(decompressor.unused_data)
+
+
+def _scan_blocks(f):
+    """Block table rebuilt by walking the blocks from the start of the file
+
+    Stops at the first block or id list that does not decode: the torn
+    tail, or the footer that follows the last block.
+    """
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    blocks, offset = [], 0
+    while offset < size:
+        try:
+            data, ids_offset = _read_stream(f, offset)
+            count = len(_split_records(data))
+            data, end = _read_stream(f, ids_offset)
+            game_ids, position = [], 0
+            for _ in range(count):
+                game_id, position = _read_string(data, position)
+                game_ids.append(game_id)
+            if position != len(data):
+                break
+        except (zlib.error, IndexError, UnicodeDecodeError):
+            break
+        blocks.append((offset, ids_offset - offset, end - ids_offset, count))
+        offset = end
+    return blocks
+
+
+def _load_index(f, path):
+    """_read_index, falling back to a scan of the blocks when the tail is torn"""
+    try:
+        return _read_index(f)
+    except (ValueError, zlib.error, OSError, IndexError, struct.error):
+        # Every archive starts with a zlib stream header; anything else is
+        # some other file, which must not be rewritten
+        f.seek(0)
+        if f.read(1) != ZLIB_HEADER:
+            raise ValueError("Not a game archive")
+        blocks = _scan_blocks(f)
+        logger.warning(f"Archive {path} has a torn tail; recovered {len(blocks)} blocks by scanning")
+        return blocks, _locate(f, blocks)
+
+
+def _read_block(f, blocks, block_number):
+    offset, size, _, _ = blocks[block_number]
+    f.seek(offset)
+    return _decode_block(f.read(size))
+
+
+class ArchiveWriter:
+    """Appends finished games to an archive file, creating it if needed
+
+    One writer per file: several processes archiving games need a file each.
+    get() reads back anything the writer has archived, including games in
+    the open block.
+    """
+
+    def __init__(self, path, block_games=BLOCK_GAMES):
+        self.path = path
+        self.block_games = block_games
+        self._lock = threading.Lock()
+        self._blocks = []
+        self._locations = {}
+        self._open_records = []
+        self._open_ids = []
+        if os.path.exists(path) and os.path.getsize(path):
+            self._file = open(path, 'r+b')
+            self._blocks, self._locations = _load_index(self._file, path)
+            # Reopen the last block if it has room left
+            if self._blocks and self._blocks[-1][3] < block_games:
+                offset, size, ids_size, count = self._blocks[-1]
+                self._open_records = _read_block(self._file, self._blocks, len(self._blocks) - 1)
+                self._file.seek(offset + size)
+                self._open_ids = _decode_ids(self._file.read(ids_size), count)
+                self._blocks.pop()
+        else:
+            self._file = open(path, 'w+b')
+        last = self._blocks[-1] if self._blocks else (0, 0, 0, 0)
+        self._open_offset = last[0] + last[1] + last[2]
+        self._cached_block = (None, None)
+        # Rewrites the footer, replacing a torn tail
+        self._write_open_block()
+
+    def __contains__(self, game_id):
+        return game_id in self._locations
+
+    def __len__(self):
+        return len(self._locations)
+
+    def add(self, game, flush=True):
+        """Archive a ChessGame (or ArchivedGame); flush writes it to disk straight away"""
+        record = game if isinstance(game, ArchivedGame) else ArchivedGame.from_game(game)
+        with self._lock:
+            self._locations[record.game_id] = (len(self._blocks), len(self._open_records))
+            self._open_records.append(record.encode())
+            self._open_ids.append(record.game_id)
+            if len(self._open_records) >= self.block_games or flush:
+                self._write_open_block()
+
+    def get(self, game_id):
+        """ArchivedGame for game_id, or None"""
+        with self._lock:
+            location = self._locations.get(game_id)
+            if location is None:
+                return None
+            block_number, slot = location
+            if block_number == len(self._blocks):
+                return ArchivedGame.decode(self._open_records[slot])
+            if self._cached_block[0] != block_number:
+                self._cached_block = (block_number, _read_block(self._file, self._blocks, block_number))
+            return ArchivedGame.decode(self._cached_block[1][slot])
+
+    def __iter__(self):
+        """Every ArchivedGame written so far, in file order"""
+        with self._lock:
+            block_count = len(self._blocks)
+            open_records = list(self._open_records)
+        for block_number in range(block_count):
+            with self._lock:
+                records = _read_block(self._file, self._blocks, block_number)
+            for record in records:
+                yield ArchivedGame.decode(record)
+        for record in open_records:
+            yield ArchivedGame.decode(record)
+
+    def recent(self, count):
+        """Up to count of the newest ArchivedGames, newest first, reading blocks from the end
+
+        A game archived more than once (its end was taken back) is yielded
+        only as its latest record.
+        """
+        with self._lock:
+            block_count = len(self._blocks)
+            open_records = list(self._open_records)
+        yielded = 0
+        for block_number in range(block_count, -1, -1):
+            if block_number == block_count:
+                records = open_records
+            else:
+                with self._lock:
+                    records = _read_block(self._file, self._blocks, block_number)
+            for slot in range(len(records) - 1, -1, -1):
+                if yielded == count:
+                    return
+                record = ArchivedGame.decode(records[slot])
+                if self._locations.get(record.game_id) == (block_number, slot):
+                    yielded += 1
+                    yield record
+
+    def flush(self):
+        with self._lock:
+            self._write_open_block()
+
+    def _write_open_block(self):
+        # Sealed blocks are never rewritten, so this costs the open block
+        # plus a footer of one small entry per block
+        f = self._file
+        f.seek(self._open_offset)
+        blocks = list(self._blocks)
+        if self._open_records:
+            block = _encode_block(self._open_records)
+            ids = _encode_ids(self._open_ids)
+            f.write(block)
+            f.write(ids)
+            blocks.append((self._open_offset, len(block), len(ids), len(self._open_records)))
+        footer = bytearray()
+        write_varint(footer, len(blocks))
+        for entry in blocks:
+            for value in entry:
+                write_varint(footer, value)
+        footer_offset = f.tell()
+        f.write(zlib.compress(bytes(footer), COMPRESSION_LEVEL))
+        f.write(_TRAILER.pack(footer_offset, MAGIC))
+        f.truncate()
+        f.flush()
+        if len(self._open_records) >= self.block_games:
+            # Seal the full block; the next game starts a new one
+            self._blocks = blocks
+            self._open_offset = footer_offset
+            self._open_records = []
+            self._open_ids = []
+
+    def close(self):
+        with self._lock:
+            self._write_open_block()
+            self._file.close()
+
+
+class ArchiveReader:
+    """Random access and block-by-block scans over an archive no writer has open"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._blocks, self._locations = _load_index(self._file, path)
+        self._cached_block = (None, None)
+
+    def __contains__(self, game_id):
+        return game_id in self._locations
+
+    def __len__(self):
+        return len(self._locations)
+
+    def game_ids(self):
+        return list(self._locations)
+
+    def _records(self, block_number):
+        if self._cached_block[0] != block_number:
+            self._cached_block = (block_number, _read_block(self._file, self._blocks, block_number))
+        return self._cached_block[1]
+
+    def get(self, game_id):
+        """ArchivedGame for game_id, or None"""
+        location = self._locations.get(game_id)
+        if location is None:
+            return None
+        block_number, slot = location
+        return ArchivedGame.decode(self._records(block_number)[slot])
+
+    def __iter__(self):
+        """Every ArchivedGame in file order, one block in memory at a time"""
+        for block_number in range(len(self._blocks)):
+            for record in self._records(block_number):
+                yield ArchivedGame.decode(record)
+
+    def close(self):
+        self._file.close()
+
+
+def open_archive(path):
+    """ArchiveWriter appending to path, or None when archiving is off"""
+    if not path:
+        return None
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return ArchiveWriter(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Inspect a game archive')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    stats_parser = subcommands.add_parser('stats', help='game, move and result counts')
+    stats_parser.add_argument('archive')
+    export_parser = subcommands.add_parser('export', help='print one game as PGN')
+    export_parser.add_argument('archive')
+    export_parser.add_argument('game_id')
+    args = parser.parse_args(argv)
+
+    reader = ArchiveReader(args.archive)
+    try:
+        if args.command == 'stats':
+            results = dict.fromkeys(RESULTS, 0)
+            moves = 0
+            for record in reader:
+                results[record.result] += 1
+                moves += len(record.moves)
+            print(f"{len(reader)} games, {moves} moves, {os.path.getsize(args.archive)} bytes")
+            for result, count in results.items():
+                print(f"{result:8} {count}")
+            return 0
+        record = reader.get(args.game_id)
+        if record is None:
+            print(f"No game {args.game_id} in {args.archive}", file=sys.stderr)
+            return 1
+        print(record.to_game().to_pgn())
+        return 0
+    finally:
+        reader.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,458 @@
+"""
+Bitboard position representation for the chess engine
+Twelve 64-bit piece boards plus side to move, castling and en passant state
+"""
+
+from chess_engine.zobrist import CASTLING_KEYS, EP_FILE_KEYS, PIECE_KEYS, SIDE_KEY
+
+WHITE, BLACK = 0, 1
+COLOR_NAMES = ('white', 'black')
+
+# Piece types; a piece index is piece_type + 6 * color
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+PIECE_SYMBOLS = 'PNBRQKpnbrqk'
+PIECE_INDEX = {symbol: index for index, symbol in enumerate(PIECE_SYMBOLS)}
+
+# Castling right bits
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+ALL_CASTLING = 15
+CASTLING_SYMBOLS = 'KQkq'
+
+# Squares are numbered row * 8 + col, with row 0 being black's back rank so
+# that square indices line up with ChessGame's board[row][col] layout
+# (square 0 is a8, square 63 is h1).
+BB_SQUARES = [1 << sq for sq in range(64)]
+BB_ALL = (1 << 64) - 1
+
+
+def square(row, col):
+    """Square index for a board row/column"""
+    return row * 8 + col
+
+
+def square_name(sq):
+    """Algebraic name of a square, e.g. 60 -> 'e1'"""
+    return 'abcdefgh'[sq & 7] + str(8 - (sq >> 3))
+
+
+def parse_square(name):
+    """Square index for an algebraic name, e.g. 'e1' -> 60"""
+    if len(name) != 2 or name[0] not in 'abcdefgh' or name[1] not in '12345678':
+        raise ValueError(f"Invalid square '{name}'")
+    return square(8 - int(name[1]), 'abcdefgh'.index(name[0]))
+
+
+def iter_squares(bb):
+    """Yield the square index of every set bit, lowest first"""
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
+
+
+def popcount(bb):
+    return bin(bb).count('1')
+
+
+def _on_board(row, col):
+    return 0 <= row < 8 and 0 <= col < 8
+
+
+def _leaper_table(offsets):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        mask = 0
+        for dr, dc in offsets:
+            if _on_board(row + dr, col + dc):
+                mask |= BB_SQUARES[square(row + dr, col + dc)]
+        table.append(mask)
+    return table
+
+
+def _ray_table(dr, dc):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        mask = 0
+        row, col = row + dr, col + dc
+        while _on_board(row, col):
+            mask |= BB_SQUARES[square(row, col)]
+            row, col = row + dr, col + dc
+        table.append(mask)
+    return table
+
+
+KNIGHT_ATTACKS = _leaper_table([(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                                (1, -2), (1, 2), (2, -1), (2, 1)])
+KING_ATTACKS = _leaper_table([(-1, -1), (-1, 0), (-1, 1), (0, -1),
+                              (0, 1), (1, -1), (1, 0), (1, 1)])
+# PAWN_ATTACKS[color][sq]: squares a pawn of that color on sq attacks
+PAWN_ATTACKS = (_leaper_table([(-1, -1), (-1, 1)]),
+                _leaper_table([(1, -1), (1, 1)]))
+
+# Sliding rays as (table, increasing) pairs; "increasing" rays run towards
+# higher square indices, so their nearest blocker is the lowest set bit.
+ROOK_RAYS = ((_ray_table(0, 1), True), (_ray_table(1, 0), True),
+             (_ray_table(0, -1), False), (_ray_table(-1, 0), False))
+BISHOP_RAYS = ((_ray_table(1, 1), True), (_ray_table(1, -1), True),
+               (_ray_table(-1, -1), False), (_ray_table(-1, 1), False))
+
+
+def _slider_attacks(sq, occupied, rays):
+    attacks = 0
+    for table, increasing in rays:
+        ray = table[sq]
+        blockers = ray & occupied
+        if blockers:
+            if increasing:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= table[blocker]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(sq, occupied):
+    return _slider_attacks(sq, occupied, ROOK_RAYS)
+
+
+def bishop_attacks(sq, occupied):
+    return _slider_attacks(sq, occupied, BISHOP_RAYS)
+
+
+def queen_attacks(sq, occupied):
+    return (_slider_attacks(sq, occupied, ROOK_RAYS) |
+            _slider_attacks(sq, occupied, BISHOP_RAYS))
+
+
+# Castling rights lost when a piece moves from or to each square
+CASTLING_MASKS = [ALL_CASTLING] * 64
+CASTLING_MASKS[square(7, 4)] &= ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASKS[square(7, 7)] &= ~WHITE_KINGSIDE
+CASTLING_MASKS[square(7, 0)] &= ~WHITE_QUEENSIDE
+CASTLING_MASKS[square(0, 4)] &= ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASKS[square(0, 7)] &= ~BLACK_KINGSIDE
+CASTLING_MASKS[square(0, 0)] &= ~BLACK_QUEENSIDE
+
+# King destination -> rook (from, to) when castling
+CASTLING_ROOK_MOVES = {
+    square(7, 6): (square(7, 7), square(7, 5)),
+    square(7, 2): (square(7, 0), square(7, 3)),
+    square(0, 6): (square(0, 7), square(0, 5)),
+    square(0, 2): (square(0, 0), square(0, 3)),
+}
+
+STARTING_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+STARTING_ROWS = (
+    'rnbqkbnr',
+    'pppppppp',
+    '        ',
+    '        ',
+    '        ',
+    '        ',
+    'PPPPPPPP',
+    'RNBQKBNR',
+)
+
+
+class Position:
+    """Chess position held as twelve piece bitboards plus game state"""
+
+    __slots__ = ('pieces', 'occupied_by', 'occupied', 'mailbox', 'side',
+                 'castling', 'ep_square', 'halfmove_clock', 'fullmove_number',
+                 'zobrist', 'undo_stack')
+
+    def __init__(self):
+        self.pieces = [0] * 12
+        self.occupied_by = [0, 0]
+        self.occupied = 0
+        # Square -> piece index (or None), kept in step with the bitboards
+        # so capture lookups don't have to probe twelve boards
+        self.mailbox = [None] * 64
+        self.side = WHITE
+        self.castling = 0
+        self.ep_square = None
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        # Piece keys are kept up to date by put_piece/remove_piece; side,
+        # castling and en passant keys by make_move
+        self.zobrist = 0
+        # One record per move played, newest last: (from_sq, to_sq, piece,
+        # captured, castling, ep_square, halfmove_clock, zobrist) where the
+        # state fields are the values from before the move
+        self.undo_stack = []
+
+    @classmethod
+    def initial(cls):
+        """Standard starting position"""
+        position = cls.from_rows(STARTING_ROWS)
+        position.castling = ALL_CASTLING
+        position.zobrist = position.compute_zobrist()
+        return position
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build a position from 8 rows of piece symbols ('' or ' ' for empty)
+
+        Callers that then set side, castling or en passant state must
+        refresh zobrist with compute_zobrist().
+        """
+        position = cls()
+        for row, cells in enumerate(rows):
+            for col, symbol in enumerate(cells):
+                if symbol and symbol != ' ':
+                    position.put_piece(PIECE_INDEX[symbol], square(row, col))
+        return position
+
+    @classmethod
+    def from_fen(cls, fen):
+        """Parse a FEN string; the move counters may be omitted"""
+        fields = fen.split()
+        if len(fields) not in (4, 6):
+            raise ValueError(f"Invalid FEN: expected 4 or 6 fields in '{fen}'")
+        placement, side, castling, ep_square = fields[:4]
+
+        rows = []
+        for cells in placement.split('/'):
+            row = ''
+            for symbol in cells:
+                if symbol.isdigit():
+                    row += ' ' * int(symbol)
+                elif symbol in PIECE_INDEX:
+                    row += symbol
+                else:
+                    raise ValueError(f"Invalid FEN: unknown piece '{symbol}'")
+            if len(row) != 8:
+                raise ValueError(f"Invalid FEN: row '{cells}' is not 8 squares wide")
+            rows.append(row)
+        if len(rows) != 8:
+            raise ValueError("Invalid FEN: expected 8 rows")
+        if side not in ('w', 'b'):
+            raise ValueError(f"Invalid FEN: side to move '{side}'")
+
+        position = cls.from_rows(rows)
+        position.side = WHITE if side == 'w' else BLACK
+        if castling != '-':
+            for symbol in castling:
+                bit = CASTLING_SYMBOLS.find(symbol)
+                if bit < 0:
+                    raise ValueError(f"Invalid FEN: castling rights '{castling}'")
+                position.castling |= 1 << bit
+        if ep_square != '-':
+            try:
+                position.ep_square = parse_square(ep_square)
+            except ValueError:
+                raise ValueError(f"Invalid FEN: en passant square '{ep_square}'")
+        if len(fields) == 6:
+            try:
+                position.halfmove_clock = int(fields[4])
+                position.fullmove_number = int(fields[5])
+            except ValueError:
+                raise ValueError("Invalid FEN: move counters must be integers")
+        position.zobrist = position.compute_zobrist()
+        return position
+
+    def to_fen(self):
+        """FEN string for the position"""
+        rows = []
+        for row in range(8):
+            cells, empty = '', 0
+            for sq in range(row * 8, row * 8 + 8):
+                piece = self.mailbox[sq]
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    cells += str(empty)
+                    empty = 0
+                cells += PIECE_SYMBOLS[piece]
+            rows.append(cells + (str(empty) if empty else ''))
+        castling = ''.join(symbol for bit, symbol in enumerate(CASTLING_SYMBOLS)
+                           if self.castling >> bit & 1) or '-'
+        ep_square = '-' if self.ep_square is None else square_name(self.ep_square)
+        return ' '.join(['/'.join(rows), 'wb'[self.side], castling, ep_square,
+                         str(self.halfmove_clock), str(self.fullmove_number)])
+
+    def copy(self):
+        other = Position.__new__(Position)
+        other.pieces = self.pieces[:]
+        other.occupied_by = self.occupied_by[:]
+        other.occupied = self.occupied
+        other.mailbox = self.mailbox[:]
+        other.side = self.side
+        other.castling = self.castling
+        other.ep_square = self.ep_square
+        other.halfmove_clock = self.halfmove_clock
+        other.fullmove_number = self.fullmove_number
+        other.zobrist = self.zobrist
+        other.undo_stack = self.undo_stack[:]
+        return other
+
+    def piece_at(self, sq):
+        """Piece index on a square, or None when empty"""
+        return self.mailbox[sq]
+
+    def symbol_at(self, sq):
+        """Piece symbol on a square, or '' when empty"""
+        piece = self.mailbox[sq]
+        return '' if piece is None else PIECE_SYMBOLS[piece]
+
+    def put_piece(self, piece, sq):
+        bit = BB_SQUARES[sq]
+        self.pieces[piece] |= bit
+        self.occupied_by[piece // 6] |= bit
+        self.occupied |= bit
+        self.mailbox[sq] = piece
+        self.zobrist ^= PIECE_KEYS[piece][sq]
+
+    def remove_piece(self, sq):
+        piece = self.mailbox[sq]
+        if piece is not None:
+            mask = ~BB_SQUARES[sq]
+            self.pieces[piece] &= mask
+            self.occupied_by[piece // 6] &= mask
+            self.occupied &= mask
+            self.mailbox[sq] = None
+            self.zobrist ^= PIECE_KEYS[piece][sq]
+        return piece
+
+    def king_square(self, color):
+        king = self.pieces[KING + 6 * color]
+        return king.bit_length() - 1 if king else None
+
+    def attacks_from(self, piece, sq, occupied=None):
+        """Squares attacked by a piece standing on sq (pawn captures only)"""
+        if occupied is None:
+            occupied = self.occupied
+        piece_type = piece % 6
+        if piece_type == PAWN:
+            return PAWN_ATTACKS[piece // 6][sq]
+        if piece_type == KNIGHT:
+            return KNIGHT_ATTACKS[sq]
+        if piece_type == BISHOP:
+            return bishop_attacks(sq, occupied)
+        if piece_type == ROOK:
+            return rook_attacks(sq, occupied)
+        if piece_type == QUEEN:
+            return queen_attacks(sq, occupied)
+        return KING_ATTACKS[sq]
+
+    def attackers(self, sq, color, occupied=None):
+        """Bitboard of pieces of the given color attacking sq"""
+        if occupied is None:
+            occupied = self.occupied
+        offset = 6 * color
+        pieces = self.pieces
+        queens = pieces[QUEEN + offset]
+        return ((PAWN_ATTACKS[color ^ 1][sq] & pieces[PAWN + offset]) |
+                (KNIGHT_ATTACKS[sq] & pieces[KNIGHT + offset]) |
+                (KING_ATTACKS[sq] & pieces[KING + offset]) |
+                (bishop_attacks(sq, occupied) & (pieces[BISHOP + offset] | queens)) |
+                (rook_attacks(sq, occupied) & (pieces[ROOK + offset] | queens))) & occupied
+
+    def is_attacked(self, sq, color, occupied=None):
+        """Whether any piece of the given color attacks sq"""
+        return bool(self.attackers(sq, color, occupied))
+
+    def _ep_key(self):
+        """En passant hash contribution; only set when a capture is possible"""
+        ep_square = self.ep_square
+        if ep_square is not None and (PAWN_ATTACKS[self.side ^ 1][ep_square] &
+                                      self.pieces[PAWN + 6 * self.side]):
+            return EP_FILE_KEYS[ep_square & 7]
+        return 0
+
+    def compute_zobrist(self):
+        """Full Zobrist hash of the position, computed from scratch"""
+        key = 0
+        for sq in iter_squares(self.occupied):
+            key ^= PIECE_KEYS[self.mailbox[sq]][sq]
+        key ^= CASTLING_KEYS[self.castling] ^ self._ep_key()
+        if self.side == BLACK:
+            key ^= SIDE_KEY
+        return key
+
+    def make_move(self, from_sq, to_sq, promotion=None):
+        """Move a piece and update side, castling, en passant, clocks and hash
+
+        Returns the captured piece index (or None). No legality checks are
+        made here; callers validate first.
+        """
+        mailbox = self.mailbox
+        piece = mailbox[from_sq]
+        piece_type = piece % 6
+        is_en_passant = piece_type == PAWN and to_sq == self.ep_square
+        captured_sq = to_sq + (8 if piece < 6 else -8) if is_en_passant else to_sq
+        captured = mailbox[captured_sq]
+        self.undo_stack.append((from_sq, to_sq, piece, captured, self.castling,
+                                self.ep_square, self.halfmove_clock, self.zobrist))
+
+        self.zobrist ^= CASTLING_KEYS[self.castling] ^ self._ep_key()
+        self.remove_piece(from_sq)
+        self.remove_piece(captured_sq)
+        self.put_piece(piece if promotion is None else promotion, to_sq)
+        if piece_type == KING and abs(to_sq - from_sq) == 2:
+            rook_from, rook_to = CASTLING_ROOK_MOVES[to_sq]
+            self.put_piece(self.remove_piece(rook_from), rook_to)
+
+        self.castling &= CASTLING_MASKS[from_sq] & CASTLING_MASKS[to_sq]
+        self.ep_square = None
+        if piece_type == PAWN:
+            self.halfmove_clock = 0
+            if abs(to_sq - from_sq) == 16:
+                self.ep_square = (from_sq + to_sq) // 2
+        elif captured is not None:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+
+        if self.side == BLACK:
+            self.fullmove_number += 1
+        self.side ^= 1
+        self.zobrist ^= SIDE_KEY ^ CASTLING_KEYS[self.castling] ^ self._ep_key()
+        return captured
+
+    def unmake_move(self):
+        """Take back the last make_move using its undo record"""
+        (from_sq, to_sq, piece, captured, castling, ep_square,
+         halfmove_clock, zobrist) = self.undo_stack.pop()
+        self.side ^= 1
+        if self.side == BLACK:
+            self.fullmove_number -= 1
+
+        self.remove_piece(to_sq)
+        self.put_piece(piece, from_sq)
+        piece_type = piece % 6
+        if captured is not None:
+            if piece_type == PAWN and to_sq == ep_square:
+                self.put_piece(captured, to_sq + (8 if piece < 6 else -8))
+            else:
+                self.put_piece(captured, to_sq)
+        elif piece_type == KING and abs(to_sq - from_sq) == 2:
+            rook_from, rook_to = CASTLING_ROOK_MOVES[to_sq]
+            self.put_piece(self.remove_piece(rook_to), rook_from)
+
+        self.castling = castling
+        self.ep_square = ep_square
+        self.halfmove_clock = halfmove_clock
+        self.zobrist = zobrist
+        return piece, captured
+
+    def is_repetition(self):
+        """Whether the current position occurred before since the last irreversible move"""
+        key = self.zobrist
+        stack = self.undo_stack
+        for back in range(2, min(self.halfmove_clock, len(stack)) + 1, 2):
+            if stack[-back][7] == key:
+                return True
+        return False
+
+    def to_rows(self):
+        """Materialize the position as 8 lists of 8 one-character strings"""
+        mailbox = self.mailbox
+        return [[('' if mailbox[sq] is None else PIECE_SYMBOLS[mailbox[sq]])
+                 for sq in range(row * 8, row * 8 + 8)]
+                for row in range(8)]
@@ -0,0 +1,191 @@
+"""
+Opening book: Polyglot-style binary file probed through mmap
+
+Each entry is 16 big-endian bytes: position key (u64), move (u16), weight
+(u16) and a learn field (u32, unused), sorted by key. Moves use the
+Polyglot encoding (castling as king-takes-rook). Keys are this engine's
+Zobrist keys, not Polyglot's published random table, so books must be
+built with this module rather than downloaded.
+
+Usage:
+    python -m chess_engine.book build book.bin games.pgn [more.pgn ...] --plies 16
+    python -m chess_engine.book probe book.bin --fen "<FEN>"
+"""
+
+import argparse
+import logging
+import mmap
+import os
+import random
+import struct
+import sys
+
+from chess_engine.bitboard import KING, ROOK, STARTING_FEN, Position
+from chess_engine.movegen import encode_move, generate_legal, move_to_uci, play_move
+from chess_engine.notation import iter_pgn_games, parse_pgn, parse_san
+
+logger = logging.getLogger(__name__)
+
+ENTRY = struct.Struct('>QHHI')
+_KEY = struct.Struct('>Q')
+MAX_WEIGHT = 0xFFFF
+DEFAULT_BOOK_PLIES = 16
+DEFAULT_BOOK_PATH = os.path.join(os.path.dirname(__file__), 'data', 'book.bin')
+
+
+def encode_book_move(position, move):
+    """Polyglot move bits for an encoded legal move in position"""
+    from_sq = move & 63
+    to_sq = (move >> 6) & 63
+    if position.mailbox[from_sq] % 6 == KING and abs(to_sq - from_sq) == 2:
+        # Castling is stored as the king capturing its own rook
+        to_sq = (from_sq & ~7) | (7 if to_sq > from_sq else 0)
+    # Polyglot counts rows from rank 1; squares here count from rank 8
+    return ((to_sq & 7) | (7 - (to_sq >> 3)) << 3 |
+            (from_sq & 7) << 6 | (7 - (from_sq >> 3)) << 9 | (move >> 12) << 12)
+
+
+def decode_book_move(position, raw):
+    """Encoded move for Polyglot move bits in position (not checked for legality)"""
+    to_sq = (raw & 7) | (7 - (raw >> 3 & 7)) << 3
+    from_sq = (raw >> 6 & 7) | (7 - (raw >> 9 & 7)) << 3
+    piece = position.mailbox[from_sq]
+    target = position.mailbox[to_sq]
+    if (piece is not None and piece % 6 == KING and target is not None
+            and target == ROOK + 6 * (piece // 6)):
+        to_sq = from_sq + (2 if to_sq > from_sq else -2)
+    return encode_move(from_sq, to_sq, raw >> 12 & 7)
+
+
+class OpeningBook:
+    """Read-only book; lookups binary-search the mapped file, O(log n)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size % ENTRY.size:
+            self._file.close()
+            raise ValueError(f"Opening book {path} is not a whole number of {ENTRY.size}-byte entries")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._count = size // ENTRY.size
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    def entries(self, key):
+        """(polyglot move, weight) pairs stored for a position key"""
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if _KEY.unpack_from(self._data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        for index in range(low, self._count):
+            entry_key, raw, weight, _ = ENTRY.unpack_from(self._data, index * ENTRY.size)
+            if entry_key != key:
+                break
+            found.append((raw, weight))
+        return found
+
+    def moves(self, position):
+        """Legal book moves for position as (encoded move, weight), heaviest first"""
+        entries = self.entries(position.zobrist)
+        if not entries:
+            return []
+        legal = set(generate_legal(position))
+        moves = []
+        for raw, weight in entries:
+            move = decode_book_move(position, raw)
+            if move in legal:
+                moves.append((move, weight))
+            else:
+                logger.warning(f"Ignoring illegal book move {raw:#06x} in {self.path}")
+        moves.sort(key=lambda entry: -entry[1])
+        return moves
+
+    def choose(self, position, rng=random):
+        """Book move picked in proportion to its weight, or None when out of book"""
+        moves = [(move, weight) for move, weight in self.moves(position) if weight > 0]
+        if not moves:
+            return None
+        return rng.choices([move for move, _ in moves], weights=[weight for _, weight in moves])[0]
+
+
+def load_opening_book(path):
+    """OpeningBook for path, or None (logged) when there is no usable book there"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return OpeningBook(path)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not load opening book {path}: {e}")
+        return None
+
+
+def book_counts(pgn_texts, max_plies=DEFAULT_BOOK_PLIES):
+    """(key, polyglot move) -> number of games playing it, over the first max_plies"""
+    counts = {}
+    for text in pgn_texts:
+        for number, game_text in enumerate(iter_pgn_games(text), 1):
+            tags, sans, _ = parse_pgn(game_text)
+            position = Position.from_fen(tags.get('FEN', STARTING_FEN))
+            for san in sans[:max_plies]:
+                try:
+                    move = parse_san(position, san)
+                except ValueError as e:
+                    logger.warning(f"Game {number}: {e}; skipping the rest of it")
+                    break
+                entry = (position.zobrist, encode_book_move(position, move))
+                counts[entry] = counts.get(entry, 0) + 1
+                play_move(position, move)
+    return counts
+
+
+def write_book(path, counts):
+    """Write (key, polyglot move) -> weight counts as a sorted book file"""
+    entries = sorted(counts.items(), key=lambda item: (item[0][0], -item[1], item[0][1]))
+    with open(path, 'wb') as f:
+        for (key, raw), weight in entries:
+            f.write(ENTRY.pack(key, raw, min(weight, MAX_WEIGHT), 0))
+    return len(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or probe an opening book')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    build_parser = subcommands.add_parser('build', help='build a book from PGN files')
+    build_parser.add_argument('book', help='output book file')
+    build_parser.add_argument('pgn', nargs='+', help='PGN files to count moves from')
+    build_parser.add_argument('--plies', type=int, default=DEFAULT_BOOK_PLIES,
+                              help='plies from the start of each game to include')
+    probe_parser = subcommands.add_parser('probe', help='list book moves for a position')
+    probe_parser.add_argument('book', help='book file')
+    probe_parser.add_argument('--fen', default=STARTING_FEN, help='position to look up')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        texts = []
+        for pgn_path in args.pgn:
+            with open(pgn_path) as f:
+                texts.append(f.read())
+        written = write_book(args.book, book_counts(texts, args.plies))
+        print(f"Wrote {written} entries to {args.book}")
+        return 0
+
+    book = OpeningBook(args.book)
+    for move, weight in book.moves(Position.from_fen(args.fen)):
+        print(f"{move_to_uci(move)}  {weight}")
+    book.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+Chess clocks and the flag-fall scheduler shared by every timed game
+
+A GameClock is charged from move timestamps, so a game replayed from the
+store rebuilds the same clock. The clock starts with the first move: the
+mover's time runs from the previous move to their own, and the increment is
+added once the move is made.
+
+FlagScheduler keeps one heap of deadlines for all games and one thread
+that sleeps until the earliest, so thousands of blitz games cost a heap
+entry each rather than a timer thread each. Rescheduling a game pushes a
+new entry and leaves the old one to be skipped when it surfaces.
+"""
+
+import heapq
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from chess_engine.bitboard import COLOR_NAMES
+
+logger = logging.getLogger(__name__)
+
+MAX_BASE_SECONDS = 3 * 60 * 60
+MAX_INCREMENT_SECONDS = 180
+
+
+class TimeControl:
+    """Base time plus increment per move, both in seconds"""
+
+    def __init__(self, base, increment=0):
+        if not 0 < base <= MAX_BASE_SECONDS:
+            raise ValueError(f"Base time must be between 0 and {MAX_BASE_SECONDS} seconds")
+        if not 0 <= increment <= MAX_INCREMENT_SECONDS:
+            raise ValueError(f"Increment must be between 0 and {MAX_INCREMENT_SECONDS} seconds")
+        self.base = base
+        self.increment = increment
+
+    @classmethod
+    def parse(cls, text):
+        """Time control from PGN TimeControl form, e.g. '300+2'; raises ValueError"""
+        if not isinstance(text, str):
+            raise ValueError("Time control must be a string like '300+2'")
+        base, _, increment = text.partition('+')
+        try:
+            base, increment = float(base), float(increment or 0)
+        except ValueError:
+            raise ValueError(f"Invalid time control '{text}'")
+        return cls(base, increment)
+
+    def __str__(self):
+        return f'{self.base:g}+{self.increment:g}'
+
+    def __eq__(self, other):
+        return isinstance(other, TimeControl) and (self.base, self.increment) == (other.base, other.increment)
+
+
+class GameClock:
+    """Remaining time per color, charged as moves are made"""
+
+    def __init__(self, time_control):
+        self.time_control = time_control
+        self.remaining = [float(time_control.base)] * 2
+        # Color whose time is running and when its turn began (None before the first move)
+        self.running = None
+        self.turn_started = None
+
+    def press(self, color, moment):
+        """color moved at moment: charge its turn, add the increment and start the opponent"""
+        if self.running == color:
+            self.remaining[color] -= (moment - self.turn_started).total_seconds()
+            self.remaining[color] += self.time_control.increment
+        self.running = color ^ 1
+        self.turn_started = moment
+
+    def time_left(self, color, now):
+        """Seconds color has left at now (negative once flagged)"""
+        if self.running != color:
+            return self.remaining[color]
+        return self.remaining[color] - (now - self.turn_started).total_seconds()
+
+    def flagged(self, now):
+        return self.running is not None and self.time_left(self.running, now) <= 0
+
+    def deadline(self):
+        """Epoch seconds at which the running side flags, or None while stopped"""
+        if self.running is None:
+            return None
+        return (self.turn_started + timedelta(seconds=self.remaining[self.running])).timestamp()
+
+    def to_dict(self, now):
+        return {
+            'time_control': str(self.time_control),
+            'white': max(int(self.time_left(0, now) * 1000), 0),
+            'black': max(int(self.time_left(1, now) * 1000), 0),
+            'running': None if self.running is None else COLOR_NAMES[self.running]
+        }
+
+
+class FlagScheduler:
+    """One heap of flag deadlines for every timed game, served by a single thread
+
+    callback(game_id) runs on the scheduler thread once a game's deadline
+    passes; it should re-check the game, which may have moved on since.
+    """
+
+    def __init__(self, callback, clock=time.time):
+        self.callback = callback
+        self.clock = clock
+        self._condition = threading.Condition()
+        self._heap = []
+        # game_id -> current deadline; heap entries that disagree are stale
+        self._deadlines = {}
+        self._thread = None
+        self._closed = False
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, game_id):
+        return game_id in self._deadlines
+
+    def schedule(self, game_id, deadline):
+        """Call back for game_id at deadline (epoch seconds), replacing any earlier schedule"""
+        with self._condition:
+            self._deadlines[game_id] = deadline
+            heapq.heappush(self._heap, (deadline, game_id))
+            if len(self._heap) > 2 * len(self._deadlines) + 64:
+                self._heap = [(when, key) for key, when in self._deadlines.items()]
+                heapq.heapify(self._heap)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='flag-scheduler', daemon=True)
+                self._thread.start()
+            elif self._heap[0] == (deadline, game_id):
+                self._condition.notify()
+
+    def cancel(self, game_id):
+        with self._condition:
+            self._deadlines.pop(game_id, None)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def _next_due(self):
+        """Pop the next due game_id, waiting as needed; None once closed"""
+        with self._condition:
+            while not self._closed:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                deadline, game_id = self._heap[0]
+                if self._deadlines.get(game_id) != deadline:
+                    heapq.heappop(self._heap)
+                    continue
+                delay = deadline - self.clock()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                del self._deadlines[game_id]
+                return game_id
+            return None
+
+    def _run(self):
+        while True:
+            game_id = self._next_due()
+            if game_id is None:
+                return
+            try:
+                self.callback(game_id)
+            except Exception:
+                logger.exception(f"Flag callback for game {game_id} failed")
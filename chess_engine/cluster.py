@@ -0,0 +1,374 @@
+"""
+Cross-worker message queues for running chess_app in several processes
+
+Flask-SocketIO rooms only reach clients connected to the same process.
+With several workers every emit is published to a message queue, and each
+worker delivers what it receives to its own clients. Redis/AMQP URLs are
+handed to Flask-SocketIO directly; the queues here are stand-ins that need
+no broker: 'local' for a single process (tests) and 'unix:///path' for
+workers on one host, relayed by a hub process.
+
+Usage:
+    python -m chess_engine.cluster hub /tmp/chess-hub.sock
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import socket
+import struct
+import sys
+import threading
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger(__name__)
+
+# Frames on the Unix socket: 4-byte big-endian length, then UTF-8 JSON
+_FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+# Frames the hub holds for one worker before dropping it as stalled
+MAX_PENDING_FRAMES = 1000
+# Seconds a write to a worker may block before the worker is dropped
+SEND_TIMEOUT = 5
+# Seconds between attempts to reach a hub that went away; the last repeats
+RECONNECT_DELAYS = (0.1, 0.5, 1, 2, 5)
+
+
+class MessageQueue(ABC):
+    """Fan-out of JSON-serializable dicts to every connected worker, sender included"""
+
+    @abstractmethod
+    def publish(self, message):
+        pass
+
+    @abstractmethod
+    def listen(self):
+        """Generator of received messages; blocks until the queue is closed"""
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+
+class LocalHub:
+    """In-process hub: every LocalMessageQueue attached to it sees every message"""
+
+    def __init__(self):
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def connect(self):
+        return LocalMessageQueue(self)
+
+    def _attach(self, inbox):
+        with self._lock:
+            self._subscribers.append(inbox)
+
+    def _detach(self, inbox):
+        with self._lock:
+            if inbox in self._subscribers:
+                self._subscribers.remove(inbox)
+
+    def _broadcast(self, message):
+        # Round-trip through JSON so tests catch payloads a real queue would reject
+        data = json.dumps(message)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for inbox in subscribers:
+            inbox.put(json.loads(data))
+
+
+class LocalMessageQueue(MessageQueue):
+    def __init__(self, hub):
+        self.hub = hub
+        self._inbox = queue.Queue()
+        hub._attach(self._inbox)
+
+    def publish(self, message):
+        self.hub._broadcast(message)
+
+    def listen(self):
+        while True:
+            message = self._inbox.get()
+            if message is None:
+                return
+            yield message
+
+    def close(self):
+        self.hub._detach(self._inbox)
+        self._inbox.put(None)
+
+
+def _send_frame(sock, message):
+    data = json.dumps(message).encode()
+    sock.sendall(_FRAME_HEADER.pack(len(data)) + data)
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _recv_frame(sock):
+    """Next raw frame, or None when the peer has gone"""
+    header = _recv_exactly(sock, _FRAME_HEADER.size)
+    if header is None:
+        return None
+    (size,) = _FRAME_HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame of {size} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+    return _recv_exactly(sock, size)
+
+
+class UnixSocketHub:
+    """Relays every frame a worker sends to all connected workers
+
+    Run one per host (python -m chess_engine.cluster hub PATH); workers
+    connect with UnixSocketMessageQueue(PATH). Each worker has its own
+    writer thread fed by a bounded queue, so frames never interleave and a
+    worker that stops reading is dropped instead of stalling the rest.
+    """
+
+    def __init__(self, path, max_pending=MAX_PENDING_FRAMES, send_timeout=SEND_TIMEOUT):
+        self.path = path
+        self.max_pending = max_pending
+        self.send_timeout = send_timeout
+        # connection -> queue of packets waiting for its writer thread
+        self._connections = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._closed = False
+
+    def start(self):
+        """Bind the socket and relay in background threads"""
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen()
+        threading.Thread(target=self._accept_loop, name='chess-hub', daemon=True).start()
+        logger.info(f"Message hub listening on {self.path}")
+        return self
+
+    def serve_forever(self):
+        self.start()
+        threading.Event().wait()
+
+    def close(self):
+        # Stop accepting first, so reconnecting workers cannot land on this hub
+        self._closed = True
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        if self._server is not None:
+            try:
+                self._server.shutdown(socket.SHUT_RDWR)     # wakes the accept thread
+            except OSError:
+                pass
+            self._server.close()
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            self._drop(connection)
+
+    def _accept_loop(self):
+        while not self._closed:
+            try:
+                connection, _ = self._server.accept()
+            except OSError:
+                return
+            if self._closed:
+                connection.close()
+                return
+            # Bounds sendall without putting a timeout on the relay thread's reads
+            seconds = int(self.send_timeout)
+            connection.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, struct.pack(
+                'll', seconds, int((self.send_timeout - seconds) * 1000000)))
+            outbox = queue.Queue(self.max_pending)
+            with self._lock:
+                self._connections[connection] = outbox
+            threading.Thread(target=self._relay, args=(connection,), daemon=True).start()
+            threading.Thread(target=self._write, args=(connection, outbox), daemon=True).start()
+
+    def _relay(self, connection):
+        try:
+            while True:
+                frame = _recv_frame(connection)
+                if frame is None:
+                    break
+                packet = _FRAME_HEADER.pack(len(frame)) + frame
+                with self._lock:
+                    targets = list(self._connections.items())
+                for target, outbox in targets:
+                    try:
+                        outbox.put_nowait(packet)
+                    except queue.Full:
+                        logger.warning("Dropping a worker connection that stopped reading")
+                        self._drop(target)
+        except (OSError, ValueError) as e:
+            if self._is_connected(connection):
+                logger.warning(f"Worker connection failed: {e}")
+        self._drop(connection)
+
+    def _write(self, connection, outbox):
+        while True:
+            packet = outbox.get()
+            if packet is None:
+                return
+            try:
+                connection.sendall(packet)
+            except OSError as e:
+                if self._is_connected(connection):
+                    logger.warning(f"Dropping a worker connection that stopped reading: {e}")
+                    self._drop(connection)
+                return
+
+    def _is_connected(self, connection):
+        with self._lock:
+            return connection in self._connections
+
+    def _drop(self, connection):
+        with self._lock:
+            outbox = self._connections.pop(connection, None)
+        if outbox is None:
+            return
+        try:
+            outbox.put_nowait(None)
+        except queue.Full:
+            pass        # the writer is mid-send and fails once the socket is shut
+        try:
+            connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        connection.close()
+
+
+class UnixSocketMessageQueue(MessageQueue):
+    """Worker side of a UnixSocketHub
+
+    Connects on first use: a queue that is created but never used must not
+    sit on the hub unread, or the hub would drop it. If the hub restarts,
+    listen() reconnects with backoff; messages published while it is down
+    are logged and dropped, as with Redis pub/sub, rather than failing the
+    request that sent them.
+    """
+
+    def __init__(self, path, reconnect_delays=RECONNECT_DELAYS):
+        self.path = path
+        self.reconnect_delays = reconnect_delays
+        self._sock = None
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+    def _connection(self):
+        with self._lock:
+            if self._sock is None:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                try:
+                    sock.connect(self.path)
+                except OSError:
+                    sock.close()
+                    raise
+                self._sock = sock
+            return self._sock
+
+    def _disconnect(self, sock):
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+
+    def publish(self, message):
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+            except OSError as e:
+                error = e
+                continue
+            try:
+                with self._lock:
+                    _send_frame(sock, message)
+                return
+            except OSError as e:
+                error = e
+                self._disconnect(sock)
+        logger.error(f"Could not publish to the message hub at {self.path}, dropping the message: {error}")
+
+    def listen(self):
+        failures = 0
+        while not self._closed.is_set():
+            try:
+                sock = self._connection()
+            except OSError as e:
+                delay = self.reconnect_delays[min(failures, len(self.reconnect_delays) - 1)]
+                failures += 1
+                logger.warning(f"Cannot reach the message hub at {self.path} ({e}); retrying in {delay}s")
+                self._closed.wait(delay)
+                continue
+            if failures:
+                logger.info(f"Reconnected to the message hub at {self.path}")
+            failures = 0
+            while True:
+                try:
+                    frame = _recv_frame(sock)
+                except (OSError, ValueError):
+                    frame = None
+                if frame is None:
+                    break
+                yield json.loads(frame)
+            self._disconnect(sock)
+            if not self._closed.is_set():
+                logger.warning(f"Message hub at {self.path} closed the connection; reconnecting")
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            sock = self._sock
+        if sock is not None:
+            self._disconnect(sock)
+
+
+_local_hub = LocalHub()
+
+
+def create_message_queue(url):
+    """Queue for a CHESS_MESSAGE_QUEUE setting: 'local' or 'unix:///path/to/hub.sock'"""
+    if url == 'local':
+        return _local_hub.connect()
+    if url.startswith('unix://'):
+        return UnixSocketMessageQueue(url[len('unix://'):])
+    raise ValueError(f"Unsupported message queue '{url}'")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Cross-worker message hub for chess_app')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    hub_parser = subcommands.add_parser('hub', help='relay Socket.IO messages between local workers')
+    hub_parser.add_argument('path', help='Unix socket path, e.g. /tmp/chess-hub.sock')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    hub = UnixSocketHub(args.path)
+    try:
+        hub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        hub.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Static evaluation: material plus piece-square tables
+
+Scores are in centipawns from the side to move's point of view.
+"""
+
+from chess_engine.bitboard import BISHOP, KING, KNIGHT, QUEEN, ROOK, WHITE, popcount
+
+PIECE_VALUES = (100, 320, 330, 500, 900, 20000)
+
+# Piece-square tables from white's point of view, listed from the 8th rank
+# down so that index == square number (a8 = 0, h1 = 63).
+PAWN_TABLE = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+)
+KNIGHT_TABLE = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+)
+BISHOP_TABLE = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+)
+ROOK_TABLE = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0,
+)
+QUEEN_TABLE = (
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20,
+)
+KING_MIDDLEGAME_TABLE = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20,
+)
+KING_ENDGAME_TABLE = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+)
+PIECE_TABLES = (PAWN_TABLE, KNIGHT_TABLE, BISHOP_TABLE, ROOK_TABLE,
+                QUEEN_TABLE, KING_MIDDLEGAME_TABLE)
+
+
+def _signed_tables(king_table):
+    """Per piece index, value + table bonus for every square, negated for black"""
+    tables = []
+    for color in (0, 1):
+        for piece_type in range(6):
+            table = king_table if piece_type == KING else PIECE_TABLES[piece_type]
+            sign = 1 if color == 0 else -1
+            tables.append(tuple(
+                sign * (PIECE_VALUES[piece_type] + table[sq if color == 0 else sq ^ 56])
+                for sq in range(64)
+            ))
+    return tuple(tables)
+
+
+MIDDLEGAME_SCORES = _signed_tables(KING_MIDDLEGAME_TABLE)
+ENDGAME_SCORES = _signed_tables(KING_ENDGAME_TABLE)
+
+# Non-pawn, non-king material (both sides together) at or below which
+# kings switch to the endgame table
+ENDGAME_MATERIAL = 2 * PIECE_VALUES[ROOK] + 2 * PIECE_VALUES[BISHOP]
+
+
+def non_pawn_material(position):
+    pieces = position.pieces
+    total = 0
+    for piece_type in (KNIGHT, BISHOP, ROOK, QUEEN):
+        total += PIECE_VALUES[piece_type] * popcount(pieces[piece_type] | pieces[piece_type + 6])
+    return total
+
+
+def evaluate(position):
+    """Material plus piece-square score for the side to move"""
+    scores = ENDGAME_SCORES if non_pawn_material(position) <= ENDGAME_MATERIAL else MIDDLEGAME_SCORES
+    mailbox = position.mailbox
+    total = 0
+    occupied = position.occupied
+    while occupied:
+        lsb = occupied & -occupied
+        sq = lsb.bit_length() - 1
+        total += scores[mailbox[sq]][sq]
+        occupied ^= lsb
+    return total if position.side == WHITE else -total
+
@@ -0,0 +1,147 @@
+"""
+Spectator fan-out: coalesced, serialize-once broadcasts to watchers
+
+Spectators of a game sit in their own room, apart from the players. A
+state change publishes one spectator_update frame holding the game's
+whole visible state, so a newer frame replaces an unsent older one: a burst
+of moves within one flush interval reaches spectators as a single frame.
+Each frame is encoded into a Socket.IO packet once and the same bytes are
+written to every spectator, where python-socketio's room emit would
+encode per recipient. A spectator whose Engine.IO send queue already holds
+max_backlog packets skips the frame; the next one brings it up to date.
+
+With a cross-worker message queue, frames are coalesced where the change
+happened and relayed through the queue, so spectators on other workers
+are reached by an ordinary room emit there.
+"""
+
+import asyncio
+import threading
+
+from socketio import packet
+
+DEFAULT_INTERVAL = 0.25         # seconds between flushes; 0 sends every frame at once
+DEFAULT_MAX_BACKLOG = 16        # queued packets after which a spectator skips frames
+
+
+class _EncodedOnce(packet.Packet):
+    """Packet that encodes on first use and hands out the same bytes afterwards"""
+
+    def encode(self):
+        if not hasattr(self, '_encoded'):
+            self._encoded = super().encode()
+        return self._encoded
+
+
+class SpectatorFanout:
+    """Coalescing spectator broadcaster for a python-socketio Server
+
+    relay(event, data, room), when given, replaces the local fan-out; it
+    is used to send through a cross-worker message queue.
+    start_flusher(fanout), when given, is called once, on the first queued
+    frame, to start the task that calls flush every interval.
+    """
+
+    def __init__(self, server, interval=DEFAULT_INTERVAL, max_backlog=DEFAULT_MAX_BACKLOG,
+                 namespace='/', relay=None, start_flusher=None):
+        self.server = server
+        self.interval = interval
+        self.max_backlog = max_backlog
+        self.namespace = namespace
+        self.relay = relay
+        self.start_flusher = start_flusher
+        self._lock = threading.Lock()
+        # game_id -> newest (event, data) not yet sent
+        self._pending = {}
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def room(game_id):
+        return f'{game_id}:spectators'
+
+    def publish(self, game_id, event, data):
+        """Queue the newest frame for a game's spectators, replacing any unsent one"""
+        if not self.interval:
+            self.send(game_id, event, data)
+            return
+        with self._lock:
+            if game_id in self._pending:
+                self.coalesced += 1
+            self._pending[game_id] = (event, data)
+            # Frames queue up whether or not anyone watches here, since a
+            # relay reaches spectators on other workers
+            start, self.start_flusher = self.start_flusher, None
+        if start is not None:
+            start(self)
+
+    def take_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def recipients(self, game_id):
+        """Engine.IO sids of a game's spectators that are keeping up"""
+        if self.namespace not in self.server.manager.rooms:
+            return []
+        eio_sids = []
+        for _, eio_sid in self.server.manager.get_participants(self.namespace, self.room(game_id)):
+            if self._backed_up(eio_sid):
+                self.dropped += 1
+            else:
+                eio_sids.append(eio_sid)
+        return eio_sids
+
+    def _backed_up(self, eio_sid):
+        socket = self.server.eio.sockets.get(eio_sid)
+        return socket is not None and socket.queue.qsize() >= self.max_backlog
+
+    def _packet(self, event, data):
+        return _EncodedOnce(packet.EVENT, namespace=self.namespace, data=[event, data])
+
+    def send(self, game_id, event, data):
+        if self.relay is not None:
+            self.relay(event, data, self.room(game_id))
+            return
+        pkt = self._packet(event, data)
+        for eio_sid in self.recipients(game_id):
+            # _send_packet writes pkt.encode(), which is only computed once
+            self.server._send_packet(eio_sid, pkt)
+            self.sent += 1
+
+    def flush(self):
+        for game_id, (event, data) in self.take_pending().items():
+            self.send(game_id, event, data)
+
+
+class AsyncSpectatorFanout(SpectatorFanout):
+    """SpectatorFanout for a python-socketio AsyncServer
+
+    publish may be called from worker threads; with no flush interval the
+    send is handed to the event loop set with set_loop.
+    """
+
+    loop = None
+
+    def set_loop(self, loop):
+        self.loop = loop
+
+    def publish(self, game_id, event, data):
+        if self.interval:
+            super().publish(game_id, event, data)
+        else:
+            asyncio.run_coroutine_threadsafe(self.send(game_id, event, data), self.loop)
+
+    async def send(self, game_id, event, data):
+        if self.relay is not None:
+            await self.relay(event, data, self.room(game_id))
+            return
+        pkt = self._packet(event, data)
+        for eio_sid in self.recipients(game_id):
+            await self.server._send_packet(eio_sid, pkt)
+            self.sent += 1
+
+    async def flush(self):
+        for game_id, (event, data) in self.take_pending().items():
+            await self.send(game_id, event, data)
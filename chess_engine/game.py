@@ -0,0 +1,440 @@
+"""
+ChessGame: a single game on top of the bitboard position
+"""
+
+from datetime import datetime
+
+from chess_engine.bitboard import (
+    BB_SQUARES, BLACK_KINGSIDE, BLACK_QUEENSIDE, COLOR_NAMES, KING, PAWN, PIECE_SYMBOLS, QUEEN, ROOK,
+    STARTING_FEN, WHITE_KINGSIDE, WHITE_QUEENSIDE, Position, popcount, square,
+)
+from chess_engine.clock import GameClock
+from chess_engine.movegen import encode_move, generate_legal, has_legal_move, king_threats
+from chess_engine.notation import format_pgn, parse_pgn, parse_san
+from chess_engine.rules import result, termination, timeout
+from chess_engine.zobrist import format_key
+
+# Promotion piece letters accepted from clients (either case)
+PROMOTION_CHOICES = {'n': 1, 'b': 2, 'r': 3, 'q': 4}
+
+# make_move's message when the mover's flag had already fallen
+TIME_FORFEIT = "Time forfeit"
+
+# Castling right -> (color, king home square, rook home square)
+CASTLING_HOMES = {
+    WHITE_KINGSIDE: (0, square(7, 4), square(7, 7)),
+    WHITE_QUEENSIDE: (0, square(7, 4), square(7, 0)),
+    BLACK_KINGSIDE: (1, square(0, 4), square(0, 7)),
+    BLACK_QUEENSIDE: (1, square(0, 4), square(0, 0)),
+}
+
+
+class ChessGame:
+    def __init__(self, game_id, fen=None):
+        self.game_id = game_id
+        self.position = Position.from_fen(fen) if fen else Position.initial()
+        if fen:
+            self._validate_setup()
+        # Normalized FEN the game started from (for PGN SetUp headers)
+        self.initial_fen = self.position.to_fen() if fen else STARTING_FEN
+        # Extra PGN tags carried over from an imported game
+        self.pgn_tags = {}
+        self.move_history = []
+        self.game_over = False
+        # One of rules.TERMINATIONS once the game is over
+        self.termination = None
+        # GameClock for timed games (set_time_control), else None
+        self.clock = None
+        self.players = {'white': None, 'black': None}
+        self.created_at = datetime.now()
+        self._board_view = None
+        # Zobrist key -> number of times the position has occurred
+        self.position_counts = {self.position.zobrist: 1}
+        # (checkers, pinned) bitboards for the side to move, refreshed per move
+        self.threats = king_threats(self.position)
+        # State version, bumped by every move and undo. Clients send back the
+        # last version they saw to receive only what they missed; deltas
+        # cannot span an undo, so undo_version records the latest one.
+        self.version = 0
+        self.undo_version = 0
+        self.check_game_end()
+
+    @classmethod
+    def from_fen(cls, game_id, fen):
+        """New game starting from a FEN position; raises ValueError if invalid"""
+        return cls(game_id, fen=fen)
+
+    @classmethod
+    def from_pgn(cls, game_id, text):
+        """Replay the first game of a PGN text; raises ValueError on bad input"""
+        tags, moves, _ = parse_pgn(text)
+        game = cls(game_id, fen=tags.get('FEN'))
+        game.pgn_tags = {name: value for name, value in tags.items()
+                         if name not in ('Result', 'SetUp', 'FEN')}
+        for number, san in enumerate(moves, 1):
+            if game.game_over:
+                raise ValueError(f"Move {number} '{san}' played after the game ended")
+            try:
+                move = parse_san(game.position, san)
+            except ValueError as e:
+                raise ValueError(f"Move {number}: {e}")
+            game.play_move(move)
+        return game
+
+    def _validate_setup(self):
+        position = self.position
+        for color in (0, 1):
+            if popcount(position.pieces[KING + 6 * color]) != 1:
+                raise ValueError("Invalid FEN: each side needs exactly one king")
+        if position.is_attacked(position.king_square(position.side ^ 1), position.side):
+            raise ValueError("Invalid FEN: the side not to move is in check")
+        for right, (color, king_sq, rook_sq) in CASTLING_HOMES.items():
+            if position.castling & right and (position.mailbox[king_sq] != KING + 6 * color
+                                              or position.mailbox[rook_sq] != ROOK + 6 * color):
+                raise ValueError("Invalid FEN: castling rights without the king and rook on their home squares")
+        ep_square = position.ep_square
+        if ep_square is not None:
+            # The pawn that just double-pushed stands one row past the en passant square
+            mover = position.side ^ 1
+            pawn_sq = ep_square + 8 if mover else ep_square - 8
+            if (ep_square >> 3 != (2 if mover else 5) or position.mailbox[ep_square] is not None
+                    or position.mailbox[pawn_sq] != PAWN + 6 * mover):
+                raise ValueError("Invalid FEN: en passant square without a pawn that just moved two squares")
+
+    def to_fen(self):
+        return self.position.to_fen()
+
+    def to_pgn(self):
+        """PGN text for the game so far"""
+        tags = {
+            'Event': 'Casual Game',
+            'Site': 'chess_app',
+            'Date': self.created_at.strftime('%Y.%m.%d'),
+            'Round': '-',
+            'White': '?',
+            'Black': '?',
+            'Result': self.result,
+        }
+        tags.update((name, value) for name, value in self.pgn_tags.items() if name != 'Result')
+        if self.initial_fen != STARTING_FEN:
+            tags['SetUp'] = '1'
+            tags['FEN'] = self.initial_fen
+        moves = [encode_move(square(*data['from']), square(*data['to']),
+                             PROMOTION_CHOICES[data['promotion'].lower()] if data['promotion'] else 0)
+                 for data in self.move_history]
+        return format_pgn(tags, Position.from_fen(self.initial_fen), moves, tags['Result'])
+
+    @property
+    def board(self):
+        """Read-only 8x8 list-of-lists view, materialized on first access after a move"""
+        if self._board_view is None:
+            self._board_view = self.position.to_rows()
+        return self._board_view
+
+    @property
+    def current_player(self):
+        return COLOR_NAMES[self.position.side]
+
+    def piece_at(self, row, col):
+        """Piece symbol at row/col, or '' when empty"""
+        return self.position.symbol_at(square(row, col))
+
+    def set_time_control(self, time_control):
+        """Play under a TimeControl; its clock starts with the first move"""
+        self.clock = GameClock(time_control)
+
+    def make_move(self, from_row, from_col, to_row, to_col, promotion_piece=None, timestamp=None):
+        """Validate and play a move; timestamp (a datetime) defaults to now"""
+        if self.game_over:
+            return False, "Game is over"
+        moment = timestamp or datetime.now()
+        if self.check_flag(moment):
+            return False, TIME_FORFEIT
+        if not (self._on_board(from_row, from_col) and self._on_board(to_row, to_col)):
+            return False, "Invalid move"
+
+        position = self.position
+        from_sq = square(from_row, from_col)
+        to_sq = square(to_row, to_col)
+        piece = position.symbol_at(from_sq)
+        if not piece:
+            return False, "No piece at source position"
+
+        # Validate move against the legal move list for this piece
+        move = self._find_move(from_sq, to_sq, promotion_piece)
+        if move is None:
+            return False, "Invalid move"
+
+        # Execute move
+        en_passant = to_sq == position.ep_square and piece in 'Pp'
+        promotion = move >> 12
+        promotion_index = promotion + 6 * position.side if promotion else None
+        if self.clock is not None:
+            self.clock.press(position.side, moment)
+        captured = position.make_move(from_sq, to_sq, promotion_index)
+        self._board_view = None
+
+        # Record move
+        move_data = {
+            'from': [from_row, from_col],
+            'to': [to_row, to_col],
+            'piece': piece,
+            'captured': '' if captured is None else PIECE_SYMBOLS[captured],
+            'promotion': PIECE_SYMBOLS[promotion_index] if promotion_index is not None else None,
+            'en_passant': en_passant,
+            'zobrist': format_key(position.zobrist),
+            'timestamp': moment.isoformat(),
+            'version': self.version + 1
+        }
+        self.move_history.append(move_data)
+        self.version += 1
+        self.position_counts[position.zobrist] = self.position_counts.get(position.zobrist, 0) + 1
+        self.threats = king_threats(position)
+
+        # Check game end conditions
+        self.check_game_end()
+
+        return True, "Move successful"
+
+    def play_move(self, move):
+        """make_move for an encoded move from the move generator or search"""
+        from_row, from_col = divmod(move & 63, 8)
+        to_row, to_col = divmod((move >> 6) & 63, 8)
+        promotion = move >> 12
+        return self.make_move(from_row, from_col, to_row, to_col,
+                              'pnbrqk'[promotion] if promotion else None)
+
+    def unmake_move(self):
+        """Take back the last move played in this game"""
+        if not self.move_history:
+            return False, "No moves to undo"
+        if self.clock is not None:
+            return False, "Moves cannot be undone in timed games"
+
+        position = self.position
+        count = self.position_counts[position.zobrist] - 1
+        if count:
+            self.position_counts[position.zobrist] = count
+        else:
+            del self.position_counts[position.zobrist]
+        position.unmake_move()
+        self.threats = king_threats(position)
+        self.move_history.pop()
+        self._board_view = None
+        self.game_over = False
+        self.termination = None
+        self.version += 1
+        self.undo_version = self.version
+
+        return True, "Move undone"
+
+    def _find_move(self, from_sq, to_sq, promotion_piece=None):
+        """Legal encoded move from from_sq to to_sq, or None
+
+        Pawns reaching the last row promote to promotion_piece, defaulting
+        to a queen.
+        """
+        promotion = 0
+        if promotion_piece:
+            promotion = PROMOTION_CHOICES.get(str(promotion_piece).lower())
+            if promotion is None:
+                return None
+        candidates = [move for move in generate_legal(self.position, BB_SQUARES[from_sq], self.threats)
+                      if (move >> 6) & 63 == to_sq]
+        for move in candidates:
+            if move >> 12 in (0, promotion or QUEEN):
+                return move
+        return None
+
+    def is_valid_move(self, from_row, from_col, to_row, to_col):
+        if not (self._on_board(from_row, from_col) and self._on_board(to_row, to_col)):
+            return False
+        return self._find_move(square(from_row, from_col), square(to_row, to_col)) is not None
+
+    def legal_moves(self):
+        """Legal moves for the side to move as from/to/promotion dicts"""
+        side_offset = 6 * self.position.side
+        moves = []
+        for move in generate_legal(self.position, threats=self.threats):
+            promotion = move >> 12
+            moves.append({
+                'from': list(divmod(move & 63, 8)),
+                'to': list(divmod((move >> 6) & 63, 8)),
+                'promotion': PIECE_SYMBOLS[promotion + side_offset] if promotion else None
+            })
+        return moves
+
+    def book_moves(self, book):
+        """Opening book moves for the current position as from/to/promotion/weight dicts"""
+        side_offset = 6 * self.position.side
+        return [{
+            'from': list(divmod(move & 63, 8)),
+            'to': list(divmod((move >> 6) & 63, 8)),
+            'promotion': PIECE_SYMBOLS[(move >> 12) + side_offset] if move >> 12 else None,
+            'weight': weight
+        } for move, weight in book.moves(self.position)]
+
+    def probe_tablebase(self, tablebase):
+        """Tablebase verdict and best move for the current position, or None if not covered"""
+        best = tablebase.best_move(self.position)
+        if best is None:
+            return None
+        move, result = best
+        side_offset = 6 * self.position.side
+        verdict = tablebase.probe(self.position).to_dict()
+        verdict['best_move'] = {
+            'from': list(divmod(move & 63, 8)),
+            'to': list(divmod((move >> 6) & 63, 8)),
+            'promotion': PIECE_SYMBOLS[(move >> 12) + side_offset] if move >> 12 else None
+        }
+        return verdict
+
+    @property
+    def zobrist(self):
+        """64-bit Zobrist key of the current position"""
+        return self.position.zobrist
+
+    def repetition_count(self):
+        """How many times the current position has occurred in this game"""
+        return self.position_counts.get(self.position.zobrist, 0)
+
+    def is_threefold_repetition(self):
+        return self.repetition_count() >= 3
+
+    def check_game_end(self):
+        self.termination = termination(self.position, self.threats, self.repetition_count())
+        self.game_over = self.termination is not None
+
+    def check_flag(self, now=None):
+        """End the game if the side to move has run out of time; returns whether it did"""
+        if self.clock is None or self.game_over or not self.clock.flagged(now or datetime.now()):
+            return False
+        self.termination = timeout(self.position)
+        self.game_over = True
+        self.version += 1
+        return True
+
+    def restore_termination(self, termination):
+        """End a rebuilt game the way it ended, where its moves alone do not show it (a time forfeit)"""
+        if termination is not None and not self.game_over:
+            self.termination = termination
+            self.game_over = True
+
+    def clock_state(self):
+        """Remaining milliseconds per side right now, or None for untimed games"""
+        return None if self.clock is None else self.clock.to_dict(datetime.now())
+
+    @property
+    def in_check(self):
+        return bool(self.threats[0])
+
+    @property
+    def result(self):
+        """PGN result: '1-0', '0-1', '1/2-1/2', or '*' while the game goes on"""
+        return result(self.termination, self.position.side)
+
+    def has_valid_moves(self):
+        return has_legal_move(self.position, self.threats)
+
+    @property
+    def ply(self):
+        return len(self.move_history)
+
+    def move_delta(self, index=-1):
+        """Compact broadcast payload for one move of the history
+
+        Castling carries the rook's from/to as 'rook' and en passant the
+        captured pawn's square as 'captured_at', so clients can patch their
+        board without reloading it.
+        """
+        move = self.move_history[index]
+        ply = index % len(self.move_history) + 1
+        delta = {
+            'version': move['version'],
+            'ply': ply,
+            'from': move['from'],
+            'to': move['to'],
+            'piece': move['piece'],
+            'captured': move['captured'],
+            'promotion': move['promotion']
+        }
+        (from_row, from_col), (to_row, to_col) = move['from'], move['to']
+        if move['piece'] in 'Kk' and abs(to_col - from_col) == 2:
+            delta['rook'] = [[from_row, 7 if to_col > from_col else 0],
+                             [from_row, 5 if to_col > from_col else 3]]
+        if move.get('en_passant'):
+            delta['captured_at'] = [from_row, to_col]
+        if ply == len(self.move_history):
+            delta['current_player'] = self.current_player
+            delta['game_over'] = self.game_over
+            if self.clock is not None:
+                delta['clock'] = self.clock_state()
+        return delta
+
+    def changes_since(self, version):
+        """Deltas for moves played after version, or None if a snapshot is needed"""
+        if not isinstance(version, int) or version > self.version or version < self.undo_version:
+            return None
+        first = len(self.move_history)
+        while first and self.move_history[first - 1]['version'] > version:
+            first -= 1
+        return [self.move_delta(index) for index in range(first, len(self.move_history))]
+
+    def snapshot(self):
+        """Current position without the move history"""
+        return {
+            'version': self.version,
+            'ply': self.ply,
+            'fen': self.position.to_fen(),
+            'board': self.board,
+            'current_player': self.current_player,
+            'game_over': self.game_over,
+            'clock': self.clock_state(),
+            'players': self.players
+        }
+
+    def spectator_frame(self):
+        """Everything a spectator shows, in one self-contained frame"""
+        return {
+            'version': self.version,
+            'ply': self.ply,
+            'fen': self.position.to_fen(),
+            'last_move': self.move_delta() if self.move_history else None,
+            'current_player': self.current_player,
+            'in_check': self.in_check,
+            'game_over': self.game_over,
+            'termination': self.termination,
+            'result': self.result,
+            'clock': self.clock_state(),
+            'players': self.players
+        }
+
+    def sync_payload(self, version=None):
+        """What a (re)connecting client at version needs to catch up"""
+        moves = self.changes_since(version)
+        if moves is None:
+            return {'type': 'snapshot', 'version': self.version, 'state': self.snapshot()}
+        return {'type': 'delta', 'version': self.version, 'moves': moves,
+                'current_player': self.current_player, 'game_over': self.game_over}
+
+    def get_game_state(self):
+        return {
+            'version': self.version,
+            'ply': self.ply,
+            'board': self.board,
+            'current_player': self.current_player,
+            'fen': self.position.to_fen(),
+            'zobrist': format_key(self.position.zobrist),
+            'repetition_count': self.repetition_count(),
+            'move_history': self.move_history,
+            'game_over': self.game_over,
+            'in_check': self.in_check,
+            'termination': self.termination,
+            'result': self.result,
+            'clock': self.clock_state(),
+            'players': self.players
+        }
+
+    @staticmethod
+    def _on_board(row, col):
+        return isinstance(row, int) and isinstance(col, int) and 0 <= row < 8 and 0 <= col < 8
@@ -0,0 +1,312 @@
+"""
+Secondary indexes over finished games for search queries
+
+Games are indexed when they end, by player, result, termination, opening
+and creation time; a game that is taken back and ends again replaces its
+entry. Players are the names in the White and Black PGN tags (set from
+the player a client names when it sits down), not socket ids, which mean
+nothing once the client disconnects. A game's openings are the Zobrist keys of the
+positions after each of its first OPENING_PLIES plies, so a query for the
+position after 1.e4 c5 finds every Sicilian whatever the move order.
+Queries combine equality filters with a created_at range and return
+cursor-paginated pages, newest first, like GameStore.list_games.
+
+MemoryGameIndex keeps a sorted (created_at, game_id) list per indexed
+value and walks the shortest list that a query's filters select. It holds
+the newest max_games games and drops the oldest beyond that.
+SqliteGameIndex keeps the same indexes as SQLite tables, shared by every
+worker on the database.
+"""
+
+import bisect
+import re
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+from chess_engine.bitboard import STARTING_FEN, Position
+from chess_engine.movegen import play_move
+from chess_engine.notation import parse_san
+from chess_engine.store import DEFAULT_PAGE_SIZE, decode_cursor, encode_cursor
+from chess_engine.zobrist import format_key
+
+OPENING_PLIES = 16
+DEFAULT_MAX_INDEXED = 100000
+FINISHED_RESULTS = ('1-0', '0-1', '1/2-1/2')
+
+_MOVE_NUMBERS = re.compile(r'\d+\.+')
+
+
+def opening_keys(record):
+    """Zobrist keys (hex) of the positions after each of a record's first OPENING_PLIES moves"""
+    position = Position.from_fen(record.initial_fen)
+    keys = []
+    for move in record.moves[:OPENING_PLIES]:
+        play_move(position, move)
+        keys.append(format_key(position.zobrist))
+    return keys
+
+
+def opening_key(moves):
+    """Key of the position after SAN moves from the start ('1.e4 c5'); raises ValueError"""
+    position = Position.from_fen(STARTING_FEN)
+    tokens = _MOVE_NUMBERS.sub(' ', moves).split()
+    if not tokens or len(tokens) > OPENING_PLIES:
+        raise ValueError(f"An opening is 1 to {OPENING_PLIES} moves")
+    for token in tokens:
+        play_move(position, parse_san(position, token))
+    return format_key(position.zobrist)
+
+
+def player_name(tags, color):
+    """Name in a game's White or Black PGN tag, or None when the player is unknown"""
+    name = tags.get(color.capitalize())
+    return None if name in (None, '', '?') else name
+
+
+def index_entry(record):
+    """Search result entry for an ArchivedGame"""
+    return {
+        'id': record.game_id,
+        'white': player_name(record.tags, 'white'),
+        'black': player_name(record.tags, 'black'),
+        'result': record.result,
+        'termination': record.termination,
+        'plies': len(record.moves),
+        'created_at': record.created_at.isoformat()
+    }
+
+
+class GameIndex(ABC):
+    """Queryable index of finished games, fed ArchivedGame records"""
+
+    @abstractmethod
+    def add(self, record):
+        """Index a finished game, replacing any entry it already has"""
+        pass
+
+    @abstractmethod
+    def remove(self, game_id):
+        """Drop a game's entry, e.g. when its end is taken back"""
+        pass
+
+    @abstractmethod
+    def __contains__(self, game_id):
+        pass
+
+    @abstractmethod
+    def search(self, player=None, white=None, black=None, result=None, termination=None, opening=None,
+               created_after=None, created_before=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """One page of matching entries, newest first, and the cursor of the next page
+
+        player matches either color; opening is a key from opening_key;
+        created_after/created_before are ISO timestamps (exclusive).
+        """
+        pass
+
+    def add_all(self, records):
+        for record in records:
+            self.add(record)
+
+    def close(self):
+        pass
+
+
+class MemoryGameIndex(GameIndex):
+    """In-process index: a sorted (created_at, game_id) list per field value"""
+
+    FIELDS = ('player', 'white', 'black', 'result', 'termination', 'opening')
+
+    def __init__(self, max_games=DEFAULT_MAX_INDEXED):
+        self.max_games = max_games
+        self._lock = threading.Lock()
+        # game_id -> (entry, {field: values})
+        self._games = {}
+        self._all = []
+        # field -> value -> sorted keys
+        self._postings = {field: {} for field in self.FIELDS}
+
+    def __contains__(self, game_id):
+        return game_id in self._games
+
+    def __len__(self):
+        return len(self._games)
+
+    def add(self, record):
+        entry = index_entry(record)
+        values = {
+            'player': {entry['white'], entry['black']} - {None},
+            'white': {entry['white']} - {None},
+            'black': {entry['black']} - {None},
+            'result': {entry['result']},
+            'termination': {entry['termination']} - {None},
+            'opening': set(opening_keys(record)),
+        }
+        key = (entry['created_at'], entry['id'])
+        with self._lock:
+            self._remove(entry['id'])
+            self._games[entry['id']] = (entry, values)
+            bisect.insort(self._all, key)
+            for field, field_values in values.items():
+                postings = self._postings[field]
+                for value in field_values:
+                    bisect.insort(postings.setdefault(value, []), key)
+            while len(self._games) > self.max_games:
+                self._remove(self._all[0][1])
+
+    def remove(self, game_id):
+        with self._lock:
+            self._remove(game_id)
+
+    def _remove(self, game_id):
+        if game_id not in self._games:
+            return
+        entry, values = self._games.pop(game_id)
+        key = (entry['created_at'], game_id)
+        del self._all[bisect.bisect_left(self._all, key)]
+        for field, field_values in values.items():
+            postings = self._postings[field]
+            for value in field_values:
+                keys = postings[value]
+                del keys[bisect.bisect_left(keys, key)]
+                if not keys:
+                    del postings[value]
+
+    def search(self, player=None, white=None, black=None, result=None, termination=None, opening=None,
+               created_after=None, created_before=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        filters = {field: value for field, value in zip(
+            self.FIELDS, (player, white, black, result, termination, opening)) if value is not None}
+        with self._lock:
+            keys = min((self._postings[field].get(value, []) for field, value in filters.items()),
+                       key=len, default=self._all)
+            lower = 0 if created_after is None else bisect.bisect_right(
+                keys, created_after, key=lambda key: key[0])
+            upper = len(keys) if created_before is None else bisect.bisect_left(
+                keys, created_before, key=lambda key: key[0])
+            if cursor is not None:
+                upper = min(upper, bisect.bisect_left(keys, decode_cursor(cursor)))
+
+            page = []
+            for index in range(upper - 1, lower - 1, -1):
+                entry, values = self._games[keys[index][1]]
+                if any(value not in values[field] for field, value in filters.items()):
+                    continue
+                if len(page) == limit:
+                    return page, encode_cursor(page[-1])
+                page.append(entry)
+            return page, None
+
+
+class SqliteGameIndex(GameIndex):
+    """Index tables in a SQLite database (usually the SqliteGameStore's)"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS finished_games (
+            game_id TEXT PRIMARY KEY,
+            created_at TEXT NOT NULL,
+            white TEXT,
+            black TEXT,
+            result TEXT NOT NULL,
+            termination TEXT,
+            plies INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS finished_by_created ON finished_games (created_at, game_id);
+        CREATE INDEX IF NOT EXISTS finished_by_white ON finished_games (white, created_at, game_id);
+        CREATE INDEX IF NOT EXISTS finished_by_black ON finished_games (black, created_at, game_id);
+        CREATE INDEX IF NOT EXISTS finished_by_result ON finished_games (result, created_at, game_id);
+        CREATE INDEX IF NOT EXISTS finished_by_termination
+            ON finished_games (termination, created_at, game_id);
+        CREATE TABLE IF NOT EXISTS game_openings (
+            opening TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            game_id TEXT NOT NULL,
+            PRIMARY KEY (opening, created_at, game_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS openings_by_game ON game_openings (game_id);
+    """
+
+    ENTRY_COLUMNS = 'g.game_id, g.white, g.black, g.result, g.termination, g.plies, g.created_at'
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(self.SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __contains__(self, game_id):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT 1 FROM finished_games WHERE game_id = ?', (game_id,)).fetchone() is not None
+
+    def add(self, record):
+        entry = index_entry(record)
+        with self._lock, self._conn:
+            self._delete(entry['id'])
+            self._conn.execute(
+                'INSERT INTO finished_games (game_id, created_at, white, black, result, '
+                'termination, plies) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (entry['id'], entry['created_at'], entry['white'], entry['black'], entry['result'],
+                 entry['termination'], entry['plies']))
+            self._conn.executemany(
+                'INSERT INTO game_openings (opening, created_at, game_id) VALUES (?, ?, ?)',
+                [(key, entry['created_at'], entry['id']) for key in set(opening_keys(record))])
+
+    def remove(self, game_id):
+        with self._lock, self._conn:
+            self._delete(game_id)
+
+    def _delete(self, game_id):
+        self._conn.execute('DELETE FROM game_openings WHERE game_id = ?', (game_id,))
+        self._conn.execute('DELETE FROM finished_games WHERE game_id = ?', (game_id,))
+
+    def search(self, player=None, white=None, black=None, result=None, termination=None, opening=None,
+               created_after=None, created_before=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        # With an opening, game_openings drives the query in key order
+        source = 'o' if opening is not None else 'g'
+        tables = 'finished_games g'
+        clauses, params = [], []
+        if opening is not None:
+            tables = 'game_openings o JOIN finished_games g ON g.game_id = o.game_id'
+            clauses.append('o.opening = ?')
+            params.append(opening)
+        if player is not None:
+            clauses.append('(g.white = ? OR g.black = ?)')
+            params.extend((player, player))
+        for column, value in (('white', white), ('black', black), ('result', result),
+                              ('termination', termination)):
+            if value is not None:
+                clauses.append(f'g.{column} = ?')
+                params.append(value)
+        if created_after is not None:
+            clauses.append(f'{source}.created_at > ?')
+            params.append(created_after)
+        if created_before is not None:
+            clauses.append(f'{source}.created_at < ?')
+            params.append(created_before)
+        if cursor is not None:
+            clauses.append(f'({source}.created_at, {source}.game_id) < (?, ?)')
+            params.extend(decode_cursor(cursor))
+        where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT {self.ENTRY_COLUMNS} FROM {tables}{where} '
+                f'ORDER BY {source}.created_at DESC, {source}.game_id DESC LIMIT ?',
+                params + [limit + 1]).fetchall()
+        page = [dict(zip(('id', 'white', 'black', 'result', 'termination', 'plies', 'created_at'), row))
+                for row in rows[:limit]]
+        return page, encode_cursor(page[-1]) if len(rows) > limit else None
+
+
+def create_game_index(url):
+    """Index for a CHESS_GAME_STORE setting: in memory, or in the store's SQLite database"""
+    if not url or url == 'memory':
+        return MemoryGameIndex()
+    if url.startswith('sqlite:///'):
+        return SqliteGameIndex(url[len('sqlite:///'):])
+    raise ValueError(f"Unsupported game index '{url}'")
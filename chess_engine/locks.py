@@ -0,0 +1,36 @@
+"""
+Per-game locks for the threads that change games
+
+Each game gets its own reentrant lock, so changes to one game happen one
+at a time while different games change in parallel. Locks are created on
+first use and dropped once no thread holds or waits on them, so idle games
+cost nothing. The locks are per process; across workers the stores' version
+checks (GameConflictError) play the same role.
+"""
+
+import threading
+import weakref
+
+
+class GameLocks:
+    """Lock registry keyed by game_id
+
+        with game_locks(game_id):
+            game = games.get(game_id)
+            ...
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Holders and waiters keep a lock alive; nobody else does
+        self._locks = weakref.WeakValueDictionary()
+
+    def __call__(self, game_id):
+        with self._lock:
+            lock = self._locks.get(game_id)
+            if lock is None:
+                lock = self._locks[game_id] = threading.RLock()
+            return lock
+
+    def __len__(self):
+        return len(self._locks)
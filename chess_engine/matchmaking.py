@@ -0,0 +1,111 @@
+"""
+Matchmaking: pair waiting players of similar rating into new games
+
+Seekers wait in one pool per time control, each pool a list kept sorted by
+rating, so joining and leaving cost a binary search. Pairing runs in
+batches: every tick walks each pool once in rating order and pairs
+neighbours whose ratings are close enough. The accepted rating gap starts
+at RATING_BAND and widens the longer a seeker has waited, so nobody waits
+forever in a thin pool.
+"""
+
+import bisect
+import threading
+import time
+
+DEFAULT_RATING = 1500
+MIN_RATING, MAX_RATING = 100, 3500
+RATING_BAND = 100               # rating gap accepted straight away
+BAND_WIDENING = 50              # extra gap accepted per second of waiting
+MAX_RATING_BAND = 800
+MATCH_TICK = 1.0                # seconds between pairing passes
+
+
+class Seeker:
+    """A player waiting for a game"""
+
+    __slots__ = ('sid', 'rating', 'time_control', 'joined', 'player')
+
+    def __init__(self, sid, rating, time_control, joined, player=None):
+        self.sid = sid
+        self.rating = rating
+        self.time_control = time_control
+        self.joined = joined
+        # Name the player gave, kept on the game it is matched into
+        self.player = player
+
+    def band(self, now):
+        """Largest rating gap this seeker accepts at now"""
+        return min(RATING_BAND + BAND_WIDENING * (now - self.joined), MAX_RATING_BAND)
+
+    def to_dict(self):
+        return {'rating': self.rating, 'time_control': self.time_control}
+
+
+class MatchmakingQueue:
+    """Rating-sorted pools of seekers, one per time control (None for untimed games)"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._lock = threading.Lock()
+        # time control -> sorted [(rating, joined, sid)]
+        self._pools = {}
+        self._seekers = {}
+
+    def __len__(self):
+        return len(self._seekers)
+
+    def __contains__(self, sid):
+        return sid in self._seekers
+
+    def add(self, sid, rating=DEFAULT_RATING, time_control=None, player=None):
+        """Queue sid, replacing any seek it already has"""
+        with self._lock:
+            self._remove(sid)
+            seeker = Seeker(sid, rating, time_control, self.clock(), player)
+            self._seekers[sid] = seeker
+            bisect.insort(self._pools.setdefault(time_control, []), (rating, seeker.joined, sid))
+            return seeker
+
+    def remove(self, sid):
+        """Drop sid's seek; returns whether it had one"""
+        with self._lock:
+            return self._remove(sid)
+
+    def _remove(self, sid):
+        seeker = self._seekers.pop(sid, None)
+        if seeker is None:
+            return False
+        pool = self._pools[seeker.time_control]
+        del pool[bisect.bisect_left(pool, (seeker.rating, seeker.joined, sid))]
+        if not pool:
+            del self._pools[seeker.time_control]
+        return True
+
+    def tick(self):
+        """Pair every seeker that has a close enough neighbour; returns [(white, black)]
+
+        Of each pair, whoever has waited longer plays white.
+        """
+        pairs = []
+        with self._lock:
+            now = self.clock()
+            for time_control in list(self._pools):
+                pool = self._pools[time_control]
+                waiting = []
+                index = 0
+                while index < len(pool):
+                    if index + 1 < len(pool):
+                        first, second = (self._seekers[entry[2]] for entry in pool[index:index + 2])
+                        if second.rating - first.rating <= max(first.band(now), second.band(now)):
+                            pairs.append((first, second) if first.joined <= second.joined else (second, first))
+                            del self._seekers[first.sid], self._seekers[second.sid]
+                            index += 2
+                            continue
+                    waiting.append(pool[index])
+                    index += 1
+                if waiting:
+                    self._pools[time_control] = waiting
+                else:
+                    del self._pools[time_control]
+        return pairs
@@ -0,0 +1,254 @@
+"""
+Pseudo-legal and legal move generation for bitboard positions
+
+Moves are plain ints: from square in bits 0-5, to square in bits 6-11 and
+the promotion piece type (KNIGHT..QUEEN, 0 for none) in bits 12-14.
+"""
+
+from chess_engine.bitboard import (
+    BB_ALL, BB_SQUARES, BISHOP, BLACK_KINGSIDE, BLACK_QUEENSIDE, KING,
+    KING_ATTACKS, KNIGHT, KNIGHT_ATTACKS, PAWN, PAWN_ATTACKS, QUEEN, ROOK,
+    WHITE, WHITE_KINGSIDE, WHITE_QUEENSIDE, bishop_attacks, queen_attacks,
+    rook_attacks, square_name,
+)
+
+FILE_A = 0x0101010101010101
+FILE_H = 0x8080808080808080
+# Squares a single push lands on from the pawn's starting row
+WHITE_DOUBLE_PUSH_ROW = 0xFF << 40
+BLACK_DOUBLE_PUSH_ROW = 0xFF << 16
+PROMOTION_ROWS = (0xFF, 0xFF << 56)
+
+PROMOTION_TYPES = (QUEEN, ROOK, BISHOP, KNIGHT)
+
+# (right, king from, king to, squares that must be empty, squares the king crosses)
+CASTLING_MOVES = (
+    (WHITE_KINGSIDE, 60, 62, BB_SQUARES[61] | BB_SQUARES[62], (61,)),
+    (WHITE_QUEENSIDE, 60, 58, BB_SQUARES[57] | BB_SQUARES[58] | BB_SQUARES[59], (59,)),
+    (BLACK_KINGSIDE, 4, 6, BB_SQUARES[5] | BB_SQUARES[6], (5,)),
+    (BLACK_QUEENSIDE, 4, 2, BB_SQUARES[1] | BB_SQUARES[2] | BB_SQUARES[3], (3,)),
+)
+
+
+def encode_move(from_sq, to_sq, promotion=0):
+    return from_sq | (to_sq << 6) | (promotion << 12)
+
+
+def move_from(move):
+    return move & 63
+
+
+def move_to(move):
+    return (move >> 6) & 63
+
+
+def move_promotion(move):
+    return move >> 12
+
+
+def move_to_uci(move):
+    """Long algebraic form, e.g. 'e2e4' or 'e7e8q'"""
+    promotion = move >> 12
+    return (square_name(move & 63) + square_name((move >> 6) & 63) +
+            ('' if not promotion else 'pnbrqk'[promotion]))
+
+
+def play_move(position, move):
+    """Make an encoded move on a position (undo with position.unmake_move)"""
+    promotion = move >> 12
+    return position.make_move(move & 63, (move >> 6) & 63,
+                              promotion + 6 * position.side if promotion else None)
+
+
+def _add_targets(moves, from_sq, targets):
+    while targets:
+        lsb = targets & -targets
+        moves.append(from_sq | ((lsb.bit_length() - 1) << 6))
+        targets ^= lsb
+
+
+def _add_pawn_moves(moves, targets, delta, promotion_row):
+    """Add pawn moves for a set of targets that all came from target - delta"""
+    while targets:
+        lsb = targets & -targets
+        to_sq = lsb.bit_length() - 1
+        from_sq = to_sq - delta
+        if lsb & promotion_row:
+            for promotion in PROMOTION_TYPES:
+                moves.append(from_sq | (to_sq << 6) | (promotion << 12))
+        else:
+            moves.append(from_sq | (to_sq << 6))
+        targets ^= lsb
+
+
+def generate_pseudo_legal(position, from_mask=BB_ALL):
+    """All moves obeying piece movement rules, ignoring king safety
+
+    Castling is only generated when the king is not in check and does not
+    cross an attacked square; the landing square is left to the legality
+    check like any other king move.
+    """
+    moves = []
+    side = position.side
+    them = side ^ 1
+    offset = 6 * side
+    pieces = position.pieces
+    occupied = position.occupied
+    own = position.occupied_by[side]
+    enemy = position.occupied_by[them]
+    empty = ~occupied & BB_ALL
+    not_own = ~own & BB_ALL
+
+    # Pawns, set-wise
+    pawns = pieces[PAWN + offset] & from_mask
+    promotion_row = PROMOTION_ROWS[side]
+    if side == WHITE:
+        single = (pawns >> 8) & empty
+        double = ((single & WHITE_DOUBLE_PUSH_ROW) >> 8) & empty
+        _add_pawn_moves(moves, single, -8, promotion_row)
+        _add_pawn_moves(moves, double, -16, promotion_row)
+        _add_pawn_moves(moves, ((pawns & ~FILE_A) >> 9) & enemy, -9, promotion_row)
+        _add_pawn_moves(moves, ((pawns & ~FILE_H) >> 7) & enemy, -7, promotion_row)
+    else:
+        single = (pawns << 8) & empty
+        double = ((single & BLACK_DOUBLE_PUSH_ROW) << 8) & empty
+        _add_pawn_moves(moves, single, 8, promotion_row)
+        _add_pawn_moves(moves, double, 16, promotion_row)
+        _add_pawn_moves(moves, ((pawns & ~FILE_A) << 7) & enemy, 7, promotion_row)
+        _add_pawn_moves(moves, ((pawns & ~FILE_H) << 9) & enemy & BB_ALL, 9, promotion_row)
+
+    ep_square = position.ep_square
+    if ep_square is not None:
+        from_squares = PAWN_ATTACKS[them][ep_square] & pawns
+        while from_squares:
+            lsb = from_squares & -from_squares
+            moves.append((lsb.bit_length() - 1) | (ep_square << 6))
+            from_squares ^= lsb
+
+    # Leapers and sliders
+    for piece_type, attacks in ((KNIGHT, None), (BISHOP, bishop_attacks),
+                                (ROOK, rook_attacks), (QUEEN, queen_attacks)):
+        bb = pieces[piece_type + offset] & from_mask
+        while bb:
+            lsb = bb & -bb
+            from_sq = lsb.bit_length() - 1
+            if attacks is None:
+                targets = KNIGHT_ATTACKS[from_sq]
+            else:
+                targets = attacks(from_sq, occupied)
+            _add_targets(moves, from_sq, targets & not_own)
+            bb ^= lsb
+
+    king = pieces[KING + offset] & from_mask
+    if king:
+        king_sq = king.bit_length() - 1
+        _add_targets(moves, king_sq, KING_ATTACKS[king_sq] & not_own)
+        rights = position.castling
+        if rights & ((WHITE_KINGSIDE | WHITE_QUEENSIDE) if side == WHITE
+                     else (BLACK_KINGSIDE | BLACK_QUEENSIDE)):
+            for right, king_from, king_to, between, crossed in CASTLING_MOVES:
+                if (rights & right and king_sq == king_from and not occupied & between
+                        and not position.is_attacked(king_from, them)
+                        and not any(position.is_attacked(sq, them) for sq in crossed)):
+                    moves.append(king_from | (king_to << 6))
+    return moves
+
+
+def is_legal(position, move):
+    """Whether a pseudo-legal move leaves the mover's own king safe"""
+    from_sq = move & 63
+    to_sq = (move >> 6) & 63
+    side = position.side
+    them = side ^ 1
+    piece = position.mailbox[from_sq]
+    from_bb = BB_SQUARES[from_sq]
+    to_bb = BB_SQUARES[to_sq]
+
+    if piece % 6 == KING:
+        occupied = position.occupied ^ from_bb
+        return not position.attackers(to_sq, them, occupied) & ~to_bb
+
+    king_sq = position.king_square(side)
+    if king_sq is None:
+        return True
+    occupied = (position.occupied ^ from_bb) | to_bb
+    captured = to_bb
+    if piece % 6 == PAWN and to_sq == position.ep_square:
+        captured = BB_SQUARES[to_sq + 8 if side == WHITE else to_sq - 8]
+        occupied ^= captured
+    return not position.attackers(king_sq, them, occupied) & ~captured
+
+
+def king_threats(position):
+    """(checkers, pinned) bitboards for the side to move's king
+
+    checkers are the enemy pieces giving check; pinned are the mover's
+    pieces standing alone between the king and an enemy slider. Only rays
+    through the king square are walked, so this is cheap enough to run
+    after every move.
+    """
+    side = position.side
+    king_sq = position.king_square(side)
+    if king_sq is None:
+        return 0, 0
+    them = side ^ 1
+    offset = 6 * them
+    pieces = position.pieces
+    occupied = position.occupied
+    own = position.occupied_by[side]
+    checkers = position.attackers(king_sq, them)
+    queens = pieces[QUEEN + offset]
+    pinned = 0
+    king_bb = BB_SQUARES[king_sq]
+    for attacks, snipers in ((rook_attacks, pieces[ROOK + offset] | queens),
+                             (bishop_attacks, pieces[BISHOP + offset] | queens)):
+        snipers &= attacks(king_sq, 0)
+        while snipers:
+            lsb = snipers & -snipers
+            sniper_sq = lsb.bit_length() - 1
+            between = attacks(king_sq, lsb) & attacks(sniper_sq, king_bb) & occupied
+            if between and not between & (between - 1) and between & own:
+                pinned |= between
+            snipers ^= lsb
+    return checkers, pinned
+
+
+def _filter_legal(position, moves, threats):
+    """Legal moves among pseudo-legal ones, given the position's king_threats
+
+    Out of check, a move by a piece that is neither the king nor pinned
+    cannot expose the king, so only king moves, pinned pieces and en
+    passant captures need the full is_legal test.
+    """
+    checkers, pinned = threats
+    if checkers:
+        return [move for move in moves if is_legal(position, move)]
+    risky = pinned | position.pieces[KING + 6 * position.side]
+    ep_square = position.ep_square
+    return [move for move in moves
+            if not (BB_SQUARES[move & 63] & risky or (move >> 6) & 63 == ep_square)
+            or is_legal(position, move)]
+
+
+def generate_legal(position, from_mask=BB_ALL, threats=None):
+    """All legal moves for the side to move
+
+    threats is the position's king_threats, computed here when not given.
+    """
+    if threats is None:
+        threats = king_threats(position)
+    return _filter_legal(position, generate_pseudo_legal(position, from_mask), threats)
+
+
+def has_legal_move(position, threats=None):
+    """Whether the side to move has at least one legal move"""
+    if threats is None:
+        threats = king_threats(position)
+    checkers, pinned = threats
+    risky = pinned | position.pieces[KING + 6 * position.side]
+    ep_square = position.ep_square
+    for move in generate_pseudo_legal(position):
+        if (not checkers and not BB_SQUARES[move & 63] & risky and (move >> 6) & 63 != ep_square
+                or is_legal(position, move)):
+            return True
+    return False
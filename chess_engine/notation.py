@@ -0,0 +1,179 @@
+"""
+Standard algebraic notation (SAN) and PGN reading/writing
+"""
+
+import re
+
+from chess_engine.bitboard import KING, PAWN, parse_square, square_name
+from chess_engine.movegen import generate_legal, has_legal_move, move_to_uci, play_move
+
+PIECE_LETTERS = 'PNBRQK'
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+_TAG_PATTERN = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_MOVE_NUMBER_PATTERN = re.compile(r'^\d+\.+$')
+_SAN_PATTERN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+
+
+def move_to_san(position, move, legal_moves=None, with_suffix=True):
+    """SAN for a legal move in position, e.g. 'Nbd7', 'exd5', 'e8=Q+', 'O-O'"""
+    from_sq = move & 63
+    to_sq = (move >> 6) & 63
+    promotion = move >> 12
+    piece = position.mailbox[from_sq]
+    piece_type = piece % 6
+
+    if piece_type == KING and abs(to_sq - from_sq) == 2:
+        san = 'O-O' if to_sq > from_sq else 'O-O-O'
+    else:
+        capture = (position.mailbox[to_sq] is not None or
+                   (piece_type == PAWN and to_sq == position.ep_square))
+        if piece_type == PAWN:
+            san = (square_name(from_sq)[0] + 'x' if capture else '') + square_name(to_sq)
+            if promotion:
+                san += '=' + PIECE_LETTERS[promotion]
+        else:
+            if legal_moves is None:
+                legal_moves = generate_legal(position)
+            rivals = [other & 63 for other in legal_moves
+                      if other != move and (other >> 6) & 63 == to_sq
+                      and position.mailbox[other & 63] == piece]
+            name = square_name(from_sq)
+            if not rivals:
+                disambiguation = ''
+            elif all(rival & 7 != from_sq & 7 for rival in rivals):
+                disambiguation = name[0]
+            elif all(rival >> 3 != from_sq >> 3 for rival in rivals):
+                disambiguation = name[1]
+            else:
+                disambiguation = name
+            san = (PIECE_LETTERS[piece_type] + disambiguation + ('x' if capture else '') +
+                   square_name(to_sq))
+
+    if with_suffix:
+        play_move(position, move)
+        king_sq = position.king_square(position.side)
+        if king_sq is not None and position.is_attacked(king_sq, position.side ^ 1):
+            san += '+' if has_legal_move(position) else '#'
+        position.unmake_move()
+    return san
+
+
+def parse_san(position, text):
+    """Legal move for a SAN (or UCI) string; raises ValueError if none matches"""
+    token = text.strip().rstrip('+#!?').replace('0-0-0', 'O-O-O').replace('0-0', 'O-O')
+    legal_moves = generate_legal(position)
+    for move in legal_moves:
+        san = move_to_san(position, move, legal_moves, with_suffix=False)
+        if token == san or token == san.replace('=', ''):
+            return move
+
+    # Over-disambiguated or loosely written SAN, e.g. 'Rhg1' or 'exd6'
+    match = _SAN_PATTERN.match(token)
+    if match:
+        letter, from_file, from_rank, target, promotion = match.groups()
+        piece_type = PIECE_LETTERS.index(letter or 'P')
+        to_sq = parse_square(target)
+        candidates = [
+            move for move in legal_moves
+            if (move >> 6) & 63 == to_sq and position.mailbox[move & 63] % 6 == piece_type
+            and (from_file is None or square_name(move & 63)[0] == from_file)
+            and (from_rank is None or square_name(move & 63)[1] == from_rank)
+            and move >> 12 == (PIECE_LETTERS.index(promotion) if promotion else 0)
+        ]
+        if len(candidates) == 1:
+            return candidates[0]
+
+    for move in legal_moves:
+        if token.lower() == move_to_uci(move):
+            return move
+    raise ValueError(f"Illegal or ambiguous move '{text}'")
+
+
+def format_pgn(tags, position, moves, result, line_width=80):
+    """PGN text for moves played from position (which is left unchanged)"""
+    lines = [f'[{name} "{_escape(value)}"]' for name, value in tags.items()]
+    tokens = []
+    played = 0
+    for move in moves:
+        number = position.fullmove_number
+        if position.side == 0:
+            tokens.append(f'{number}.')
+        elif not tokens:
+            tokens.append(f'{number}...')
+        tokens.append(move_to_san(position, move))
+        play_move(position, move)
+        played += 1
+    for _ in range(played):
+        position.unmake_move()
+    tokens.append(result)
+
+    movetext, line = [], ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > line_width:
+            movetext.append(line)
+            line = token
+        else:
+            line = f'{line} {token}' if line else token
+    movetext.append(line)
+    return '\n'.join(lines) + '\n\n' + '\n'.join(movetext) + '\n'
+
+
+def parse_pgn(text):
+    """Tags, SAN move tokens and result of the first game in a PGN text
+
+    Comments, variations, NAGs and move numbers are skipped.
+    """
+    tags = {}
+    body_lines = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith('%'):
+            continue
+        match = _TAG_PATTERN.match(stripped)
+        if match and not body_lines:
+            tags[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+            continue
+        if match and body_lines:
+            break
+        body_lines.append(line.split(';', 1)[0])
+    body = re.sub(r'\{[^}]*\}', ' ', ' '.join(body_lines))
+
+    moves, depth, result = [], 0, tags.get('Result', '*')
+    for token in re.findall(r'\(|\)|[^\s()]+', body):
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif depth:
+            continue
+        elif token in RESULTS:
+            result = token
+            break
+        elif token.startswith('$'):
+            continue
+        else:
+            # Tokens like "12.e4" carry the move glued to its number
+            token = re.sub(r'^\d+\.+', '', token)
+            if token and not _MOVE_NUMBER_PATTERN.match(token):
+                moves.append(token)
+    return tags, moves, result
+
+
+def iter_pgn_games(text):
+    """Split a multi-game PGN text into one text per game"""
+    lines, in_movetext = [], False
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('[') and in_movetext:
+            yield '\n'.join(lines)
+            lines, in_movetext = [], False
+        elif stripped and not stripped.startswith(('[', '%')):
+            in_movetext = True
+        lines.append(line)
+    if in_movetext:
+        yield '\n'.join(lines)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
@@ -0,0 +1,214 @@
+"""
+Lazy SMP: one search spread over several processes sharing a transposition table
+
+The GIL keeps a threaded search on one core, so each searcher is a process.
+All of them search the same root and meet only in a transposition table
+held in shared memory: whatever one process learns about a position the
+others find there, which is where the speedup comes from. Helpers differ
+from the main searcher so they don't all walk the same tree in lockstep:
+odd helpers skip a depth and every helper orders the root moves shuffled
+behind the table move. The deepest completed result wins; the main
+searcher's on ties. Once the main searcher finishes the helpers are
+stopped, so a search never takes longer than a single-process one.
+
+Table slots are two 64-bit words, key ^ data and data, written without
+locks. A slot torn by two processes writing at once no longer XORs back to
+its key and reads as a miss.
+"""
+
+import ctypes
+import logging
+import multiprocessing
+import queue
+import random
+import threading
+import time
+
+from chess_engine.search import DIFFICULTY_LEVELS, SearchEngine, SearchResult, TranspositionTable, _SearchTimeout
+from chess_engine.tablebase import load_tablebase
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARED_TT_SIZE = 1 << 20
+
+# Seconds past the time limit to wait for a searcher before giving up on it
+RESULT_GRACE = 2.0
+
+# Packed slot data: move (16 bits), flag (2), depth (8), then score + SCORE_BIAS
+_SCORE_BIAS = 1 << 31
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """TranspositionTable over a shared array that several processes read and write"""
+
+    def __init__(self, size=DEFAULT_SHARED_TT_SIZE, buffer=None):
+        self.size = size
+        # A RawArray rather than SharedMemory: it is handed to worker
+        # processes as an argument and freed with the last of them
+        self.buffer = buffer if buffer is not None else multiprocessing.RawArray('Q', 2 * size)
+        self.slots = memoryview(self.buffer).cast('B').cast('Q')
+
+    def probe(self, key):
+        index = (key % self.size) * 2
+        data = self.slots[index + 1]
+        if self.slots[index] ^ data != key:
+            return None
+        return self._unpack(key, data)
+
+    def store(self, key, depth, score, flag, move):
+        index = (key % self.size) * 2
+        slots = self.slots
+        data = slots[index + 1]
+        stored_key = slots[index] ^ data
+        if data and stored_key != key and depth < (data >> 18) & 0xFF:
+            return
+        data = move | flag << 16 | min(depth, 0xFF) << 18 | (score + _SCORE_BIAS) << 26
+        slots[index] = key ^ data
+        slots[index + 1] = data
+
+    def clear(self):
+        ctypes.memset(self.buffer, 0, ctypes.sizeof(self.buffer))
+
+    @staticmethod
+    def _unpack(key, data):
+        return key, (data >> 18) & 0xFF, (data >> 26) - _SCORE_BIAS, (data >> 16) & 3, data & 0xFFFF
+
+
+class LazySMPEngine(SearchEngine):
+    """SearchEngine for one Lazy SMP process; worker 0 is the main searcher"""
+
+    def __init__(self, worker_id, generation, active, tt, tablebase=None):
+        super().__init__(tablebase=tablebase, tt=tt)
+        self.worker_id = worker_id
+        # The pool moves active off generation to stop this search
+        self.generation = generation
+        self.active = active
+        self.depth_offset = worker_id % 2
+        self.random = random.Random(worker_id)
+
+    def search(self, position, max_depth, time_limit=None):
+        # Odd helpers run depths 2..max_depth instead of 1..max_depth
+        result = super().search(position, max(max_depth - self.depth_offset, 1), time_limit)
+        if result.depth:
+            result.depth += self.depth_offset
+        return result
+
+    def _search_root(self, position, root_moves, depth):
+        return super()._search_root(position, root_moves, depth + self.depth_offset)
+
+    def _order_moves(self, position, moves, tt_move, ply):
+        super()._order_moves(position, moves, tt_move, ply)
+        if ply == 0 and self.worker_id:
+            rest = moves[1:]
+            self.random.shuffle(rest)
+            moves[1:] = rest
+
+    def _check_time(self):
+        if self.active.value != self.generation:
+            raise _SearchTimeout()
+        super()._check_time()
+
+
+def _worker(worker_id, buffer, size, tasks, results, active, tablebase_directory):
+    tt = SharedTranspositionTable(size, buffer)
+    tablebase = load_tablebase(tablebase_directory)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        generation, position, max_depth, time_limit = task
+        engine = LazySMPEngine(worker_id, generation, active, tt, tablebase)
+        result = engine.search(position, max_depth, time_limit)
+        results.put((generation, worker_id, result.move, result.score, result.depth,
+                     result.nodes, result.tablebase))
+
+
+class ParallelSearch:
+    """Pool of Lazy SMP search processes, started once and reused for every search
+
+    One search runs on the pool at a time; a search requested while it is
+    busy runs single-process in the caller instead of waiting.
+    """
+
+    def __init__(self, workers, tt_size=DEFAULT_SHARED_TT_SIZE, tablebase=None, context=None):
+        context = context or multiprocessing.get_context()
+        self.workers = workers
+        self.tt = SharedTranspositionTable(tt_size, context.RawArray('Q', 2 * tt_size))
+        self.tablebase = tablebase
+        # Generation of the search in progress, 0 when idle
+        self._active = context.RawValue('q', 0)
+        self._results = context.Queue()
+        self._tasks = [context.Queue() for _ in range(workers)]
+        self._lock = threading.Lock()
+        self._generation = 0
+        directory = tablebase.directory if tablebase is not None else None
+        self._processes = [
+            context.Process(target=_worker, name=f'chess-search-{worker_id}', daemon=True,
+                            args=(worker_id, self.tt.buffer, tt_size, tasks, self._results,
+                                  self._active, directory))
+            for worker_id, tasks in enumerate(self._tasks)
+        ]
+        for process in self._processes:
+            process.start()
+
+    def search(self, position, max_depth, time_limit=None):
+        """Search like SearchEngine.search, with every worker process on the root"""
+        if not self._lock.acquire(blocking=False):
+            return SearchEngine(tablebase=self.tablebase).search(position, max_depth, time_limit)
+        try:
+            return self._search(position, max_depth, time_limit)
+        finally:
+            self._lock.release()
+
+    def _search(self, position, max_depth, time_limit):
+        start = time.monotonic()
+        self._generation += 1
+        self._active.value = self._generation
+        for tasks in self._tasks:
+            tasks.put((self._generation, position, max_depth, time_limit))
+
+        deadline = start + time_limit + RESULT_GRACE if time_limit else None
+        results = {}
+        while len(results) < self.workers:
+            try:
+                timeout = max(deadline - time.monotonic(), 0) if deadline is not None else None
+                generation, worker_id, *result = self._results.get(timeout=timeout)
+            except queue.Empty:
+                logger.warning(f"{self.workers - len(results)} search workers did not answer in time")
+                break
+            if generation != self._generation:
+                continue        # a straggler from a search that gave up on it
+            results[worker_id] = result
+            if worker_id == 0:
+                self._active.value = 0
+        self._active.value = 0
+
+        if not results:
+            return SearchEngine(tablebase=self.tablebase).search(position, max_depth, time_limit)
+        best_id = max(results, key=lambda worker_id: (results[worker_id][2], worker_id == 0))
+        move, score, depth, _, from_tablebase = results[best_id]
+        nodes = sum(result[3] for result in results.values())
+        return SearchResult(move, score, depth, nodes, time.monotonic() - start, tablebase=from_tablebase)
+
+    def search_position(self, position, difficulty='medium', max_depth=None, time_limit=None):
+        """search() with a difficulty level's depth and time budget"""
+        settings = DIFFICULTY_LEVELS[difficulty]
+        return self.search(position,
+                           max_depth if max_depth is not None else settings['depth'],
+                           time_limit if time_limit is not None else settings['time_limit'])
+
+    def close(self):
+        self._active.value = 0
+        for tasks in self._tasks:
+            tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+
+def create_parallel_search(workers, tablebase=None):
+    """ParallelSearch for workers > 1, or None to search in the calling process"""
+    if workers <= 1:
+        return None
+    return ParallelSearch(workers, tablebase=tablebase)
@@ -0,0 +1,146 @@
+"""
+Perft: move generator correctness and throughput harness
+
+Counts leaf nodes of the legal move tree to a fixed depth and compares
+them with published reference values.
+
+Usage:
+    python -m chess_engine.perft                  # reference suite, depth 3
+    python -m chess_engine.perft --depth 4        # deeper suite run
+    python -m chess_engine.perft --fen "<FEN>" --depth 5 --divide
+"""
+
+import argparse
+import sys
+import time
+
+from chess_engine.bitboard import STARTING_FEN, Position
+from chess_engine.movegen import generate_legal, move_to_uci, play_move
+
+# (name, FEN, node counts for depth 1, 2, ...) from the chessprogramming.org
+# perft results page
+REFERENCE_POSITIONS = [
+    ('start', STARTING_FEN,
+     [20, 400, 8902, 197281, 4865609]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603]),
+    ('endgame', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624]),
+    ('promotions', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333]),
+    ('bugcatcher', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487]),
+    ('middlegame', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594]),
+]
+
+DEFAULT_DEPTH = 3
+
+
+def perft(position, depth):
+    """Number of leaf nodes of the legal move tree below position"""
+    moves = generate_legal(position)
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        play_move(position, move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move()
+    return nodes
+
+
+def divide(position, depth):
+    """Per-root-move node counts, for bisecting generator bugs"""
+    counts = {}
+    for move in generate_legal(position):
+        play_move(position, move)
+        counts[move_to_uci(move)] = perft(position, depth - 1)
+        position.unmake_move()
+    return counts
+
+
+class PerftResult:
+    """Node count and timing for one position at one depth"""
+
+    def __init__(self, name, fen, depth, nodes, elapsed, expected=None):
+        self.name = name
+        self.fen = fen
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.expected = expected
+
+    @property
+    def passed(self):
+        return self.expected is None or self.nodes == self.expected
+
+    @property
+    def nodes_per_second(self):
+        return int(self.nodes / self.elapsed) if self.elapsed > 0 else 0
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'fen': self.fen,
+            'depth': self.depth,
+            'nodes': self.nodes,
+            'expected': self.expected,
+            'passed': self.passed,
+            'time_ms': int(self.elapsed * 1000),
+            'nps': self.nodes_per_second
+        }
+
+
+def run_perft(fen, depth, expected=None, name='custom'):
+    """Time a perft run from a FEN"""
+    position = Position.from_fen(fen)
+    start = time.perf_counter()
+    nodes = perft(position, depth)
+    return PerftResult(name, fen, depth, nodes, time.perf_counter() - start, expected)
+
+
+def run_suite(depth=DEFAULT_DEPTH, positions=REFERENCE_POSITIONS):
+    """Run every reference position to depth (capped at its deepest known count)"""
+    results = []
+    for name, fen, counts in positions:
+        position_depth = min(depth, len(counts))
+        results.append(run_perft(fen, position_depth, counts[position_depth - 1], name))
+    return results
+
+
+def _print_result(result):
+    status = '' if result.expected is None else ('ok' if result.passed else f'FAIL (expected {result.expected})')
+    print(f"{result.name:<12} depth {result.depth}  {result.nodes:>10} nodes  "
+          f"{result.elapsed:8.2f}s  {result.nodes_per_second:>9} nps  {status}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Perft node counts for the chess move generator')
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH, help='search depth in plies')
+    parser.add_argument('--fen', help='position to count instead of the reference suite')
+    parser.add_argument('--divide', action='store_true', help='print per-move counts (with --fen)')
+    args = parser.parse_args(argv)
+
+    if args.fen:
+        if args.divide:
+            counts = divide(Position.from_fen(args.fen), args.depth)
+            for uci in sorted(counts):
+                print(f"{uci}: {counts[uci]}")
+            print(f"\nMoves: {len(counts)}  Nodes: {sum(counts.values())}")
+            return 0
+        _print_result(run_perft(args.fen, args.depth))
+        return 0
+
+    results = run_suite(args.depth)
+    for result in results:
+        _print_result(result)
+    total_nodes = sum(result.nodes for result in results)
+    total_time = sum(result.elapsed for result in results)
+    print(f"{'total':<12}          {total_nodes:>10} nodes  {total_time:8.2f}s  "
+          f"{int(total_nodes / total_time) if total_time else 0:>9} nps")
+    return 0 if all(result.passed for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
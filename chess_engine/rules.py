@@ -0,0 +1,69 @@
+"""
+Game-ending rules on top of move legality
+
+A game ends by checkmate or stalemate when the side to move has no legal
+move, and is drawn as soon as neither side can mate (insufficient
+material), fifty moves pass without a capture or pawn move, or a position
+occurs for the third time. Draws are applied automatically rather than
+waiting for a claim. In timed games a player whose flag falls loses, unless
+the opponent has only a king left.
+"""
+
+from chess_engine.bitboard import BISHOP, KING, KNIGHT, PAWN, QUEEN, ROOK, popcount
+from chess_engine.movegen import has_legal_move
+
+# How a game can end; archives store the index + 1, so only ever append
+TERMINATIONS = ('checkmate', 'stalemate', 'insufficient_material', 'fifty_move', 'repetition',
+                'timeout', 'timeout_vs_insufficient_material')
+
+# Plies without a capture or pawn move that draw the game
+FIFTY_MOVE_PLIES = 100
+REPETITION_LIMIT = 3
+
+LIGHT_SQUARES = 0xAA55AA55AA55AA55
+
+
+def insufficient_material(position):
+    """Whether no sequence of legal moves can mate: K vs K, one minor piece, or same-colored bishops"""
+    pieces = position.pieces
+    if any(pieces[piece_type] | pieces[piece_type + 6] for piece_type in (PAWN, ROOK, QUEEN)):
+        return False
+    knights = pieces[KNIGHT] | pieces[KNIGHT + 6]
+    bishops = pieces[BISHOP] | pieces[BISHOP + 6]
+    if popcount(knights | bishops) <= 1:
+        return True
+    return not knights and (not bishops & LIGHT_SQUARES or not bishops & ~LIGHT_SQUARES)
+
+
+def termination(position, threats, repetitions):
+    """One of TERMINATIONS for a position, or None while play continues
+
+    threats is the position's king_threats and repetitions the number of
+    times it has occurred in the game.
+    """
+    if not has_legal_move(position, threats):
+        return 'checkmate' if threats[0] else 'stalemate'
+    if insufficient_material(position):
+        return 'insufficient_material'
+    if position.halfmove_clock >= FIFTY_MOVE_PLIES:
+        return 'fifty_move'
+    if repetitions >= REPETITION_LIMIT:
+        return 'repetition'
+    return None
+
+
+def timeout(position):
+    """Termination when the side to move runs out of time"""
+    opponent = position.side ^ 1
+    if position.occupied_by[opponent] == position.pieces[KING + 6 * opponent]:
+        return 'timeout_vs_insufficient_material'
+    return 'timeout'
+
+
+def result(termination_name, side):
+    """PGN result for a termination with side (WHITE/BLACK) to move"""
+    if termination_name is None:
+        return '*'
+    if termination_name in ('checkmate', 'timeout'):
+        return '0-1' if side == 0 else '1-0'
+    return '1/2-1/2'
@@ -0,0 +1,339 @@
+"""
+Iterative-deepening alpha-beta search on top of the bitboard position
+
+Move ordering uses the transposition table move, MVV-LVA for captures,
+two killer moves per ply and a history heuristic for quiet moves. With a
+tablebase, positions it covers are scored exactly instead of searched.
+"""
+
+import time
+
+from chess_engine.bitboard import PAWN, popcount
+from chess_engine.evaluation import PIECE_VALUES, evaluate
+from chess_engine.movegen import generate_pseudo_legal, is_legal, move_to_uci, play_move
+
+INFINITY = 1000000
+MATE_SCORE = 100000
+MATE_THRESHOLD = MATE_SCORE - 1000
+MAX_PLY = 128
+
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+DEFAULT_TT_SIZE = 1 << 16
+
+# Depth and time budget per difficulty, mirroring the browser AI levels
+DIFFICULTY_LEVELS = {
+    'easy': {'depth': 2, 'time_limit': 1.0},
+    'medium': {'depth': 3, 'time_limit': 2.0},
+    'hard': {'depth': 4, 'time_limit': 3.0},
+    'expert': {'depth': 5, 'time_limit': 5.0},
+}
+
+# Ordering bands; each band outranks everything below it
+TT_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 24
+PROMOTION_SCORE = 1 << 23
+KILLER_SCORES = (1 << 22, 1 << 21)
+HISTORY_LIMIT = (1 << 20) - 1
+
+NODE_CHECK_INTERVAL = 2047
+
+
+class _SearchTimeout(Exception):
+    pass
+
+
+class TranspositionTable:
+    """Fixed-size, depth-preferred table of search results keyed by Zobrist hash"""
+
+    def __init__(self, size=DEFAULT_TT_SIZE):
+        self.size = size
+        self.entries = [None] * size
+
+    def probe(self, key):
+        entry = self.entries[key % self.size]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, flag, move):
+        index = key % self.size
+        entry = self.entries[index]
+        if entry is None or entry[0] == key or depth >= entry[1]:
+            self.entries[index] = (key, depth, score, flag, move)
+
+    def clear(self):
+        self.entries = [None] * self.size
+
+
+class SearchResult:
+    """Outcome of a completed (or time-limited) search"""
+
+    def __init__(self, move, score, depth, nodes, elapsed, tablebase=False):
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+        # True when the move came straight from the tablebase
+        self.tablebase = tablebase
+
+    @property
+    def nodes_per_second(self):
+        return int(self.nodes / self.elapsed) if self.elapsed > 0 else 0
+
+    def to_dict(self):
+        return {
+            'move': move_to_uci(self.move) if self.move else None,
+            'score': self.score,
+            'depth': self.depth,
+            'nodes': self.nodes,
+            'time_ms': int(self.elapsed * 1000),
+            'nps': self.nodes_per_second,
+            'tablebase': self.tablebase
+        }
+
+
+def _score_to_tt(score, ply):
+    if score > MATE_THRESHOLD:
+        return score + ply
+    if score < -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+
+def _score_from_tt(score, ply):
+    if score > MATE_THRESHOLD:
+        return score - ply
+    if score < -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+
+def tablebase_score(result, ply):
+    """Search score for a TablebaseResult seen ply plies from the root"""
+    if result.wdl > 0:
+        return MATE_SCORE - ply - result.dtm
+    if result.wdl < 0:
+        return -MATE_SCORE + ply + result.dtm
+    return 0
+
+
+class SearchEngine:
+    """Alpha-beta searcher; one instance per search thread
+
+    tt may be a table shared with other searchers (see chess_engine.parallel);
+    by default each engine gets a private one of tt_size slots.
+    """
+
+    def __init__(self, tt_size=DEFAULT_TT_SIZE, tablebase=None, tt=None):
+        self.tt = tt if tt is not None else TranspositionTable(tt_size)
+        self.tablebase = tablebase
+        self.tablebase_pieces = tablebase.max_pieces if tablebase is not None else 0
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = [[0] * 64 for _ in range(12)]
+        self.nodes = 0
+        self.deadline = None
+
+    def search(self, position, max_depth, time_limit=None):
+        """Search to max_depth, stopping early once time_limit seconds pass
+
+        The best move of the deepest fully completed iteration is returned,
+        so results are deterministic whenever the time limit is not hit.
+        The tree is walked with make/unmake on a private copy of position,
+        which a timeout may leave mid-line. Positions the tablebase covers
+        are answered from it without searching.
+        """
+        start = time.monotonic()
+        position = position.copy()
+        self.nodes = 0
+        self.deadline = start + time_limit if time_limit else None
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+
+        if popcount(position.occupied) <= self.tablebase_pieces:
+            best = self.tablebase.best_move(position)
+            if best is not None:
+                move, result = best
+                return SearchResult(move, tablebase_score(result, 0), 0, 0,
+                                    time.monotonic() - start, tablebase=True)
+
+        root_moves = [move for move in generate_pseudo_legal(position)
+                      if is_legal(position, move)]
+        if not root_moves:
+            return SearchResult(0, 0, 0, 0, time.monotonic() - start)
+
+        best_move, best_score, completed_depth = root_moves[0], 0, 0
+        for depth in range(1, max_depth + 1):
+            try:
+                score, move = self._search_root(position, root_moves, depth)
+            except _SearchTimeout:
+                break
+            best_move, best_score, completed_depth = move, score, depth
+            if abs(score) > MATE_THRESHOLD:
+                break
+        return SearchResult(best_move, best_score, completed_depth, self.nodes,
+                            time.monotonic() - start)
+
+    def _search_root(self, position, root_moves, depth):
+        self._order_moves(position, root_moves, self._tt_move(position), 0)
+        alpha, beta = -INFINITY, INFINITY
+        best_move = root_moves[0]
+        for move in root_moves:
+            play_move(position, move)
+            score = -self._alpha_beta(position, depth - 1, -beta, -alpha, 1)
+            position.unmake_move()
+            if score > alpha:
+                alpha, best_move = score, move
+        self.tt.store(position.zobrist, depth, _score_to_tt(alpha, 0), EXACT, best_move)
+        return alpha, best_move
+
+    def _tt_move(self, position):
+        entry = self.tt.probe(position.zobrist)
+        return entry[4] if entry else 0
+
+    def _check_time(self):
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise _SearchTimeout()
+
+    def _alpha_beta(self, position, depth, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & NODE_CHECK_INTERVAL:
+            self._check_time()
+
+        if position.halfmove_clock >= 100 or position.is_repetition():
+            return 0
+
+        if popcount(position.occupied) <= self.tablebase_pieces:
+            result = self.tablebase.probe(position)
+            if result is not None:
+                return tablebase_score(result, ply)
+
+        side = position.side
+        king_sq = position.king_square(side)
+        in_check = king_sq is not None and position.is_attacked(king_sq, side ^ 1)
+        if in_check:
+            depth += 1
+        if depth <= 0 or ply >= MAX_PLY - 1:
+            return self._quiesce(position, alpha, beta, ply)
+
+        key = position.zobrist
+        entry = self.tt.probe(key)
+        tt_move = 0
+        if entry is not None:
+            tt_move = entry[4]
+            if entry[1] >= depth:
+                score = _score_from_tt(entry[2], ply)
+                flag = entry[3]
+                if (flag == EXACT or (flag == LOWER_BOUND and score >= beta)
+                        or (flag == UPPER_BOUND and score <= alpha)):
+                    return score
+
+        moves = generate_pseudo_legal(position)
+        self._order_moves(position, moves, tt_move, ply)
+        original_alpha = alpha
+        best_score, best_move = -INFINITY, 0
+        legal_moves = 0
+        mailbox = position.mailbox
+        for move in moves:
+            if not is_legal(position, move):
+                continue
+            legal_moves += 1
+            play_move(position, move)
+            score = -self._alpha_beta(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score > best_score:
+                best_score, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        to_sq = (move >> 6) & 63
+                        if mailbox[to_sq] is None and not move >> 12:
+                            self._record_quiet_cutoff(mailbox[move & 63], move, depth, ply)
+                        break
+
+        if not legal_moves:
+            return -MATE_SCORE + ply if in_check else 0
+
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.tt.store(key, depth, _score_to_tt(best_score, ply), flag, best_move)
+        return best_score
+
+    def _quiesce(self, position, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & NODE_CHECK_INTERVAL:
+            self._check_time()
+
+        stand_pat = evaluate(position)
+        if stand_pat >= beta or ply >= MAX_PLY - 1:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        mailbox = position.mailbox
+        ep_square = position.ep_square
+        captures = [move for move in generate_pseudo_legal(position)
+                    if mailbox[(move >> 6) & 63] is not None or move >> 12
+                    or ((move >> 6) & 63 == ep_square and mailbox[move & 63] % 6 == PAWN)]
+        self._order_moves(position, captures, 0, ply)
+        for move in captures:
+            if not is_legal(position, move):
+                continue
+            play_move(position, move)
+            score = -self._quiesce(position, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def _record_quiet_cutoff(self, piece, move, depth, ply):
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        history = self.history[piece]
+        to_sq = (move >> 6) & 63
+        history[to_sq] = min(history[to_sq] + depth * depth, HISTORY_LIMIT)
+
+    def _order_moves(self, position, moves, tt_move, ply):
+        mailbox = position.mailbox
+        ep_square = position.ep_square
+        killer_first, killer_second = self.killers[ply]
+        history = self.history
+
+        def score(move):
+            if move == tt_move:
+                return TT_MOVE_SCORE
+            to_sq = (move >> 6) & 63
+            attacker = mailbox[move & 63]
+            victim = mailbox[to_sq]
+            if victim is None and to_sq == ep_square and attacker % 6 == PAWN:
+                victim = PAWN
+            if victim is not None:
+                return CAPTURE_SCORE + PIECE_VALUES[victim % 6] * 8 - attacker % 6
+            if move >> 12:
+                return PROMOTION_SCORE + (move >> 12)
+            if move == killer_first:
+                return KILLER_SCORES[0]
+            if move == killer_second:
+                return KILLER_SCORES[1]
+            return history[attacker][to_sq]
+
+        moves.sort(key=score, reverse=True)
+
+
+def search_position(position, difficulty='medium', max_depth=None, time_limit=None,
+                    tt_size=DEFAULT_TT_SIZE, tablebase=None):
+    """Search a position using a difficulty level's depth and time budget"""
+    settings = DIFFICULTY_LEVELS[difficulty]
+    return SearchEngine(tt_size, tablebase).search(
+        position,
+        max_depth if max_depth is not None else settings['depth'],
+        time_limit if time_limit is not None else settings['time_limit'],
+    )
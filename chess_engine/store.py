@@ -0,0 +1,601 @@
+"""
+Pluggable game stores behind chess_app.games
+
+MemoryGameStore keeps games in an LRU with TTL eviction of idle and
+finished games. SqliteGameStore persists games in a WAL-mode SQLite
+database, appending one row per move, and loads games lazily into an
+in-memory LRU cache.
+
+Both list games newest first through list_games, a cursor-paginated query
+over indexes kept up to date as games change, so a lobby poll costs
+O(log n + page size) rather than a scan of every game.
+"""
+
+import base64
+import bisect
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+
+from chess_engine.bitboard import STARTING_FEN
+from chess_engine.clock import TimeControl
+from chess_engine.game import ChessGame
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_GAMES = 10000
+DEFAULT_IDLE_TTL = 24 * 60 * 60      # seconds an untouched game is kept
+DEFAULT_FINISHED_TTL = 10 * 60       # seconds a finished game is kept
+SWEEP_INTERVAL = 30                  # minimum seconds between TTL sweeps
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Bits of an open-seat mask
+SEAT_BITS = {'white': 1, 'black': 2}
+STATUSES = ('active', 'finished')
+
+
+class GameConflictError(Exception):
+    """A save lost a race with another worker; the store has reloaded the game"""
+
+
+def open_seat_mask(players):
+    """Bitmask of the seats in a players dict that nobody holds"""
+    return sum(bit for color, bit in SEAT_BITS.items() if players.get(color) is None)
+
+
+def game_summary(game):
+    """Listing entry for a game, as returned by GET /api/games"""
+    mask = open_seat_mask(game.players)
+    return {
+        'id': game.game_id,
+        'players': game.players,
+        'open_seats': [color for color, bit in SEAT_BITS.items() if mask & bit],
+        'created_at': game.created_at.isoformat(),
+        'game_over': game.game_over
+    }
+
+
+def encode_cursor(summary):
+    """Opaque cursor resuming a listing after summary"""
+    raw = f"{summary['created_at']}|{summary['id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, game_id) for a cursor; raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, game_id = raw.split('|', 1)
+        datetime.fromisoformat(created_at)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    return created_at, game_id
+
+
+class GameStore(ABC):
+    """Mapping-style access to games, keyed by game_id"""
+
+    @abstractmethod
+    def get(self, game_id):
+        """Game for game_id (loading it if needed), or None"""
+        pass
+
+    @abstractmethod
+    def add(self, game):
+        """Store a newly created game"""
+        pass
+
+    @abstractmethod
+    def save_move(self, game):
+        """Persist the move just appended to game.move_history
+
+        Raises GameConflictError if another worker changed the game first.
+        """
+        pass
+
+    @abstractmethod
+    def save(self, game):
+        """Persist any other change to a game (players and their names, undone moves)
+
+        Raises GameConflictError if another worker changed the game first.
+        """
+        pass
+
+    @abstractmethod
+    def remove(self, game_id):
+        pass
+
+    @abstractmethod
+    def summaries(self):
+        """Listing entries for every stored game"""
+        pass
+
+    @abstractmethod
+    def list_games(self, status=None, open_seat=None, created_after=None, created_before=None,
+                   cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """One page of listing entries, newest first, and the cursor of the next page
+
+        status is 'active' or 'finished'; open_seat is 'any', 'white' or
+        'black' and selects unfinished games with that seat free;
+        created_after/created_before are ISO timestamps (exclusive).
+        """
+        pass
+
+    @abstractmethod
+    def listing_version(self):
+        """Token that changes whenever a listing result may have changed"""
+        pass
+
+    def __contains__(self, game_id):
+        return self.get(game_id) is not None
+
+    def __getitem__(self, game_id):
+        game = self.get(game_id)
+        if game is None:
+            raise KeyError(game_id)
+        return game
+
+    def __setitem__(self, game_id, game):
+        self.add(game)
+
+    def __delitem__(self, game_id):
+        self.remove(game_id)
+
+
+class MemoryGameStore(GameStore):
+    """In-process LRU of games with TTL eviction
+
+    Games untouched for idle_ttl seconds, finished games untouched for
+    finished_ttl seconds, and the least recently used games beyond
+    max_games are dropped.
+
+    Listings are served from sorted (created_at, game_id) lists per
+    status and for games with an open seat; a game moves between them
+    when it is saved, so queries never scan the whole store.
+    """
+
+    def __init__(self, max_games=DEFAULT_MAX_GAMES, idle_ttl=DEFAULT_IDLE_TTL,
+                 finished_ttl=DEFAULT_FINISHED_TTL, clock=time.monotonic):
+        self.max_games = max_games
+        self.idle_ttl = idle_ttl
+        self.finished_ttl = finished_ttl
+        self.clock = clock
+        # game_id -> (game, last access time), least recently used first
+        self._games = OrderedDict()
+        self._lock = threading.RLock()
+        self._last_sweep = clock()
+        # Index name -> sorted (created_at, game_id) keys
+        self._index = {'all': [], 'active': [], 'finished': [], 'open': []}
+        # game_id -> (key, index names) the game is currently listed under
+        self._indexed = {}
+        self._listing_version = 0
+
+    def __len__(self):
+        return len(self._games)
+
+    def get(self, game_id):
+        with self._lock:
+            self._sweep()
+            entry = self._games.get(game_id)
+            if entry is None:
+                return None
+            self._touch(entry[0])
+            return entry[0]
+
+    def add(self, game):
+        with self._lock:
+            self._touch(game)
+            self._reindex(game)
+            while len(self._games) > self.max_games:
+                evicted_id, _ = self._games.popitem(last=False)
+                self._unindex(evicted_id)
+                logger.info(f"Evicted least recently used game {evicted_id}")
+
+    def save_move(self, game):
+        self.add(game)
+
+    def save(self, game):
+        with self._lock:
+            # Seat holders are part of the listing even when no index changes
+            self._listing_version += 1
+            self.add(game)
+
+    def remove(self, game_id):
+        with self._lock:
+            self._games.pop(game_id, None)
+            self._unindex(game_id)
+
+    def summaries(self):
+        with self._lock:
+            self._sweep()
+            return [game_summary(game) for game, _ in self._games.values()]
+
+    def list_games(self, status=None, open_seat=None, created_after=None, created_before=None,
+                   cursor=None, limit=DEFAULT_PAGE_SIZE):
+        with self._lock:
+            self._sweep()
+            if open_seat:
+                if status == 'finished':
+                    return [], None
+                keys = self._index['open']
+            else:
+                keys = self._index[status or 'all']
+            seat_bit = SEAT_BITS.get(open_seat, 0)
+
+            lower = 0 if created_after is None else bisect.bisect_right(
+                keys, created_after, key=lambda key: key[0])
+            upper = len(keys) if created_before is None else bisect.bisect_left(
+                keys, created_before, key=lambda key: key[0])
+            if cursor is not None:
+                upper = min(upper, bisect.bisect_left(keys, decode_cursor(cursor)))
+
+            page = []
+            for index in range(upper - 1, lower - 1, -1):
+                game = self._games[keys[index][1]][0]
+                if seat_bit and not open_seat_mask(game.players) & seat_bit:
+                    continue
+                if len(page) == limit:
+                    return page, encode_cursor(page[-1])
+                page.append(game_summary(game))
+            return page, None
+
+    def listing_version(self):
+        return self._listing_version
+
+    def evict_expired(self):
+        """Drop idle and finished games past their TTL; returns how many"""
+        with self._lock:
+            now = self.clock()
+            self._last_sweep = now
+            expired = [game_id for game_id, (game, last_access) in self._games.items()
+                       if now - last_access > (self.finished_ttl if game.game_over else self.idle_ttl)]
+            for game_id in expired:
+                del self._games[game_id]
+                self._unindex(game_id)
+            if expired:
+                logger.info(f"Evicted {len(expired)} expired games")
+            return len(expired)
+
+    def _touch(self, game):
+        self._games[game.game_id] = (game, self.clock())
+        self._games.move_to_end(game.game_id)
+
+    def _sweep(self):
+        if self.clock() - self._last_sweep >= SWEEP_INTERVAL:
+            self.evict_expired()
+
+    def _reindex(self, game):
+        """Move game between listing indexes after a change; O(log n) to find"""
+        names = ('all', 'finished' if game.game_over else 'active')
+        if not game.game_over and open_seat_mask(game.players):
+            names += ('open',)
+        entry = self._indexed.get(game.game_id)
+        if entry is not None and entry[1] == names:
+            return
+        self._unindex(game.game_id)
+        key = (game.created_at.isoformat(), game.game_id)
+        for name in names:
+            bisect.insort(self._index[name], key)
+        self._indexed[game.game_id] = (key, names)
+        self._listing_version += 1
+
+    def _unindex(self, game_id):
+        entry = self._indexed.pop(game_id, None)
+        if entry is None:
+            return
+        key, names = entry
+        for name in names:
+            keys = self._index[name]
+            del keys[bisect.bisect_left(keys, key)]
+        self._listing_version += 1
+
+
+class SqliteGameStore(GameStore):
+    """SQLite-backed store with write-ahead logging and append-only moves
+
+    Only games a request touches are replayed into memory; the cache is a
+    MemoryGameStore, so evicting from it never loses state. Several worker
+    processes may share one database: once another connection has
+    committed (PRAGMA data_version moves), a cached game is checked against
+    its row before use and replayed again if it changed.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS games (
+            game_id TEXT PRIMARY KEY,
+            initial_fen TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            players TEXT NOT NULL,
+            pgn_tags TEXT NOT NULL DEFAULT '{}',
+            game_over INTEGER NOT NULL DEFAULT 0,
+            version INTEGER NOT NULL DEFAULT 0,
+            undo_version INTEGER NOT NULL DEFAULT 0,
+            open_seats INTEGER NOT NULL DEFAULT 3,
+            time_control TEXT,
+            termination TEXT,
+            updated_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS moves (
+            game_id TEXT NOT NULL,
+            ply INTEGER NOT NULL,
+            from_sq INTEGER NOT NULL,
+            to_sq INTEGER NOT NULL,
+            promotion TEXT,
+            timestamp TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (game_id, ply)
+        ) WITHOUT ROWID;
+    """
+
+    # Created after migrations, since they index migrated columns
+    INDEXES = """
+        CREATE INDEX IF NOT EXISTS games_by_created ON games (created_at, game_id);
+        CREATE INDEX IF NOT EXISTS games_by_status ON games (game_over, created_at, game_id);
+        CREATE INDEX IF NOT EXISTS games_open ON games (created_at, game_id)
+            WHERE open_seats != 0 AND game_over = 0;
+    """
+
+    # Columns added after the first schema: (table, column, definition)
+    MIGRATIONS = [
+        ('games', 'version', 'INTEGER NOT NULL DEFAULT 0'),
+        ('games', 'undo_version', 'INTEGER NOT NULL DEFAULT 0'),
+        ('moves', 'version', 'INTEGER NOT NULL DEFAULT 0'),
+        ('games', 'open_seats', 'INTEGER NOT NULL DEFAULT 3'),
+        ('games', 'time_control', 'TEXT'),
+        ('games', 'termination', 'TEXT'),
+    ]
+
+    SUMMARY_COLUMNS = 'game_id, players, open_seats, created_at, game_over'
+
+    def __init__(self, path, cache_size=1000, cache_idle_ttl=15 * 60, clock=time.monotonic):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(self.SCHEMA)
+        self._migrate()
+        self._conn.executescript(self.INDEXES)
+        self._changes = 0
+        # data_version at the last check, and the cached games verified since
+        self._data_version = None
+        self._fresh = set()
+        # game_id -> version of the row this worker last read or wrote; writes
+        # only apply on top of it, so a worker with a stale game cannot clobber
+        self._row_versions = {}
+        self._cache = MemoryGameStore(max_games=cache_size, idle_ttl=cache_idle_ttl,
+                                      finished_ttl=cache_idle_ttl, clock=clock)
+
+    def _migrate(self):
+        for table, column, definition in self.MIGRATIONS:
+            columns = [row[1] for row in self._conn.execute(f'PRAGMA table_info({table})')]
+            if column not in columns:
+                logger.info(f"Adding column {table}.{column}")
+                with self._conn:
+                    self._conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+                    if column == 'open_seats':
+                        rows = self._conn.execute('SELECT game_id, players FROM games').fetchall()
+                        self._conn.executemany(
+                            'UPDATE games SET open_seats = ? WHERE game_id = ?',
+                            [(open_seat_mask(json.loads(players)), game_id) for game_id, players in rows])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get(self, game_id):
+        with self._lock:
+            data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version != self._data_version:
+                self._data_version = data_version
+                self._fresh.clear()
+            game = self._cache.get(game_id)
+            if game is not None and game_id not in self._fresh and self._is_stale(game):
+                logger.info(f"Reloading game {game_id} changed by another worker")
+                self._cache.remove(game_id)
+                game = None
+            if game is None:
+                game = self._load(game_id)
+                if game is not None:
+                    self._cache.add(game)
+            if game is not None:
+                self._fresh.add(game_id)
+            return game
+
+    def add(self, game):
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO games (game_id, initial_fen, created_at, players, '
+                'pgn_tags, game_over, version, undo_version, open_seats, time_control, termination, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (game.game_id, game.initial_fen, game.created_at.isoformat(),
+                 json.dumps(game.players), json.dumps(game.pgn_tags), int(game.game_over),
+                 game.version, game.undo_version, open_seat_mask(game.players),
+                 None if game.clock is None else str(game.clock.time_control), game.termination, time.time()))
+            self._conn.execute('DELETE FROM moves WHERE game_id = ?', (game.game_id,))
+            self._conn.executemany(
+                'INSERT INTO moves (game_id, ply, from_sq, to_sq, promotion, timestamp, version) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [self._move_row(game, ply) for ply in range(len(game.move_history))])
+            self._changes += 1
+            self._row_versions[game.game_id] = game.version
+            self._cache.add(game)
+
+    def save_move(self, game):
+        with self._lock:
+            try:
+                with self._conn:
+                    self._update_row(game, 'game_over = ?, termination = ?, version = ?',
+                                     (int(game.game_over), game.termination, game.version))
+                    self._conn.execute(
+                        'INSERT INTO moves (game_id, ply, from_sq, to_sq, promotion, timestamp, version) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)', self._move_row(game, len(game.move_history) - 1))
+            except sqlite3.IntegrityError:
+                self._conflict(game.game_id)
+            if game.game_over:
+                self._changes += 1
+            self._row_versions[game.game_id] = game.version
+            self._cache.add(game)
+
+    def save(self, game):
+        with self._lock:
+            try:
+                with self._conn:
+                    self._update_row(
+                        game, 'players = ?, pgn_tags = ?, game_over = ?, termination = ?, version = ?, '
+                        'undo_version = ?, open_seats = ?',
+                        (json.dumps(game.players), json.dumps(game.pgn_tags), int(game.game_over),
+                         game.termination, game.version, game.undo_version, open_seat_mask(game.players)))
+                    self._conn.execute('DELETE FROM moves WHERE game_id = ? AND ply >= ?',
+                                       (game.game_id, len(game.move_history)))
+            except sqlite3.IntegrityError:
+                self._conflict(game.game_id)
+            self._changes += 1
+            self._row_versions[game.game_id] = game.version
+            self._cache.add(game)
+
+    def _update_row(self, game, assignments, values):
+        # Applies only on top of the row version this worker last saw
+        updated = self._conn.execute(
+            f'UPDATE games SET {assignments}, updated_at = ? WHERE game_id = ? AND version = ?',
+            values + (time.time(), game.game_id, self._row_versions.get(game.game_id))).rowcount
+        if not updated:
+            raise sqlite3.IntegrityError(f"Game {game.game_id} changed since this worker loaded it")
+
+    def _conflict(self, game_id):
+        # The transaction rolled back; drop the diverged game and serve the stored one
+        logger.warning(f"Game {game_id} was changed by another worker; reloading it")
+        self._cache.remove(game_id)
+        self._fresh.discard(game_id)
+        self._row_versions.pop(game_id, None)
+        game = self._load(game_id)
+        if game is not None:
+            self._cache.add(game)
+            self._fresh.add(game_id)
+        raise GameConflictError(f"Game {game_id} was changed by another worker")
+
+    def remove(self, game_id):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM moves WHERE game_id = ?', (game_id,))
+            self._conn.execute('DELETE FROM games WHERE game_id = ?', (game_id,))
+            self._changes += 1
+            self._cache.remove(game_id)
+            self._fresh.discard(game_id)
+            self._row_versions.pop(game_id, None)
+
+    def summaries(self):
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT {self.SUMMARY_COLUMNS} FROM games ORDER BY created_at').fetchall()
+        return [self._summary(row) for row in rows]
+
+    def list_games(self, status=None, open_seat=None, created_after=None, created_before=None,
+                   cursor=None, limit=DEFAULT_PAGE_SIZE):
+        clauses, params, index = [], [], ''
+        if status is not None:
+            clauses.append('game_over = ?')
+            params.append(int(status == 'finished'))
+        if open_seat:
+            # Spelled exactly as the games_open partial index condition
+            clauses.append('open_seats != 0 AND game_over = 0')
+            index = ' INDEXED BY games_open'
+            if open_seat in SEAT_BITS:
+                clauses.append('(open_seats & ?) != 0')
+                params.append(SEAT_BITS[open_seat])
+        if created_after is not None:
+            clauses.append('created_at > ?')
+            params.append(created_after)
+        if created_before is not None:
+            clauses.append('created_at < ?')
+            params.append(created_before)
+        if cursor is not None:
+            clauses.append('(created_at, game_id) < (?, ?)')
+            params.extend(decode_cursor(cursor))
+        where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT {self.SUMMARY_COLUMNS} FROM games{index}{where} '
+                'ORDER BY created_at DESC, game_id DESC LIMIT ?', params + [limit + 1]).fetchall()
+        page = [self._summary(row) for row in rows[:limit]]
+        return page, encode_cursor(page[-1]) if len(rows) > limit else None
+
+    def listing_version(self):
+        # data_version moves when another connection (e.g. another worker) commits
+        with self._lock:
+            data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        return f'{self._changes}.{data_version}'
+
+    @staticmethod
+    def _summary(row):
+        game_id, players, mask, created_at, game_over = row
+        return {'id': game_id, 'players': json.loads(players),
+                'open_seats': [color for color, bit in SEAT_BITS.items() if mask & bit],
+                'created_at': created_at, 'game_over': bool(game_over)}
+
+    def _is_stale(self, game):
+        row = self._conn.execute(
+            'SELECT version, undo_version, players, game_over, '
+            '(SELECT COUNT(*) FROM moves WHERE moves.game_id = games.game_id) '
+            'FROM games WHERE game_id = ?', (game.game_id,)).fetchone()
+        return row is None or row != (self._row_versions.get(game.game_id), game.undo_version,
+                                      json.dumps(game.players), int(game.game_over),
+                                      len(game.move_history))
+
+    @staticmethod
+    def _move_row(game, ply):
+        move = game.move_history[ply]
+        return (game.game_id, ply, move['from'][0] * 8 + move['from'][1],
+                move['to'][0] * 8 + move['to'][1], move['promotion'], move['timestamp'], move['version'])
+
+    def _load(self, game_id):
+        row = self._conn.execute(
+            'SELECT initial_fen, created_at, players, pgn_tags, version, undo_version, time_control, '
+            'termination FROM games WHERE game_id = ?', (game_id,)).fetchone()
+        if row is None:
+            return None
+        initial_fen, created_at, players, pgn_tags, version, undo_version, time_control, termination = row
+        game = ChessGame(game_id, fen=None if initial_fen == STARTING_FEN else initial_fen)
+        game.created_at = datetime.fromisoformat(created_at)
+        game.players = json.loads(players)
+        game.pgn_tags = json.loads(pgn_tags)
+        if time_control:
+            game.set_time_control(TimeControl.parse(time_control))
+        moves = self._conn.execute(
+            'SELECT from_sq, to_sq, promotion, timestamp, version FROM moves '
+            'WHERE game_id = ? ORDER BY ply', (game_id,)).fetchall()
+        for from_sq, to_sq, promotion, timestamp, move_version in moves:
+            # Replayed at their stored times, so clocks come back as they were
+            success, message = game.make_move(from_sq // 8, from_sq % 8, to_sq // 8, to_sq % 8, promotion,
+                                              datetime.fromisoformat(timestamp))
+            if not success:
+                logger.error(f"Stored move {from_sq}->{to_sq} of game {game_id} failed to replay: {message}")
+                break
+            if move_version:
+                game.move_history[-1]['version'] = move_version
+        # A time forfeit is not in the moves; the result follows from the termination
+        game.restore_termination(termination)
+        # Rows written before versioning keep the versions the replay produced
+        if version:
+            game.version = version
+            game.undo_version = undo_version
+        if len(self._row_versions) > 2 * self._cache.max_games:
+            # Forget games the cache has dropped; they are re-read on load
+            self._row_versions = {cached_id: row_version for cached_id, row_version in self._row_versions.items()
+                                  if cached_id in self._cache._games}
+        self._row_versions[game_id] = version
+        return game
+
+
+def create_game_store(url):
+    """Store for a CHESS_GAME_STORE setting: 'memory' or 'sqlite:///path/to/games.db'"""
+    if not url or url == 'memory':
+        return MemoryGameStore()
+    if url.startswith('sqlite:///'):
+        return SqliteGameStore(url[len('sqlite:///'):])
+    raise ValueError(f"Unsupported game store '{url}'")
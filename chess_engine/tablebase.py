@@ -0,0 +1,397 @@
+"""
+Endgame tablebases: memory-mapped local tables with win/draw/loss and
+distance to mate
+
+A table covers one material signature such as 'KQvK' (white pieces, then
+black). It holds one byte per position, indexed by side to move and then by
+the square of each piece: white pieces in KQRBNP order, then black pieces
+in the same order, with equal pieces sorted by square. So a table of n
+pieces is 2 * 64**n bytes. Positions with the colors swapped ('KvKQ') are
+probed by mirroring the board. The prober reads any table of up to five
+pieces; the generator builds the three-piece K+X vs K tables by
+retrograde analysis, with no network access needed.
+
+Usage:
+    python -m chess_engine.tablebase build tablebases/          # KQvK, KRvK, KPvK
+    python -m chess_engine.tablebase probe tablebases/ --fen "<FEN>"
+"""
+
+import argparse
+import logging
+import mmap
+import os
+import sys
+import time
+from array import array
+
+from chess_engine.bitboard import (
+    BISHOP, BLACK, BB_SQUARES, KING, KING_ATTACKS, KNIGHT, KNIGHT_ATTACKS, PAWN, PAWN_ATTACKS, QUEEN,
+    ROOK, WHITE, Position, bishop_attacks, iter_squares, popcount, queen_attacks, rook_attacks,
+)
+from chess_engine.movegen import generate_legal, move_to_uci, play_move
+
+logger = logging.getLogger(__name__)
+
+MAX_PIECES = 5
+TABLE_SUFFIX = '.tb'
+PIECE_ORDER = (KING, QUEEN, ROOK, BISHOP, KNIGHT, PAWN)
+PIECE_LETTERS = 'PNBRQK'
+DEFAULT_TABLES = ('KQvK', 'KRvK', 'KPvK')
+# Material that can never mate needs no table
+DRAWN_SIGNATURES = frozenset(('KvK', 'KBvK', 'KNvK', 'KvKB', 'KvKN'))
+
+# Value bytes: 0 draw, 1-127 side to move mates in that many plies,
+# 128-254 side to move is mated in (value - 128) plies, 255 illegal
+DRAW = 0
+LOSS_BASE = 128
+ILLEGAL = 255
+MAX_DTM = 126
+
+
+class TablebaseResult:
+    """Outcome for the side to move: wdl is 1, 0 or -1; dtm is plies to mate (None for draws)"""
+
+    def __init__(self, wdl, dtm=None):
+        self.wdl = wdl
+        self.dtm = dtm
+
+    @classmethod
+    def from_value(cls, value):
+        if value == DRAW:
+            return cls(0)
+        if value < LOSS_BASE:
+            return cls(1, value)
+        return cls(-1, value - LOSS_BASE)
+
+    def to_dict(self):
+        return {'wdl': ('loss', 'draw', 'win')[self.wdl + 1], 'dtm': self.dtm}
+
+
+def material_signature(position):
+    """'KQvK'-style signature of the pieces on the board"""
+    sides = []
+    for color in (WHITE, BLACK):
+        sides.append(''.join(PIECE_LETTERS[piece_type] * popcount(position.pieces[piece_type + 6 * color])
+                             for piece_type in PIECE_ORDER))
+    return 'v'.join(sides)
+
+
+def table_index(position, mirror=False):
+    """Index of position in its table; mirror swaps colors and flips the board"""
+    index = position.side ^ mirror
+    for color in (WHITE, BLACK):
+        for piece_type in PIECE_ORDER:
+            squares = sorted(sq ^ 56 if mirror else sq
+                             for sq in iter_squares(position.pieces[piece_type + 6 * (color ^ mirror)]))
+            for sq in squares:
+                index = index * 64 + sq
+    return index
+
+
+class Tablebase:
+    """Prober over a directory of .tb tables, mapped lazily on first use"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._paths = {}
+        self._tables = {}
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(TABLE_SUFFIX):
+                self._paths[name[:-len(TABLE_SUFFIX)]] = os.path.join(directory, name)
+
+    @property
+    def signatures(self):
+        return sorted(self._paths)
+
+    @property
+    def max_pieces(self):
+        return max((len(signature) - 1 for signature in self._paths), default=0)
+
+    def close(self):
+        for table, handle in self._tables.values():
+            table.close()
+            handle.close()
+        self._tables = {}
+
+    def _table(self, signature):
+        if signature not in self._tables:
+            path = self._paths[signature]
+            handle = open(path, 'rb')
+            expected = 2 * 64 ** (len(signature) - 1)
+            if os.fstat(handle.fileno()).st_size != expected:
+                handle.close()
+                raise ValueError(f"Tablebase {path} should be {expected} bytes")
+            self._tables[signature] = (mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ), handle)
+        return self._tables[signature][0]
+
+    def probe(self, position):
+        """TablebaseResult for position, or None if no table covers it"""
+        if position.castling or self._can_capture_en_passant(position):
+            return None
+        signature = material_signature(position)
+        if signature in DRAWN_SIGNATURES:
+            return TablebaseResult(0)
+        if len(signature) - 1 > MAX_PIECES:
+            return None
+        if signature in self._paths:
+            value = self._table(signature)[table_index(position)]
+        else:
+            white, black = signature.split('v')
+            mirrored = f'{black}v{white}'
+            if mirrored not in self._paths:
+                return None
+            value = self._table(mirrored)[table_index(position, mirror=True)]
+        if value == ILLEGAL:
+            return None
+        return TablebaseResult.from_value(value)
+
+    @staticmethod
+    def _can_capture_en_passant(position):
+        # After any double push the FEN carries an ep square; it only matters if a pawn can take
+        if position.ep_square is None:
+            return False
+        return bool(PAWN_ATTACKS[position.side ^ 1][position.ep_square] & position.pieces[PAWN + 6 * position.side])
+
+    def best_move(self, position):
+        """(move, TablebaseResult) of the fastest win, a draw, or the longest loss
+
+        Returns None when the position is not covered.
+        """
+        root = self.probe(position)
+        if root is None:
+            return None
+        best, best_rank = None, None
+        for move in generate_legal(position):
+            play_move(position, move)
+            reply = self.probe(position)
+            position.unmake_move()
+            if reply is None:
+                continue
+            result = (TablebaseResult(0) if reply.wdl == 0
+                      else TablebaseResult(-reply.wdl, reply.dtm + 1))
+            # Prefer wins (shortest first), then draws, then losses (longest first)
+            rank = (result.wdl, -result.dtm if result.wdl > 0 else (result.dtm or 0))
+            if best_rank is None or rank > best_rank:
+                best, best_rank = (move, result), rank
+        return best
+
+
+def _piece_attacks(piece_type, sq, occupied):
+    if piece_type == QUEEN:
+        return queen_attacks(sq, occupied)
+    if piece_type == ROOK:
+        return rook_attacks(sq, occupied)
+    if piece_type == BISHOP:
+        return bishop_attacks(sq, occupied)
+    if piece_type == KNIGHT:
+        return KNIGHT_ATTACKS[sq]
+    return PAWN_ATTACKS[WHITE][sq]
+
+
+def _promotion_value(tablebase, promotion, white_king, to_sq, black_king):
+    """Value for black to move after white promotes on to_sq"""
+    signature = f'K{PIECE_LETTERS[promotion]}vK'
+    if signature in DRAWN_SIGNATURES:
+        return DRAW
+    if tablebase is None or signature not in tablebase.signatures:
+        raise ValueError(f"Build {signature} before tables that promote into it")
+    index = ((BLACK * 64 + white_king) * 64 + to_sq) * 64 + black_king
+    return tablebase._table(signature)[index]
+
+
+def generate_three_piece(signature, tablebase=None):
+    """Table bytes for a 'KXvK' signature by retrograde analysis
+
+    Pawn tables look promotions up in tablebase, which must already hold
+    the KQvK and KRvK tables.
+    """
+    if len(signature) != 4 or signature[0] != 'K' or signature[2:] != 'vK' or signature[1] not in 'QRBNP':
+        raise ValueError(f"Can only generate K+X vs K tables, not '{signature}'")
+    piece_type = PIECE_LETTERS.index(signature[1])
+    size = 2 * 64 ** 3
+    values = bytearray([ILLEGAL]) * size
+    resolved = bytearray(size)
+    # Children not yet known to be wins for the opponent
+    remaining = array('B', bytes(size))
+    # Positions with a move out of the table that does not lose
+    can_draw = bytearray(size)
+    # Positions whose parents have been updated
+    done = bytearray(size)
+    # Ply -> positions that may resolve to a win or loss at that ply
+    buckets = [[] for _ in range(MAX_DTM + 2)]
+
+    # Pass 1: legality, move counts, checkmates and moves that leave the table
+    for white_king in range(64):
+        for piece_sq in range(64):
+            if piece_sq == white_king or (piece_type == PAWN and piece_sq >> 3 in (0, 7)):
+                continue
+            for black_king in range(64):
+                if black_king in (white_king, piece_sq) or KING_ATTACKS[white_king] & BB_SQUARES[black_king]:
+                    continue
+                kings = BB_SQUARES[white_king] | BB_SQUARES[black_king]
+                occupied = kings | BB_SQUARES[piece_sq]
+                in_check = bool(_piece_attacks(piece_type, piece_sq, kings) & BB_SQUARES[black_king])
+                base = (white_king * 64 + piece_sq) * 64 + black_king
+
+                if not in_check:
+                    index = WHITE * 64 ** 3 + base
+                    values[index] = DRAW
+                    targets = KING_ATTACKS[white_king] & ~occupied & ~KING_ATTACKS[black_king]
+                    children = popcount(targets)
+                    exits = 0
+                    if piece_type == PAWN:
+                        push = piece_sq - 8
+                        if not occupied & BB_SQUARES[push]:
+                            if push >> 3 == 0:
+                                # Promotions leave the table; queue the fastest win once
+                                fastest = None
+                                for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                                    value = _promotion_value(tablebase, promotion, white_king, push, black_king)
+                                    exits += 1
+                                    if value == DRAW:
+                                        can_draw[index] = 1
+                                    elif LOSS_BASE <= value < ILLEGAL:
+                                        ply = value - LOSS_BASE + 1
+                                        fastest = ply if fastest is None else min(fastest, ply)
+                                if fastest is not None:
+                                    can_draw[index] = 1
+                                    buckets[fastest].append(index)
+                            else:
+                                children += 1
+                                if piece_sq >> 3 == 6 and not occupied & BB_SQUARES[piece_sq - 16]:
+                                    children += 1
+                    else:
+                        children += popcount(_piece_attacks(piece_type, piece_sq, occupied) & ~occupied)
+                    remaining[index] = children
+                    if not children and not exits:
+                        resolved[index] = 1        # stalemate
+
+                index = BLACK * 64 ** 3 + base
+                values[index] = DRAW
+                children = 0
+                for target in iter_squares(KING_ATTACKS[black_king] & ~KING_ATTACKS[white_king]):
+                    if target == piece_sq:
+                        can_draw[index] = 1        # capturing the piece leaves a draw
+                    elif not _piece_attacks(piece_type, piece_sq, BB_SQUARES[white_king] | BB_SQUARES[target]) & BB_SQUARES[target]:
+                        children += 1
+                remaining[index] = children
+                if not children and not can_draw[index]:
+                    resolved[index] = 1
+                    if in_check:
+                        values[index] = LOSS_BASE
+                        buckets[0].append(index)
+
+    # Pass 2: walk back from decided positions one ply at a time
+    for ply in range(MAX_DTM + 1):
+        for index in buckets[ply]:
+            if done[index]:
+                continue
+            done[index] = 1
+            if not resolved[index]:
+                # A win reached by leaving the table (promotion)
+                resolved[index] = 1
+                values[index] = ply
+            win = values[index] < LOSS_BASE
+            for parent in _predecessors(piece_type, index):
+                if values[parent] == ILLEGAL or resolved[parent]:
+                    continue
+                if not win:
+                    resolved[parent] = 1
+                    values[parent] = ply + 1
+                    buckets[ply + 1].append(parent)
+                else:
+                    remaining[parent] -= 1
+                    if not remaining[parent] and not can_draw[parent]:
+                        resolved[parent] = 1
+                        values[parent] = LOSS_BASE + ply + 1
+                        buckets[ply + 1].append(parent)
+    if buckets[MAX_DTM + 1]:
+        raise ValueError(f"{signature} has mates longer than {MAX_DTM} plies")
+    return values
+
+
+def _predecessors(piece_type, index):
+    """Indexes of the positions one move before index (never a capture)"""
+    side, base = divmod(index, 64 ** 3)
+    white_king, rest = divmod(base, 64 * 64)
+    piece_sq, black_king = divmod(rest, 64)
+    occupied = BB_SQUARES[white_king] | BB_SQUARES[piece_sq] | BB_SQUARES[black_king]
+    parents = []
+    if side == BLACK:
+        # White just moved: the king or the piece
+        parent_base = WHITE * 64 ** 3
+        for origin in iter_squares(KING_ATTACKS[white_king] & ~occupied & ~KING_ATTACKS[black_king]):
+            parents.append(parent_base + (origin * 64 + piece_sq) * 64 + black_king)
+        if piece_type == PAWN:
+            origins = []
+            if piece_sq >> 3 < 6 and not occupied & BB_SQUARES[piece_sq + 8]:
+                origins.append(piece_sq + 8)
+                if piece_sq >> 3 == 4 and not occupied & BB_SQUARES[piece_sq + 16]:
+                    origins.append(piece_sq + 16)
+        else:
+            origins = iter_squares(_piece_attacks(piece_type, piece_sq, occupied) & ~occupied)
+        for origin in origins:
+            parents.append(parent_base + (white_king * 64 + origin) * 64 + black_king)
+    else:
+        parent_base = BLACK * 64 ** 3 + (white_king * 64 + piece_sq) * 64
+        for origin in iter_squares(KING_ATTACKS[black_king] & ~occupied & ~KING_ATTACKS[white_king]):
+            parents.append(parent_base + origin)
+    return parents
+
+
+def build_tables(directory, signatures=DEFAULT_TABLES):
+    """Generate tables into directory in order; returns {signature: seconds taken}"""
+    os.makedirs(directory, exist_ok=True)
+    timings = {}
+    for signature in signatures:
+        start = time.perf_counter()
+        tablebase = Tablebase(directory)
+        values = generate_three_piece(signature, tablebase)
+        tablebase.close()
+        path = os.path.join(directory, signature + TABLE_SUFFIX)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(values)
+        os.replace(path + '.tmp', path)
+        timings[signature] = time.perf_counter() - start
+    return timings
+
+
+def load_tablebase(directory):
+    """Tablebase for directory, or None when it holds no tables"""
+    if not directory or not os.path.isdir(directory):
+        return None
+    tablebase = Tablebase(directory)
+    return tablebase if tablebase.signatures else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or probe endgame tablebases')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    build_parser = subcommands.add_parser('build', help='generate K+X vs K tables')
+    build_parser.add_argument('directory', help='output directory')
+    build_parser.add_argument('signatures', nargs='*', default=list(DEFAULT_TABLES),
+                              help='tables to build, in order (default: KQvK KRvK KPvK)')
+    probe_parser = subcommands.add_parser('probe', help='look up a position')
+    probe_parser.add_argument('directory', help='directory holding .tb tables')
+    probe_parser.add_argument('--fen', required=True, help='position to look up')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        for signature, elapsed in build_tables(args.directory, args.signatures).items():
+            print(f"{signature}: {elapsed:.1f}s")
+        return 0
+
+    tablebase = Tablebase(args.directory)
+    position = Position.from_fen(args.fen)
+    result = tablebase.probe(position)
+    if result is None:
+        print("Position not covered by the tables")
+        return 1
+    best = tablebase.best_move(position)
+    print(f"{result.to_dict()}  best move: {move_to_uci(best[0]) if best else '-'}")
+    tablebase.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
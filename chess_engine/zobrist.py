@@ -0,0 +1,39 @@
+"""
+Zobrist keys for incremental 64-bit position hashing
+
+Keys come from a fixed seed so position hashes are stable across processes
+and restarts (they are stored in move history and used as cache keys).
+"""
+
+import random
+
+ZOBRIST_SEED = 0x5EED_C0FFEE
+
+_rng = random.Random(ZOBRIST_SEED)
+
+# PIECE_KEYS[piece_index][square]
+PIECE_KEYS = tuple(tuple(_rng.getrandbits(64) for _ in range(64)) for _ in range(12))
+# Toggled whenever black is to move
+SIDE_KEY = _rng.getrandbits(64)
+# CASTLING_KEYS[rights bitmask]: XOR of the keys of each right held
+_CASTLING_RIGHT_KEYS = [_rng.getrandbits(64) for _ in range(4)]
+
+
+def _castling_key(rights):
+    key = 0
+    for bit in range(4):
+        if rights >> bit & 1:
+            key ^= _CASTLING_RIGHT_KEYS[bit]
+    return key
+
+
+CASTLING_KEYS = tuple(_castling_key(rights) for rights in range(16))
+# EP_FILE_KEYS[col]: hashed only when an en passant capture is available
+EP_FILE_KEYS = tuple(_rng.getrandbits(64) for _ in range(8))
+
+del _rng
+
+
+def format_key(key):
+    """Fixed-width hex form used in JSON (64-bit ints overflow JS numbers)"""
+    return '%016x' % key
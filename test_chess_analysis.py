@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test script for batch position analysis and its streaming route
+"""
+
+import json
+
+import chess_app
+from chess_engine.analysis import BatchAnalyzer, analyze_position
+from chess_engine.search import MATE_THRESHOLD
+
+SCHOLARS_MATE = 'r1bqkbnr/1ppp1ppp/p1n5/4p3/2B1P3/5Q2/PPPP1PPP/RNB1K1NR w KQkq - 0 4'
+CHECKMATED = 'rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3'
+START = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+
+def test_analyze_position():
+    """Test the evaluation, move count and search of single positions"""
+    result = analyze_position(SCHOLARS_MATE, 2)
+    assert result['legal_moves'] == 42 and not result['game_over']
+    assert result['search']['move'] == 'f3f7' and result['search']['score'] > MATE_THRESHOLD
+    assert analyze_position(START, 1)['static_eval'] == 0
+
+    result = analyze_position(CHECKMATED, 2)
+    assert result['game_over'] and result['legal_moves'] == 0 and result['search'] is None
+    try:
+        analyze_position('not a fen', 2)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("analyzed an invalid FEN")
+
+
+def test_batch_analyzer():
+    """Test that every position comes back once, with its index, across chunks"""
+    analyzer = BatchAnalyzer(2)
+    try:
+        fens = [START, SCHOLARS_MATE, 'not a fen', CHECKMATED] * 3
+        results = list(analyzer.analyze(fens, 2, 30, chunk_size=2))
+        assert sorted(result['index'] for result in results) == list(range(12))
+        for result in results:
+            if fens[result['index']] == 'not a fen':
+                assert 'error' in result
+            elif fens[result['index']] == SCHOLARS_MATE:
+                assert result['search']['move'] == 'f3f7'
+    finally:
+        analyzer.close()
+
+
+def test_analyze_batch_route():
+    """Test NDJSON streaming for FENs and game ids, and request validation"""
+    client = chess_app.app.test_client()
+    game_id = client.post('/api/games/from_fen', json={'fen': SCHOLARS_MATE}).get_json()['game_id']
+    original = chess_app.batch_analyzer
+    chess_app.batch_analyzer = BatchAnalyzer(2)
+    try:
+        response = client.post('/api/analyze/batch', json={
+            'positions': [START, {'game_id': game_id}, {'game_id': 'missing'}, 'bad'], 'depth': 2})
+        assert response.status_code == 200 and response.mimetype == 'application/x-ndjson'
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        results = {line['index']: line for line in lines}
+        assert sorted(results) == [0, 1, 2, 3]
+        assert results[0]['search']['depth'] == 2 and 'game_id' not in results[0]
+        assert results[1]['game_id'] == game_id and results[1]['search']['move'] == 'f3f7'
+        assert results[2] == {'index': 2, 'game_id': 'missing', 'error': 'Game not found'}
+        assert 'error' in results[3]
+
+        for body in ({}, {'positions': []}, {'positions': [START], 'depth': 0},
+                     {'positions': [START], 'depth': True}, {'positions': [START], 'time_limit': 60},
+                     {'positions': [START] * 10001}, {'positions': [START] * 151},
+                     {'positions': [START] * 1000, 'time_limit': 0.5}):
+            assert client.post('/api/analyze/batch', json=body).status_code == 400, body
+    finally:
+        chess_app.batch_analyzer.close()
+        chess_app.batch_analyzer = original
+
+
+if __name__ == "__main__":
+    test_analyze_position()
+    test_batch_analyzer()
+    test_analyze_batch_route()
+    print("✅ All batch analysis tests passed")
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Test script for the binary game archive
+"""
+
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+import chess_app
+from chess_engine import ChessGame
+from chess_engine.archive import ArchiveReader, ArchivedGame, ArchiveWriter, read_varint, write_varint
+from chess_engine.clock import TimeControl
+
+FOOLS_MATE = [(6, 5, 5, 5), (1, 4, 3, 4), (6, 6, 4, 6), (0, 3, 4, 7)]
+
+
+def random_game(game_id, rng):
+    """Game of random legal moves with one second between moves"""
+    game = ChessGame(game_id)
+    game.created_at = datetime(2024, 5, 1, 12, 0, 0)
+    game.players = {'white': f'{game_id}-w', 'black': None}
+    for ply in range(rng.randrange(1, 120)):
+        moves = game.legal_moves()
+        if not moves:
+            break
+        move = rng.choice(moves)
+        game.make_move(*move['from'], *move['to'], move['promotion'])
+        game.move_history[-1]['timestamp'] = (game.created_at + timedelta(seconds=ply + 1)).isoformat()
+    return game
+
+
+def test_varints():
+    """Test varint round trips around the byte boundaries"""
+    for value in (0, 1, 127, 128, 300, 16383, 16384, 2 ** 40 + 5):
+        out = bytearray()
+        write_varint(out, value)
+        assert read_varint(out + b'\xff', 0) == (value, len(out))
+    out = bytearray()
+    write_varint(out, 127)
+    write_varint(out, 128)
+    assert len(out) == 3
+
+
+def test_record_round_trip():
+    """Test that a record keeps moves, promotions, clocks, tags and the start FEN"""
+    game = ChessGame.from_fen('promo', '8/4P3/8/p7/8/8/k7/4K3 w - - 0 1')
+    game.pgn_tags = {'Event': 'Archive test'}
+    game.make_move(1, 4, 0, 4, 'n')
+    record = ArchivedGame.decode(ArchivedGame.from_game(game).encode())
+    assert record.initial_fen == game.initial_fen and record.tags == {'Event': 'Archive test'}
+    assert record.to_dict()['moves'] == ['e7e8n'] and record.result == '*'
+    assert record.to_game().to_fen() == game.to_fen()
+
+    game = ChessGame('mate')
+    for move in FOOLS_MATE:
+        game.make_move(*move)
+    record = ArchivedGame.from_game(game)
+    assert record.result == '0-1' and len(record.encode()) < 40 + len(game.game_id)
+    assert ArchivedGame.decode(record.encode()).termination == 'checkmate'
+
+
+def test_flagged_game_keeps_its_result():
+    """Test that a time forfeit, which its moves do not show, survives the archive"""
+    game = ChessGame('flagged')
+    game.set_time_control(TimeControl(60, 0))
+    game.make_move(6, 4, 4, 4)
+    assert game.check_flag(datetime.now() + timedelta(minutes=5))
+    record = ArchivedGame.decode(ArchivedGame.from_game(game).encode())
+    assert (record.result, record.termination) == ('1-0', 'timeout')
+    replayed = record.to_game()
+    assert replayed.game_over and replayed.termination == 'timeout' and replayed.result == '1-0'
+    assert '[Result "1-0"]' in replayed.to_pgn()
+
+
+def test_write_append_and_scan():
+    """Test blocks, reopening to append, random access and scans"""
+    rng = random.Random(3)
+    originals = [random_game(f'game-{number}', rng) for number in range(11)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'games.archive')
+        writer = ArchiveWriter(path, block_games=4)
+        for game in originals[:6]:
+            writer.add(game)
+        assert writer.get('game-1').clocks[:2] == [1000, 1000] and writer.get('game-5') is not None
+        writer.close()
+
+        writer = ArchiveWriter(path, block_games=4)         # reopens the half-full second block
+        assert len(writer) == 6 and 'game-5' in writer
+        for game in originals[6:]:
+            writer.add(game, flush=False)
+        writer.close()
+
+        reader = ArchiveReader(path)
+        assert len(reader) == 11 and reader.game_ids() == [game.game_id for game in originals]
+        assert [record.game_id for record in reader] == reader.game_ids()
+        for game in originals:
+            replayed = reader.get(game.game_id).to_game()
+            assert replayed.to_pgn() == game.to_pgn() and replayed.players == game.players
+            assert [move['timestamp'] for move in replayed.move_history] == [
+                move['timestamp'] for move in game.move_history]
+        assert reader.get('missing') is None
+        reader.close()
+
+
+def test_recent_reads_from_the_end():
+    """Test newest-first reads, which skip superseded copies of re-archived games"""
+    rng = random.Random(7)
+    originals = [random_game(f'recent-{number}', rng) for number in range(10)]
+    with tempfile.TemporaryDirectory() as directory:
+        writer = ArchiveWriter(os.path.join(directory, 'games.archive'), block_games=4)
+        for game in originals:
+            writer.add(game)
+        writer.add(originals[8])                            # ended again after a takeback
+        assert [record.game_id for record in writer.recent(4)] == [
+            'recent-8', 'recent-9', 'recent-7', 'recent-6']
+        assert [record.game_id for record in writer.recent(100)][-2:] == ['recent-1', 'recent-0']
+        assert len(list(writer.recent(100))) == 10
+        writer.close()
+
+
+def test_torn_tail_is_recovered():
+    """Test that an archive whose tail a crash tore opens with every whole block"""
+    rng = random.Random(5)
+    originals = [random_game(f'torn-{number}', rng) for number in range(10)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'games.archive')
+        writer = ArchiveWriter(path, block_games=4)
+        for game in originals:
+            writer.add(game)
+        open_offset = writer._open_offset
+        writer.close()
+        size = os.path.getsize(path)
+
+        # Trailer torn: the open block is whole and is kept
+        with open(path, 'r+b') as f:
+            f.truncate(size - 5)
+        writer = ArchiveWriter(path, block_games=4)
+        assert len(writer) == 10
+        writer.close()
+        reader = ArchiveReader(path)
+        assert reader.game_ids() == [game.game_id for game in originals]
+        assert reader.get('torn-9').to_game().to_pgn() == originals[9].to_pgn()
+        reader.close()
+
+        # Open block torn mid-rewrite: the two sealed blocks are kept
+        with open(path, 'r+b') as f:
+            f.truncate(open_offset + 10)
+        reader = ArchiveReader(path)
+        assert len(reader) == 8 and 'torn-8' not in reader
+        reader.close()
+        writer = ArchiveWriter(path, block_games=4)
+        writer.add(originals[8])
+        writer.close()
+        reader = ArchiveReader(path)
+        assert len(reader) == 9
+        reader.close()
+
+        other = os.path.join(directory, 'notes.txt')
+        with open(other, 'w') as f:
+            f.write('not an archive')
+        try:
+            ArchiveWriter(other)
+            assert False, 'opened a file that is not an archive'
+        except ValueError:
+            pass
+        with open(other) as f:
+            assert f.read() == 'not an archive'
+
+
+def test_archive_routes():
+    """Test that finished games are archived and served as JSON and PGN"""
+    original = chess_app.game_archive
+    with tempfile.TemporaryDirectory() as directory:
+        chess_app.game_archive = ArchiveWriter(os.path.join(directory, 'games.archive'))
+        try:
+            client = chess_app.app.test_client()
+            game_id = client.post('/api/games').get_json()['game_id']
+            for from_row, from_col, to_row, to_col in FOOLS_MATE[:3]:
+                client.post(f'/api/games/{game_id}/move', json={
+                    'from_row': from_row, 'from_col': from_col, 'to_row': to_row, 'to_col': to_col})
+            assert client.get(f'/api/archive/{game_id}').status_code == 404
+            client.post(f'/api/games/{game_id}/move', json={
+                'from_row': 0, 'from_col': 3, 'to_row': 4, 'to_col': 7})
+
+            record = client.get(f'/api/archive/{game_id}').get_json()
+            assert record['result'] == '0-1' and record['moves'] == ['f2f3', 'e7e5', 'g2g4', 'd8h4']
+            response = client.get(f'/api/archive/{game_id}/pgn')
+            assert response.mimetype == 'application/x-chess-pgn'
+            assert '2. g4 Qh4# 0-1' in response.get_data(as_text=True)
+            assert client.get('/api/archive/missing/pgn').status_code == 404
+        finally:
+            chess_app.game_archive.close()
+            chess_app.game_archive = original
+
+
+if __name__ == "__main__":
+    test_varints()
+    test_record_round_trip()
+    test_flagged_game_keeps_its_result()
+    test_write_append_and_scan()
+    test_recent_reads_from_the_end()
+    test_torn_tail_is_recovered()
+    test_archive_routes()
+    print("✅ All game archive tests passed")
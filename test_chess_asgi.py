@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Test script for the ASGI entry point, driven over Engine.IO long-polling
+"""
+
+import asyncio
+import json
+
+import chess_app
+
+# Importing chess_asgi points REST broadcasts and spectator frames at its asyncio server
+_flask_emitter = chess_app.room_emitter
+_flask_spectators = chess_app.spectators
+import chess_asgi
+chess_app.set_room_emitter(_flask_emitter)
+chess_app.set_spectator_fanout(_flask_spectators)
+
+RECORD_SEPARATOR = '\x1e'
+
+
+async def call(method, path, query='', body=b''):
+    """(status, body) of one HTTP request sent straight to the ASGI app"""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+        'query_string': query.encode(), 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234),
+        'headers': [(b'host', b'testserver'), (b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode())],
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.sleep(3600)
+
+    response = {'body': b''}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        elif message['type'] == 'http.response.body':
+            response['body'] += message.get('body', b'')
+
+    await chess_asgi.app(scope, receive, send)
+    return response['status'], response['body'].decode()
+
+
+class PollingClient:
+    """Minimal Socket.IO client over the polling transport"""
+
+    async def connect(self):
+        _, body = await call('GET', '/socket.io/', 'EIO=4&transport=polling')
+        self.sid = json.loads(body[1:])['sid']
+        await self.send('40')
+        packets = await self.receive()
+        assert packets[0].startswith('40')
+
+    async def send(self, packet):
+        status, _ = await call('POST', '/socket.io/', f'EIO=4&transport=polling&sid={self.sid}', packet.encode())
+        assert status == 200
+
+    async def receive(self):
+        """Next batch of Socket.IO packets, answering Engine.IO pings on the way"""
+        while True:
+            _, body = await call('GET', '/socket.io/', f'EIO=4&transport=polling&sid={self.sid}')
+            packets = body.split(RECORD_SEPARATOR)
+            if '2' in packets:
+                await self.send('3')
+            packets = [packet for packet in packets if packet != '2']
+            if packets:
+                return packets
+
+    async def emit(self, event, data, ack_id=''):
+        await self.send(f'42{ack_id}' + json.dumps([event, data]))
+
+    async def events(self, *names):
+        """{event: data} once all names have arrived; acknowledgements arrive as 'ack'"""
+        received = {}
+        while not set(names) <= set(received):
+            for packet in await self.receive():
+                if packet.startswith('42'):
+                    event, data = json.loads(packet[2:])
+                    received[event] = data
+                elif packet.startswith('43'):
+                    received['ack'] = json.loads(packet[packet.index('['):])[0]
+        return received
+
+
+async def join_and_move():
+    chess_asgi._on_startup()
+    status, body = await call('POST', '/api/games')
+    assert status == 200
+    game_id = json.loads(body)['game_id']
+
+    client = PollingClient()
+    await client.connect()
+    await client.emit('join_game', {'game_id': game_id, 'color': 'white'})
+    events = await client.events('game_sync', 'player_joined')
+    assert events['game_sync']['type'] == 'snapshot' and events['game_sync']['version'] == 0
+    assert events['player_joined']['color'] == 'white'
+
+    await client.emit('make_move', {'game_id': game_id, 'from_row': 6, 'from_col': 4,
+                                    'to_row': 4, 'to_col': 4}, ack_id='1')
+    ack = (await client.events('ack'))['ack']
+    assert ack['success'] and ack['move']['version'] == 1
+
+    status, body = await call('GET', f'/api/games/{game_id}')
+    assert json.loads(body)['current_player'] == 'black'
+
+
+def test_join_and_move_through_asgi_app():
+    """Test that chess_asgi imports and serves joins, acknowledged moves and REST routes"""
+    asyncio.run(join_and_move())
+
+
+async def seek_and_match():
+    chess_asgi._on_startup()
+    first, second = PollingClient(), PollingClient()
+    await first.connect()
+    await second.connect()
+    await first.emit('seek', {'rating': 1500})
+    assert (await first.events('seeking'))['seeking'] == {'rating': 1500, 'time_control': None}
+    await second.emit('seek', {'rating': 1520})
+    await second.events('seeking')
+
+    # Paired by the background task on its next tick
+    white = await first.events('match_found', 'game_sync')
+    black = await second.events('match_found', 'game_sync')
+    assert white['match_found']['color'] == 'white' and black['match_found']['color'] == 'black'
+    assert white['match_found']['game_id'] == black['match_found']['game_id']
+    assert len(chess_app.matchmaker) == 0
+
+
+def test_seek_through_asgi_app():
+    """Test that seekers are paired and joined to their game by the async server"""
+    asyncio.run(seek_and_match())
+
+
+async def watch_moves():
+    chess_asgi._on_startup()
+    status, body = await call('POST', '/api/games')
+    game_id = json.loads(body)['game_id']
+    watcher = PollingClient()
+    await watcher.connect()
+    await watcher.emit('watch_game', {'game_id': game_id})
+    assert (await watcher.events('spectator_update'))['spectator_update']['ply'] == 0
+
+    # The REST move runs in a worker thread; the flush loop delivers its frame
+    body = json.dumps({'from_row': 6, 'from_col': 4, 'to_row': 4, 'to_col': 4}).encode()
+    status, _ = await call('POST', f'/api/games/{game_id}/move', body=body)
+    assert status == 200
+    frame = (await watcher.events('spectator_update'))['spectator_update']
+    assert frame['ply'] == 1 and frame['last_move']['to'] == [4, 4]
+
+
+def test_watch_through_asgi_app():
+    """Test that spectators of the async server get coalesced frames for REST moves"""
+    chess_app.set_spectator_fanout(chess_asgi.spectators)
+    try:
+        asyncio.run(watch_moves())
+    finally:
+        chess_app.set_spectator_fanout(_flask_spectators)
+
+
+if __name__ == "__main__":
+    test_join_and_move_through_asgi_app()
+    test_seek_through_asgi_app()
+    test_watch_through_asgi_app()
+    print("✅ All ASGI tests passed")
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Test script for vectorized NumPy evaluation
+"""
+
+import random
+
+from chess_engine import ChessGame, Position
+from chess_engine.batch_eval import encode_positions, evaluate_games, evaluate_positions
+from chess_engine.evaluation import evaluate
+from chess_engine.movegen import generate_legal, play_move
+from chess_engine.perft import REFERENCE_POSITIONS
+
+
+def random_positions(count, seed=7):
+    """Positions from random playouts, middlegames and endgames alike"""
+    rng = random.Random(seed)
+    positions = []
+    for _ in range(count):
+        position = Position.initial()
+        for _ in range(rng.randrange(200)):
+            moves = generate_legal(position)
+            if not moves:
+                break
+            play_move(position, rng.choice(moves))
+        positions.append(position)
+    return positions
+
+
+def test_encode_positions():
+    """Test the piece planes and side to move of encoded positions"""
+    planes, sides = encode_positions([Position.initial(), Position.from_fen('8/8/8/8/8/8/8/k6K b - - 0 1')])
+    assert planes.shape == (2, 12, 64) and list(sides) == [0, 1]
+    assert planes[0].sum() == 32 and list(planes[0, 0].nonzero()[0]) == list(range(48, 56))
+    assert list(planes[0, 11].nonzero()[0]) == [4]              # black king on e8
+    assert list(planes[1, 5].nonzero()[0]) == [63] and list(planes[1, 11].nonzero()[0]) == [56]
+
+
+def test_matches_scalar_evaluation():
+    """Test that batch scores equal evaluate() for every position"""
+    positions = random_positions(300) + [Position.from_fen(fen) for _, fen, _ in REFERENCE_POSITIONS]
+    assert list(evaluate_positions(positions)) == [evaluate(position) for position in positions]
+
+    game = ChessGame('test')
+    game.make_move(6, 4, 4, 4)
+    assert list(evaluate_games([ChessGame('start'), game])) == [0, evaluate(game.position)]
+    assert evaluate_positions([]).shape == (0,)
+
+
+if __name__ == "__main__":
+    test_encode_positions()
+    test_matches_scalar_evaluation()
+    print("✅ All batch evaluation tests passed")
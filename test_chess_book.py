@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test script for the memory-mapped opening book
+"""
+
+import os
+import random
+import tempfile
+
+import chess_app
+from chess_engine import ChessGame, Position
+from chess_engine.book import (
+    DEFAULT_BOOK_PATH, OpeningBook, book_counts, decode_book_move, encode_book_move, write_book,
+)
+from chess_engine.movegen import generate_legal, move_to_uci
+
+PGN = """[Event "First"]
+
+1.e4 e5 2.Nf3 Nc6 3.Bb5 Nf6 4.O-O *
+
+[Event "Second"]
+
+1.e4 c5 2.Nf3 d6 *
+
+[Event "Third"]
+
+1.d4 d5 *
+"""
+
+
+def test_book_move_encoding_round_trip():
+    """Test Polyglot move bits for every legal move, castling and promotions included"""
+    for fen in ('r3k2r/pPppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+                'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBpPP/R3K2R b KQkq - 0 1'):
+        position = Position.from_fen(fen)
+        for move in generate_legal(position):
+            assert decode_book_move(position, encode_book_move(position, move)) == move
+    # White kingside castling is e1h1 in Polyglot terms
+    position = Position.from_fen('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1')
+    castle = next(move for move in generate_legal(position) if move_to_uci(move) == 'e1g1')
+    assert encode_book_move(position, castle) == (7 | 4 << 6)
+
+
+def test_build_and_probe_book():
+    """Test weights, castling entries and misses in a book built from PGN"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'book.bin')
+        assert write_book(path, book_counts([PGN])) == 12
+        book = OpeningBook(path)
+        start = Position.initial()
+        assert [(move_to_uci(move), weight) for move, weight in book.moves(start)] == [('e2e4', 2), ('d2d4', 1)]
+
+        game = ChessGame('book')
+        for move in [(6, 4, 4, 4), (1, 4, 3, 4), (7, 6, 5, 5), (0, 1, 2, 2), (7, 5, 3, 1), (0, 6, 2, 5)]:
+            assert game.make_move(*move)[0]
+        assert game.book_moves(book) == [{'from': [7, 4], 'to': [7, 6], 'promotion': None, 'weight': 1}]
+        assert book.choose(game.position) is not None
+
+        assert game.make_move(7, 4, 7, 6)[0]
+        assert book.moves(game.position) == [] and book.choose(game.position) is None
+        book.close()
+
+
+def test_bundled_book():
+    """Test that the bundled book covers the main first moves"""
+    book = OpeningBook(DEFAULT_BOOK_PATH)
+    first_moves = {move_to_uci(move) for move, _ in book.moves(Position.initial())}
+    assert {'e2e4', 'd2d4', 'c2c4', 'g1f3'} <= first_moves
+    assert move_to_uci(book.choose(Position.initial(), random.Random(1))) in first_moves
+    book.close()
+
+
+def test_book_route_and_engine_book_move():
+    """Test the book route and that engine_move plays book moves without searching"""
+    client = chess_app.app.test_client()
+    game_id = client.post('/api/games').get_json()['game_id']
+    moves = client.get(f'/api/games/{game_id}/book').get_json()['moves']
+    assert {'from': [6, 4], 'to': [4, 4], 'promotion': None} in [
+        {key: move[key] for key in ('from', 'to', 'promotion')} for move in moves]
+    assert all(move['weight'] > 0 for move in moves)
+    assert client.get('/api/games/missing/book').status_code == 404
+
+    body = client.post(f'/api/games/{game_id}/engine_move', json={}).get_json()
+    assert body['success'] and body['book'] and body['search'] is None
+    assert {'from': body['from'], 'to': body['to']} in [{'from': move['from'], 'to': move['to']} for move in moves]
+
+    original = chess_app.opening_book
+    chess_app.opening_book = None
+    try:
+        assert client.get(f'/api/games/{game_id}/book').get_json() == {'moves': []}
+    finally:
+        chess_app.opening_book = original
+
+
+if __name__ == "__main__":
+    test_book_move_encoding_round_trip()
+    test_build_and_probe_book()
+    test_bundled_book()
+    test_book_route_and_engine_book_move()
+    print("✅ All opening book tests passed")
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Test script for chess clocks and the shared flag-fall scheduler
+"""
+
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import chess_app
+from chess_engine import ChessGame
+from chess_engine.clock import FlagScheduler, GameClock, TimeControl
+from chess_engine.game import TIME_FORFEIT
+from chess_engine.store import SqliteGameStore
+
+START = datetime(2024, 6, 1, 12, 0, 0)
+
+
+def at(seconds):
+    return START + timedelta(seconds=seconds)
+
+
+def test_time_control_parsing():
+    """Test PGN-style time controls and their limits"""
+    assert (TimeControl.parse('300+2').base, TimeControl.parse('300+2').increment) == (300, 2)
+    assert str(TimeControl.parse('180')) == '180+0' and str(TimeControl(0.5, 0)) == '0.5+0'
+    for bad in ('', 'blitz', '0+2', '300+-1', '99999+0', 'nan+0', 300):
+        try:
+            TimeControl.parse(bad)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"accepted time control {bad!r}")
+
+
+def test_clock_charges_moves():
+    """Test that each side is charged its own thinking time plus the increment"""
+    clock = GameClock(TimeControl(60, 2))
+    assert clock.deadline() is None and not clock.flagged(at(1000))
+    clock.press(0, at(5))                        # white's first move starts black's clock
+    assert clock.remaining == [60, 60] and clock.running == 1
+    clock.press(1, at(15))
+    assert clock.remaining == [60, 52] and clock.deadline() == at(75).timestamp()
+    assert clock.to_dict(at(25)) == {'time_control': '60+2', 'white': 50000, 'black': 52000,
+                                     'running': 'white'}
+    assert not clock.flagged(at(74.9)) and clock.flagged(at(75))
+
+
+def test_timed_game_flags():
+    """Test move refusal and results once a flag falls"""
+    game = ChessGame('timed')
+    game.set_time_control(TimeControl(10))
+    assert game.make_move(6, 4, 4, 4, timestamp=at(0))[0]
+    assert game.make_move(1, 4, 3, 4, timestamp=at(4))[0]
+    assert game.clock.remaining == [10, 6]
+    assert game.unmake_move() == (False, "Moves cannot be undone in timed games")
+    assert not game.check_flag(at(9))
+    version = game.version
+    assert game.make_move(7, 6, 5, 5, timestamp=at(15)) == (False, TIME_FORFEIT)
+    state = game.get_game_state()
+    assert (state['termination'], state['result'], state['game_over']) == ('timeout', '0-1', True)
+    assert game.version == version + 1 and game.make_move(7, 6, 5, 5) == (False, "Game is over")
+
+    # Flagging against a lone king is a draw
+    game = ChessGame.from_fen('lone', '4k3/8/8/8/8/8/4P3/4K3 b - - 0 1')
+    game.set_time_control(TimeControl(5))
+    assert game.make_move(0, 4, 0, 3, timestamp=at(0))[0]
+    assert game.check_flag(at(10))
+    assert (game.termination, game.result) == ('timeout_vs_insufficient_material', '1/2-1/2')
+
+
+def test_clock_survives_store_reload():
+    """Test that a SQLite reload replays moves at their stored times"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'games.db')
+        store = SqliteGameStore(path)
+        game = ChessGame('reload')
+        game.set_time_control(TimeControl(30, 1))
+        store.add(game)
+        for move, seconds in (((6, 4, 4, 4), 0), ((1, 4, 3, 4), 3), ((7, 6, 5, 5), 10)):
+            assert game.make_move(*move, timestamp=at(seconds))[0]
+            store.save_move(game)
+        store.close()
+
+        reloaded = SqliteGameStore(path).get('reload')
+        assert reloaded.clock.time_control == TimeControl(30, 1)
+        assert reloaded.clock.remaining == game.clock.remaining == [24, 28]
+        assert reloaded.clock.deadline() == game.clock.deadline()
+
+
+def test_flagged_game_survives_store_reload():
+    """Test that a game lost on time reloads from SQLite as over, not playable"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'games.db')
+        store = SqliteGameStore(path)
+        game = ChessGame('flagged')
+        game.set_time_control(TimeControl(30, 0))
+        store.add(game)
+        for move, seconds in (((6, 4, 4, 4), 0), ((1, 4, 3, 4), 3)):
+            assert game.make_move(*move, timestamp=at(seconds))[0]
+            store.save_move(game)
+        assert game.check_flag(at(60))
+        store.save(game)
+        store.close()
+
+        store = SqliteGameStore(path)
+        reloaded = store.get('flagged')
+        assert reloaded.game_over and (reloaded.termination, reloaded.result) == ('timeout', '0-1')
+        assert reloaded.version == game.version
+        assert reloaded.make_move(7, 6, 5, 5)[1] == 'Game is over'
+        store.close()
+
+
+def test_scheduler_fires_in_deadline_order():
+    """Test one scheduler thread serving many games, with reschedules and cancels"""
+    fired = []
+    done = threading.Event()
+
+    def callback(game_id):
+        fired.append(game_id)
+        if game_id == 'last':
+            done.set()
+
+    scheduler = FlagScheduler(callback)
+    now = time.time()
+    scheduler.schedule('b', now + 0.10)
+    scheduler.schedule('a', now + 0.05)
+    scheduler.schedule('moved', now + 0.02)
+    scheduler.schedule('moved', now + 0.15)      # a move pushed its deadline back
+    scheduler.schedule('cancelled', now + 0.03)
+    scheduler.cancel('cancelled')
+    scheduler.schedule('last', now + 0.20)
+    assert len(scheduler) == 4 and 'cancelled' not in scheduler
+    assert done.wait(5)
+    assert fired == ['a', 'b', 'moved', 'last'] and len(scheduler) == 0
+    scheduler.close()
+
+
+def test_flag_fall_is_pushed_to_the_room():
+    """Test that the server flags an idle player and tells the room"""
+    client = chess_app.app.test_client()
+    assert client.post('/api/games', json={'time_control': 'fast'}).status_code == 400
+    game_id = client.post('/api/games', json={'time_control': '0.3+0'}).get_json()['game_id']
+    watcher = chess_app.socketio.test_client(chess_app.app)
+    watcher.emit('join_game', {'game_id': game_id})
+    watcher.get_received()
+
+    assert client.post(f'/api/games/{game_id}/move', json={
+        'from_row': 6, 'from_col': 4, 'to_row': 4, 'to_col': 4}).get_json()['success']
+    assert game_id in chess_app.flag_scheduler
+    state = client.get(f'/api/games/{game_id}').get_json()
+    assert state['clock']['running'] == 'black' and 0 < state['clock']['black'] <= 300
+
+    deadline = time.time() + 5
+    events = []
+    while time.time() < deadline and not any(name == 'flag_fell' for name, _ in events):
+        time.sleep(0.05)
+        events += [(message['name'], message['args'][0]) for message in watcher.get_received()]
+    (flag,) = [data for name, data in events if name == 'flag_fell']
+    assert flag['termination'] == 'timeout' and flag['result'] == '1-0' and flag['clock']['black'] == 0
+    state = client.get(f'/api/games/{game_id}').get_json()
+    assert state['game_over'] and state['termination'] == 'timeout'
+    assert client.post(f'/api/games/{game_id}/undo').status_code == 400
+    watcher.disconnect()
+
+
+if __name__ == "__main__":
+    test_time_control_parsing()
+    test_clock_charges_moves()
+    test_timed_game_flags()
+    test_clock_survives_store_reload()
+    test_flagged_game_survives_store_reload()
+    test_scheduler_fires_in_deadline_order()
+    test_flag_fall_is_pushed_to_the_room()
+    print("✅ All chess clock tests passed")
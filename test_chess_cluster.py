@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Test script for cross-worker message queues and the shared SQLite store
+"""
+
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import chess_app
+from chess_engine import ChessGame
+from chess_engine.cluster import LocalHub, UnixSocketHub, UnixSocketMessageQueue
+from chess_engine.store import GameConflictError, SqliteGameStore
+
+
+def collect(queue, count):
+    """Start reading count messages from queue in a background thread"""
+    received = []
+
+    def run():
+        for message in queue.listen():
+            received.append(message)
+            if len(received) == count:
+                return
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, received
+
+
+def test_local_queue_reaches_every_worker():
+    """Test that a local publish is delivered to all queues, the sender included"""
+    hub = LocalHub()
+    first, second = hub.connect(), hub.connect()
+    readers = [collect(queue, 1) for queue in (first, second)]
+    first.publish({'method': 'emit', 'event': 'move_made', 'room': 'g1'})
+    for thread, received in readers:
+        thread.join(timeout=2)
+        assert received == [{'method': 'emit', 'event': 'move_made', 'room': 'g1'}]
+    first.close()
+    second.close()
+
+
+def test_unix_socket_hub_relays_between_workers():
+    """Test that frames published by one worker reach the others through the hub"""
+    with tempfile.TemporaryDirectory() as directory:
+        hub = UnixSocketHub(os.path.join(directory, 'hub.sock')).start()
+        first = UnixSocketMessageQueue(hub.path)
+        second = UnixSocketMessageQueue(hub.path)
+        thread, received = collect(second, 2)
+        for _ in range(100):    # wait until the listening worker has connected
+            if hub._connections:
+                break
+            threading.Event().wait(0.01)
+        first.publish({'event': 'move_made', 'data': {'version': 1}})
+        second.publish({'event': 'move_made', 'data': {'version': 2}})
+        thread.join(timeout=2)
+        assert sorted(message['data']['version'] for message in received) == [1, 2]
+        first.close()
+        second.close()
+        hub.close()
+
+
+def test_unix_socket_hub_drops_stalled_workers_and_survives_restarts():
+    """Test that a worker that stops reading is dropped and listeners reconnect to a new hub"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'hub.sock')
+        hub = UnixSocketHub(path, max_pending=4).start()
+        stalled = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stalled.connect(path)
+        listener = UnixSocketMessageQueue(path, reconnect_delays=(0.05,))
+        publisher = UnixSocketMessageQueue(path, reconnect_delays=(0.05,))
+        thread, received = collect(listener, 21)
+        collect(publisher, 100)                     # workers read their own echoes too
+        while len(hub._connections) < 3:
+            time.sleep(0.01)
+
+        for number in range(20):
+            publisher.publish({'number': number, 'padding': 'x' * 100000})
+            while len(received) <= number:
+                time.sleep(0.001)
+        assert [message['number'] for message in received] == list(range(20))
+        assert stalled not in hub._connections and len(hub._connections) == 2
+
+        hub.close()
+        publisher.publish({'number': 'lost'})       # logged and dropped, not raised
+        hub = UnixSocketHub(path).start()
+        for _ in range(200):
+            publisher.publish({'number': 'after restart'})
+            thread.join(timeout=0.05)
+            if not thread.is_alive():
+                break
+        assert received[-1] == {"number": "after restart"}
+        stalled.close()
+        listener.close()
+        publisher.close()
+        hub.close()
+
+
+def test_sqlite_store_sees_other_workers_moves():
+    """Test that a cached game is reloaded after another process writes it"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'games.db')
+        worker_a, worker_b = SqliteGameStore(path), SqliteGameStore(path)
+        worker_a.add(ChessGame('g1'))
+        cached = worker_a.get('g1')
+
+        game = worker_b.get('g1')
+        assert game.make_move(6, 4, 4, 4)[0]
+        worker_b.save_move(game)
+        game.players['black'] = 'sid-b'
+        worker_b.save(game)
+
+        reloaded = worker_a.get('g1')
+        assert reloaded is not cached
+        assert reloaded.to_fen() == game.to_fen() and reloaded.players['black'] == 'sid-b'
+        assert worker_a.get('g1') is reloaded
+        worker_a.close()
+        worker_b.close()
+
+
+def test_sqlite_store_rejects_racing_moves():
+    """Test that the slower of two workers moving the same game gets a conflict"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'games.db')
+        worker_a, worker_b = SqliteGameStore(path), SqliteGameStore(path)
+        worker_a.add(ChessGame('g1'))
+        game_a, game_b = worker_a.get('g1'), worker_b.get('g1')
+
+        assert game_a.make_move(6, 4, 4, 4)[0]          # e4
+        worker_a.save_move(game_a)
+        assert game_b.make_move(6, 3, 4, 3)[0]          # d4 on a now stale copy
+        try:
+            worker_b.save_move(game_b)
+        except GameConflictError:
+            pass
+        else:
+            raise AssertionError("saved a move on top of another worker's move")
+        assert worker_b.get('g1').to_fen() == worker_a.get('g1').to_fen() == game_a.to_fen()
+
+        # An undo racing a move: the undo wins, the move is refused
+        game_a, game_b = worker_a.get('g1'), worker_b.get('g1')
+        game_a.unmake_move()
+        worker_a.save(game_a)
+        assert game_b.make_move(1, 4, 3, 4)[0]
+        try:
+            worker_b.save_move(game_b)
+        except GameConflictError:
+            pass
+        else:
+            raise AssertionError("saved a move on top of another worker's undo")
+        assert worker_b.get('g1').ply == 0
+        worker_a.close()
+        worker_b.close()
+
+
+def test_socket_move_that_loses_a_race_gets_a_sync():
+    """Test that a socket move refused by the version check acks with the stored game"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'games.db')
+        worker, other = SqliteGameStore(path), SqliteGameStore(path)
+        original, chess_app.games = chess_app.games, worker
+        try:
+            worker.add(ChessGame('g1'))
+            stale = worker.get('g1')
+            game = other.get('g1')
+            assert game.make_move(6, 4, 4, 4)[0]
+            other.save_move(game)
+
+            # This worker read the game just before the other one saved e4
+            reads = [stale]
+            worker.get = lambda game_id: reads.pop() if reads else SqliteGameStore.get(worker, game_id)
+            ack, delta = chess_app.socket_move('g1', {'from_row': 6, 'from_col': 3, 'to_row': 4, 'to_col': 3,
+                                                      'version': 0}, 'sid-1')
+            assert delta is None and not ack['success'] and ack['message'] == chess_app.CONFLICT_MESSAGE
+            assert ack['sync']['type'] == 'delta' and [move['to'] for move in ack['sync']['moves']] == [[4, 4]]
+            assert worker.get('g1').to_fen() == game.to_fen()
+        finally:
+            chess_app.games = original
+            worker.close()
+            other.close()
+
+
+if __name__ == "__main__":
+    test_local_queue_reaches_every_worker()
+    test_unix_socket_hub_relays_between_workers()
+    test_unix_socket_hub_drops_stalled_workers_and_survives_restarts()
+    test_sqlite_store_sees_other_workers_moves()
+    test_sqlite_store_rejects_racing_moves()
+    test_socket_move_that_loses_a_race_gets_a_sync()
+    print("✅ All cluster tests passed")
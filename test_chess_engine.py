@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Test script for the bitboard chess engine behind ChessGame and the
+Socket.IO events that play it
+"""
+
+import chess_app
+from chess_engine import ChessGame, Position
+from chess_engine.bitboard import popcount, square
+from chess_engine.movegen import king_threats
+
+
+def test_initial_position():
+    """Test the starting bitboards and the lazily materialized board view"""
+    position = Position.initial()
+    assert popcount(position.occupied) == 32
+    assert popcount(position.occupied_by[0]) == 16
+
+    game = ChessGame('test')
+    assert game.board[0] == ['r', 'n', 'b', 'q', 'k', 'b', 'n', 'r']
+    assert game.board[6] == ['P'] * 8
+    assert game.board[4] == [''] * 8
+    assert game.current_player == 'white'
+
+
+def test_make_move_updates_view():
+    """Test that moves refresh the board view and switch sides"""
+    game = ChessGame('test')
+    assert game.make_move(6, 4, 4, 4) == (True, "Move successful")
+    assert game.board[4][4] == 'P' and game.board[6][4] == ''
+    assert game.current_player == 'black'
+    assert game.position.ep_square == square(5, 4)
+    assert game.make_move(6, 3, 4, 3) == (False, "Invalid move")
+    assert game.make_move(3, 3, 4, 3) == (False, "No piece at source position")
+    assert game.make_move(9, 0, 4, 3) == (False, "Invalid move")
+
+
+def test_sliding_pieces_blocked():
+    """Test that sliding pieces stop at blockers"""
+    game = ChessGame('test')
+    assert not game.is_valid_move(7, 0, 5, 0)
+    assert not game.is_valid_move(7, 2, 5, 4)
+    assert game.is_valid_move(7, 1, 5, 2)
+    assert game.has_valid_moves()
+
+
+def play(game, *moves):
+    """Play (from_row, from_col, to_row, to_col) moves, asserting each succeeds"""
+    for move in moves:
+        success, message = game.make_move(*move)
+        assert success, (move, message)
+
+
+def received(client):
+    return [(message['name'], message['args'][0]) for message in client.get_received()]
+
+
+def test_legal_moves():
+    """Test the legal move generator from the start and after 1.e4"""
+    game = ChessGame('test')
+    assert len(game.legal_moves()) == 20
+    play(game, (6, 4, 4, 4))
+    assert len(game.legal_moves()) == 20
+    assert {'from': [1, 3], 'to': [3, 3], 'promotion': None} in game.legal_moves()
+
+
+def test_checkmate_ends_game():
+    """Test that fool's mate leaves white without legal moves"""
+    game = ChessGame('test')
+    play(game, (6, 5, 5, 5), (1, 4, 3, 4), (6, 6, 4, 6), (0, 3, 4, 7))
+    assert game.legal_moves() == []
+    assert game.game_over and game.in_check
+    state = game.get_game_state()
+    assert (state['termination'], state['result']) == ('checkmate', '0-1')
+    assert game.make_move(6, 0, 5, 0) == (False, "Game is over")
+
+
+def test_check_and_pins():
+    """Test the per-move checkers and pinned bitboards and legal moves out of check"""
+    # The e2 rook is pinned by the e8 queen and the d2 knight by the a5 bishop
+    game = ChessGame.from_fen('pins', '4q2k/8/8/b7/8/8/3NR3/4K3 w - - 0 1')
+    checkers, pinned = game.threats
+    assert checkers == 0 and pinned == 1 << square(6, 4) | 1 << square(6, 3)
+    assert {tuple(move['to']) for move in game.legal_moves() if move['from'] == [6, 4]} == {
+        (row, 4) for row in range(6)}
+    assert not any(move['from'] == [6, 3] for move in game.legal_moves())
+    assert not game.get_game_state()['in_check']
+
+    game = ChessGame.from_fen('check', '4k3/4b3/8/8/8/8/8/R3K3 b - - 0 1')
+    play(game, (1, 4, 4, 1))
+    assert game.in_check and game.threats[0] == 1 << square(4, 1)
+    assert game.threats == king_threats(game.position)
+    assert sorted(tuple(move['to']) for move in game.legal_moves()) == [(6, 4), (6, 5), (7, 3), (7, 5)]
+    game.unmake_move()
+    assert not game.in_check and game.threats == king_threats(game.position)
+
+
+def test_draw_rules():
+    """Test stalemate, insufficient material, fifty-move and repetition draws"""
+    game = ChessGame.from_fen('stale', 'k7/2Q5/1K6/8/8/8/8/8 b - - 0 1')
+    assert (game.termination, game.result, game.game_over) == ('stalemate', '1/2-1/2', True)
+
+    for fen in ('8/8/4k3/8/8/3K4/8/8 w - - 0 1', '8/8/4k3/8/8/3KN3/8/8 w - - 0 1',
+                '8/8/4k3/2b5/8/3KB3/8/8 w - - 0 1'):
+        assert ChessGame.from_fen('dead', fen).termination == 'insufficient_material', fen
+    for fen in ('8/8/2b1k3/8/8/3KB3/8/8 w - - 0 1', '8/8/4k3/8/8/2NKN3/8/8 w - - 0 1'):
+        assert not ChessGame.from_fen('alive', fen).game_over, fen
+
+    game = ChessGame.from_fen('fifty', '4k3/8/8/8/8/8/4P3/R3K3 w - - 99 80')
+    assert not game.game_over
+    play(game, (7, 0, 7, 1))
+    assert (game.termination, game.result) == ('fifty_move', '1/2-1/2')
+    game.unmake_move()
+    play(game, (6, 4, 4, 4))
+    assert not game.game_over and game.position.halfmove_clock == 0
+
+    game = ChessGame('repeat')
+    knight_dance = [(7, 6, 5, 5), (0, 6, 2, 5), (5, 5, 7, 6), (2, 5, 0, 6)]
+    play(game, *knight_dance, *knight_dance[:3])
+    assert not game.game_over
+    play(game, knight_dance[3])
+    assert game.get_game_state()['termination'] == 'repetition'
+    assert '1/2-1/2' in game.to_pgn()
+
+
+def test_castling_and_en_passant():
+    """Test special moves generated by the move generator"""
+    game = ChessGame('test')
+    play(game, (6, 4, 4, 4), (1, 0, 2, 0), (4, 4, 3, 4), (1, 3, 3, 3))
+    # En passant exd6
+    play(game, (3, 4, 2, 3))
+    assert game.board[3][3] == '' and game.move_history[-1]['captured'] == 'p'
+    play(game, (1, 1, 2, 1), (7, 6, 5, 5), (2, 1, 3, 1), (7, 5, 6, 4), (2, 0, 3, 0))
+    # Kingside castling moves the rook too
+    play(game, (7, 4, 7, 6))
+    assert game.board[7][5] == 'R' and game.board[7][7] == ''
+
+
+def test_promotion_defaults_to_queen():
+    """Test that pawns reaching the last row promote"""
+    game = ChessGame('test')
+    play(game, (6, 7, 4, 7), (1, 6, 3, 6), (4, 7, 3, 6), (1, 7, 2, 7),
+         (3, 6, 2, 6), (0, 6, 2, 5), (2, 6, 1, 6), (2, 5, 4, 4))
+    play(game, (1, 6, 0, 7))
+    assert game.board[0][7] == 'Q'
+    assert game.make_move(1, 0, 2, 0, 'x') == (False, "Invalid move")
+
+
+def test_zobrist_repetition():
+    """Test incremental keys, transpositions and repetition counting"""
+    game = ChessGame('test')
+    start_key = game.zobrist
+    knight_dance = [(7, 6, 5, 5), (0, 6, 2, 5), (5, 5, 7, 6), (2, 5, 0, 6)]
+    play(game, *knight_dance)
+    assert game.zobrist == start_key == game.position.compute_zobrist()
+    assert game.repetition_count() == 2 and not game.is_threefold_repetition()
+    play(game, *knight_dance)
+    assert game.is_threefold_repetition()
+    assert game.get_game_state()['zobrist'] == game.move_history[-1]['zobrist']
+
+    # Same position through a different move order
+    other = ChessGame('other')
+    play(other, (7, 1, 5, 2), (0, 1, 2, 2), (7, 6, 5, 5))
+    transposed = ChessGame('transposed')
+    play(transposed, (7, 6, 5, 5), (0, 1, 2, 2), (7, 1, 5, 2))
+    assert other.zobrist == transposed.zobrist
+
+
+def test_unmake_move_restores_position():
+    """Test that undoing captures, castling and en passant restores everything"""
+    game = ChessGame('test')
+    start_key = game.zobrist
+    moves = [(6, 4, 4, 4), (1, 0, 2, 0), (4, 4, 3, 4), (1, 3, 3, 3), (3, 4, 2, 3),
+             (1, 1, 2, 1), (7, 6, 5, 5), (2, 1, 3, 1), (7, 5, 6, 4), (2, 0, 3, 0),
+             (7, 4, 7, 6)]
+    play(game, *moves)
+    for _ in moves:
+        assert game.unmake_move() == (True, "Move undone")
+    assert game.board == ChessGame('start').board
+    assert game.zobrist == start_key and game.position.castling == 15
+    assert game.position_counts == {start_key: 1}
+    assert game.unmake_move() == (False, "No moves to undo")
+
+
+def test_undo_route():
+    """Test undoing moves over REST, the room's move_undone and invalid counts"""
+    client = chess_app.app.test_client()
+    game_id = client.post('/api/games').get_json()['game_id']
+    watcher = chess_app.socketio.test_client(chess_app.app)
+    watcher.emit('join_game', {'game_id': game_id})
+    for from_row, from_col, to_row, to_col in [(6, 4, 4, 4), (1, 4, 3, 4)]:
+        client.post(f'/api/games/{game_id}/move', json={
+            'from_row': from_row, 'from_col': from_col, 'to_row': to_row, 'to_col': to_col})
+    watcher.get_received()
+
+    for count in (0, 3, 'two'):
+        response = client.post(f'/api/games/{game_id}/undo', json={'count': count})
+        assert response.status_code == 400 and response.get_json()['message'] == 'Invalid undo count'
+    response = client.post(f'/api/games/{game_id}/undo', json={'count': 2})
+    state = response.get_json()['game_state']
+    assert response.status_code == 200 and state['ply'] == 0 and state['version'] == 4
+    assert state['fen'] == ChessGame('start').to_fen()
+    assert received(watcher) == [('move_undone', {'version': 4, 'ply': 0, 'count': 2, 'fen': state['fen'],
+                                                  'current_player': 'white', 'game_over': False})]
+    assert client.post('/api/games/missing/undo', json={}).status_code == 404
+    watcher.disconnect()
+
+
+def test_versioned_sync():
+    """Test move deltas, catch-up from a version and snapshots after undo"""
+    game = ChessGame('test')
+    play(game, (6, 4, 4, 4), (1, 0, 2, 0), (4, 4, 3, 4), (1, 3, 3, 3), (3, 4, 2, 3))
+    assert game.version == 5 and game.ply == 5
+    delta = game.move_delta()
+    assert delta['version'] == 5 and delta['captured_at'] == [3, 3]
+    assert delta['current_player'] == 'black'
+
+    sync = game.sync_payload(3)
+    assert sync['type'] == 'delta' and [move['ply'] for move in sync['moves']] == [4, 5]
+    assert game.sync_payload(5)['moves'] == []
+    assert game.sync_payload()['type'] == 'snapshot'
+    assert game.sync_payload(9)['type'] == 'snapshot'
+
+    game.unmake_move()
+    assert game.version == 6 and game.ply == 4
+    assert game.sync_payload(5)['type'] == 'snapshot'
+    play(game, (7, 6, 5, 5))
+    assert [move['version'] for move in game.sync_payload(6)['moves']] == [7]
+    state = game.sync_payload(2)['state']
+    assert state['version'] == 7 and state['fen'] == game.to_fen()
+
+
+def test_join_and_sync_events():
+    """Test join_game and sync_game catch-up, seat conflicts and unknown games"""
+    client = chess_app.app.test_client()
+    game_id = client.post('/api/games').get_json()['game_id']
+    for from_row, from_col, to_row, to_col in [(6, 4, 4, 4), (1, 4, 3, 4), (7, 6, 5, 5)]:
+        client.post(f'/api/games/{game_id}/move', json={
+            'from_row': from_row, 'from_col': from_col, 'to_row': to_row, 'to_col': to_col})
+
+    white = chess_app.socketio.test_client(chess_app.app)
+    white.emit('join_game', {'game_id': game_id, 'color': 'white', 'version': 1})
+    (sync_name, sync), (joined_name, joined) = received(white)
+    assert sync_name == 'game_sync' and sync['type'] == 'delta' and sync['version'] == 3
+    assert [move['ply'] for move in sync['moves']] == [2, 3] and sync['current_player'] == 'black'
+    assert joined_name == 'player_joined' and joined['color'] == 'white'
+    assert joined['players']['white'] is not None
+
+    other = chess_app.socketio.test_client(chess_app.app)
+    other.emit('join_game', {'game_id': game_id, 'color': 'white'})
+    assert received(other) == [('error', {'message': 'Color already taken'})]
+    other.emit('join_game', {'game_id': 'missing'})
+    assert received(other) == [('error', {'message': 'Game not found'})]
+
+    other.emit('sync_game', {'game_id': game_id})
+    (name, snapshot), = received(other)
+    assert name == 'game_sync' and snapshot['type'] == 'snapshot' and snapshot['state']['ply'] == 3
+    other.emit('sync_game', {'game_id': game_id, 'version': 3})
+    assert received(other) == [('game_sync', {'type': 'delta', 'version': 3, 'moves': [],
+                                              'current_player': 'black', 'game_over': False})]
+    other.emit('sync_game', {'game_id': 'missing'})
+    assert received(other) == [('error', {'message': 'Game not found'})]
+    white.disconnect()
+    other.disconnect()
+
+
+def test_socket_make_move_ack():
+    """Test the make_move acknowledgement, the room's move_made and seat checks"""
+    game_id = chess_app.app.test_client().post('/api/games').get_json()['game_id']
+    white = chess_app.socketio.test_client(chess_app.app)
+    black = chess_app.socketio.test_client(chess_app.app)
+    white.emit('join_game', {'game_id': game_id, 'color': 'white'})
+    black.emit('join_game', {'game_id': game_id, 'color': 'black'})
+    white.get_received()
+    black.get_received()
+
+    e4 = {'game_id': game_id, 'from_row': 6, 'from_col': 4, 'to_row': 4, 'to_col': 4, 'version': 0}
+    ack = white.emit('make_move', e4, callback=True)
+    assert ack['success'] and ack['move']['version'] == 1 and ack['move']['to'] == [4, 4]
+    assert received(black) == [('move_made', ack['move'])]
+    assert received(white) == []            # the mover already has the delta
+
+    e5 = {'game_id': game_id, 'from_row': 1, 'from_col': 4, 'to_row': 3, 'to_col': 4}
+    assert white.emit('make_move', e5, callback=True) == {'success': False, 'message': 'Not your turn'}
+    assert white.emit('make_move', dict(e5, game_id='missing'), callback=True)['message'] == 'Game not found'
+    assert black.emit('make_move', e5, callback=True)['success']
+    white.disconnect()
+    black.disconnect()
+
+
+if __name__ == "__main__":
+    test_initial_position()
+    test_make_move_updates_view()
+    test_sliding_pieces_blocked()
+    test_legal_moves()
+    test_checkmate_ends_game()
+    test_check_and_pins()
+    test_draw_rules()
+    test_castling_and_en_passant()
+    test_promotion_defaults_to_queen()
+    test_zobrist_repetition()
+    test_unmake_move_restores_position()
+    test_undo_route()
+    test_versioned_sync()
+    test_join_and_sync_events()
+    test_socket_make_move_ack()
+    print("✅ All chess engine tests passed")
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Test script for spectator fan-out: coalescing, serialize-once writes and backpressure
+"""
+
+import queue
+import time
+
+import chess_app
+from chess_engine.fanout import SpectatorFanout
+
+
+class FakeManager:
+    def __init__(self, rooms):
+        self.rooms = {'/': rooms}
+
+    def get_participants(self, namespace, room):
+        yield from self.rooms[namespace].get(room, {}).items()
+
+
+class FakeSocket:
+    def __init__(self, backlog):
+        self.queue = queue.Queue()
+        for _ in range(backlog):
+            self.queue.put(None)
+
+
+class FakeEngineIO:
+    def __init__(self, sockets):
+        self.sockets = sockets
+
+
+class FakeServer:
+    """Records (eio_sid, packet) writes instead of sending them"""
+
+    def __init__(self, spectators, backlogs):
+        self.manager = FakeManager({SpectatorFanout.room('g'): spectators})
+        self.eio = FakeEngineIO({eio_sid: FakeSocket(backlog) for eio_sid, backlog in backlogs.items()})
+        self.writes = []
+
+    def _send_packet(self, eio_sid, pkt):
+        self.writes.append((eio_sid, pkt, pkt.encode()))
+
+
+def test_coalesces_and_encodes_once():
+    """Test that a burst becomes one frame, encoded once for every spectator"""
+    server = FakeServer({'s1': 'e1', 's2': 'e2', 's3': 'e3'}, {'e1': 0, 'e2': 3})
+    fanout = SpectatorFanout(server, interval=1.0)
+    for ply in range(1, 4):
+        fanout.publish('g', 'spectator_update', {'ply': ply})
+    fanout.publish('other', 'spectator_update', {'ply': 1})     # nobody watches it
+    assert server.writes == [] and fanout.coalesced == 2
+
+    fanout.flush()
+    assert [eio_sid for eio_sid, _, _ in server.writes] == ['e1', 'e2', 'e3']
+    packets = {id(pkt) for _, pkt, _ in server.writes}
+    encodings = {id(encoded) for _, _, encoded in server.writes}
+    assert len(packets) == 1 and len(encodings) == 1
+    assert server.writes[0][2] == '2["spectator_update",{"ply":3}]'
+    assert fanout.sent == 3 and fanout.take_pending() == {}
+
+    fanout.flush()
+    assert len(server.writes) == 3
+
+
+def test_slow_spectators_skip_frames():
+    """Test that a spectator with a backed-up send queue skips frames until it drains"""
+    server = FakeServer({'fast': 'e1', 'slow': 'e2'}, {'e1': 0, 'e2': 4})
+    fanout = SpectatorFanout(server, interval=0, max_backlog=4)
+    fanout.publish('g', 'spectator_update', {'ply': 1})
+    assert [eio_sid for eio_sid, _, _ in server.writes] == ['e1'] and fanout.dropped == 1
+
+    server.eio.sockets['e2'].queue.get()
+    fanout.publish('g', 'spectator_update', {'ply': 2})
+    assert [eio_sid for eio_sid, _, _ in server.writes] == ['e1', 'e1', 'e2']
+    assert server.writes[-1][2] == '2["spectator_update",{"ply":2}]'
+
+
+def test_relay_through_message_queue():
+    """Test that frames go through the relay instead of the local fan-out when one is set"""
+    relayed = []
+    server = FakeServer({'s1': 'e1'}, {})
+    fanout = SpectatorFanout(server, interval=1.0, relay=lambda *args: relayed.append(args))
+    fanout.publish('g', 'spectator_update', {'ply': 1})
+    fanout.publish('g', 'spectator_update', {'ply': 2})
+    fanout.flush()
+    assert relayed == [('spectator_update', {'ply': 2}, 'g:spectators')] and server.writes == []
+
+
+def test_first_frame_starts_the_flusher():
+    """Test that the flush task starts once, with the first queued frame"""
+    started = []
+    fanout = SpectatorFanout(FakeServer({}, {}), interval=1.0, start_flusher=started.append)
+    fanout.publish('g', 'spectator_update', {'ply': 1})
+    fanout.publish('h', 'spectator_update', {'ply': 1})
+    assert started == [fanout]
+
+
+def test_relay_without_local_watchers():
+    """Test that a worker with no watchers of its own still relays frames to other workers"""
+    relayed = []
+    original = chess_app.spectators
+    chess_app.spectators = SpectatorFanout(
+        chess_app.socketio.server, interval=0.05, relay=lambda *args: relayed.append(args),
+        start_flusher=lambda fanout: chess_app.socketio.start_background_task(chess_app.spectator_loop, fanout))
+    try:
+        client = chess_app.app.test_client()
+        game_id = client.post('/api/games').get_json()['game_id']
+        client.post(f'/api/games/{game_id}/move', json={'from_row': 6, 'from_col': 4, 'to_row': 4, 'to_col': 4})
+        deadline = time.monotonic() + 5
+        while not relayed and time.monotonic() < deadline:
+            time.sleep(0.01)
+        ((event, frame, room),) = relayed
+        assert event == 'spectator_update' and frame['ply'] == 1 and room == f'{game_id}:spectators'
+        assert chess_app.spectators.take_pending() == {}
+    finally:
+        chess_app.spectators = original
+
+
+def test_watch_game_events():
+    """Test that watchers get frames instead of the players' events"""
+    original = chess_app.spectators
+    chess_app.spectators = SpectatorFanout(chess_app.socketio.server, interval=0)
+    try:
+        client = chess_app.app.test_client()
+        game_id = client.post('/api/games').get_json()['game_id']
+        player = chess_app.socketio.test_client(chess_app.app)
+        watcher = chess_app.socketio.test_client(chess_app.app)
+        watcher.emit('watch_game', {'game_id': 'missing'})
+        assert watcher.get_received()[0]['args'][0] == {'message': 'Game not found'}
+        watcher.emit('watch_game', {'game_id': game_id})
+        (first,) = watcher.get_received()
+        assert first['name'] == 'spectator_update' and first['args'][0]['last_move'] is None
+
+        player.emit('join_game', {'game_id': game_id, 'color': 'white'})
+        client.post(f'/api/games/{game_id}/move', json={'from_row': 6, 'from_col': 4, 'to_row': 4, 'to_col': 4})
+        frames = [message['args'][0] for message in watcher.get_received()]
+        assert all(message['name'] == 'spectator_update' for message in watcher.get_received())
+        assert [frame['ply'] for frame in frames] == [0, 1]
+        assert frames[0]['players']['white'] is not None
+        assert frames[1]['last_move']['to'] == [4, 4] and frames[1]['current_player'] == 'black'
+
+        # With an interval, a burst reaches watchers as one frame on the next flush
+        chess_app.spectators.interval = 60
+        ack = player.emit('make_move', {'game_id': game_id, 'from_row': 1, 'from_col': 4,
+                                        'to_row': 3, 'to_col': 4}, callback=True)
+        assert ack['success']                        # black's seat is free
+        client.post(f'/api/games/{game_id}/move', json={'from_row': 7, 'from_col': 6, 'to_row': 5, 'to_col': 5})
+        assert watcher.get_received() == []
+        chess_app.spectators.flush()
+        (frame,) = [message['args'][0] for message in watcher.get_received()]
+        assert frame['ply'] == 3 and chess_app.spectators.coalesced == 1
+
+        watcher.emit('unwatch_game', {'game_id': game_id})
+        client.post(f'/api/games/{game_id}/move', json={'from_row': 1, 'from_col': 3, 'to_row': 3, 'to_col': 3})
+        chess_app.spectators.flush()
+        assert watcher.get_received() == []
+        player.disconnect()
+        watcher.disconnect()
+    finally:
+        chess_app.spectators = original
+
+
+if __name__ == "__main__":
+    test_coalesces_and_encodes_once()
+    test_slow_spectators_skip_frames()
+    test_relay_through_message_queue()
+    test_first_frame_starts_the_flusher()
+    test_relay_without_local_watchers()
+    test_watch_game_events()
+    print("✅ All spectator fan-out tests passed")
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Test script for the finished-game search indexes
+"""
+
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import chess_app
+from chess_engine import Position
+from chess_engine.archive import ArchivedGame
+from chess_engine.bitboard import STARTING_FEN
+from chess_engine.game_index import MemoryGameIndex, SqliteGameIndex, opening_key, opening_keys
+from chess_engine.movegen import play_move
+from chess_engine.notation import parse_san
+
+START = datetime(2024, 3, 1)
+SICILIAN = '1.e4 c5 2.Nf3 d6'
+SICILIAN_BY_TRANSPOSITION = '1.Nf3 d6 2.e4 c5'
+RUY_LOPEZ = '1.e4 e5 2.Nf3 Nc6 3.Bb5'
+
+
+def record(game_id, moves, result, termination, white, black, minute):
+    position = Position.from_fen(STARTING_FEN)
+    encoded = []
+    for token in moves.replace('1.', ' ').replace('2.', ' ').replace('3.', ' ').split():
+        move = parse_san(position, token)
+        play_move(position, move)
+        encoded.append(move)
+    # Players are found by their PGN names; the socket ids are not indexed
+    tags = {name: player for name, player in (('White', white), ('Black', black)) if player is not None}
+    return ArchivedGame(game_id, START + timedelta(minutes=minute), result, STARTING_FEN,
+                        {'white': f'{game_id}-sid', 'black': None}, tags, encoded, [0] * len(encoded),
+                        termination)
+
+
+RECORDS = [
+    record('g0', SICILIAN, '0-1', 'checkmate', 'alice', 'bob', 0),
+    record('g1', RUY_LOPEZ, '1-0', 'checkmate', 'bob', 'alice', 1),
+    record('g2', SICILIAN_BY_TRANSPOSITION, '1/2-1/2', 'stalemate', 'carol', 'alice', 2),
+    record('g3', SICILIAN, '1-0', 'checkmate', 'alice', 'carol', 3),
+    record('g4', RUY_LOPEZ, '0-1', 'checkmate', 'carol', None, 4),
+]
+
+
+def ids(page):
+    return [entry['id'] for entry in page[0]]
+
+
+def check_index(index):
+    index.add_all(RECORDS)
+    index.add(RECORDS[0])                                    # same entry again: no duplicate
+    assert 'g3' in index and 'missing' not in index
+    assert ids(index.search(player='g0-sid')) == []
+
+    sicilian = opening_key('1.e4 c5')
+    assert ids(index.search()) == ['g4', 'g3', 'g2', 'g1', 'g0']
+    assert ids(index.search(player='alice')) == ['g3', 'g2', 'g1', 'g0']
+    assert ids(index.search(player='alice', termination='checkmate', opening=sicilian)) == ['g3', 'g0']
+    assert ids(index.search(opening=opening_key('1.e4 c5 2.Nf3 d6'))) == ['g3', 'g2', 'g0']
+    assert ids(index.search(white='carol', result='0-1')) == ['g4']
+    assert ids(index.search(black='alice', result='1/2-1/2', termination='stalemate')) == ['g2']
+    assert ids(index.search(player='nobody')) == []
+    window = index.search(created_after=(START + timedelta(minutes=1)).isoformat(),
+                          created_before=(START + timedelta(minutes=4)).isoformat())
+    assert ids(window) == ['g3', 'g2']
+
+    page, cursor = index.search(player='alice', limit=3)
+    assert [entry['id'] for entry in page] == ['g3', 'g2', 'g1']
+    assert page[0] == {'id': 'g3', 'white': 'alice', 'black': 'carol', 'result': '1-0',
+                       'termination': 'checkmate', 'plies': 4, 'created_at': '2024-03-01T00:03:00'}
+    assert ids(index.search(player='alice', limit=3, cursor=cursor)) == ['g0']
+    assert index.search(player='alice', limit=3, cursor=cursor)[1] is None
+    try:
+        index.search(cursor='not a cursor')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("accepted a malformed cursor")
+
+    # g1 is taken back and ends differently; g4 is taken back for good
+    index.add(record('g1', SICILIAN, '1/2-1/2', 'repetition', 'bob', 'dave', 1))
+    index.remove('g4')
+    index.remove('missing')
+    assert ids(index.search()) == ['g3', 'g2', 'g1', 'g0']
+    assert ids(index.search(player='alice')) == ['g3', 'g2', 'g0']
+    assert ids(index.search(black='dave', termination='repetition', opening=sicilian)) == ['g1']
+    assert ids(index.search(opening=opening_key('1.e4 e5'))) == [] and 'g4' not in index
+
+
+def test_opening_keys():
+    """Test that transpositions share a key and that bad openings are rejected"""
+    assert opening_key('e4 c5 Nf3 d6') == opening_key(SICILIAN_BY_TRANSPOSITION)
+    assert opening_key('1.e4 c5') in opening_keys(RECORDS[0]) and len(opening_keys(RECORDS[1])) == 5
+    for bad in ('', '1.e5', ' '.join(['Nf3 Nf6 Ng1 Ng8'] * 5)):
+        try:
+            opening_key(bad)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"accepted opening '{bad}'")
+
+
+def test_indexes():
+    """Test equality, opening, range and cursor queries in both indexes"""
+    check_index(MemoryGameIndex())
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'games.db')
+        index = SqliteGameIndex(path)
+        check_index(index)
+        index.close()
+        reopened = SqliteGameIndex(path)
+        assert ids(reopened.search(player='bob')) == ['g1', 'g0']
+        reopened.close()
+
+
+def test_memory_index_is_bounded():
+    """Test that the in-memory index keeps only the newest games"""
+    index = MemoryGameIndex(max_games=3)
+    index.add_all(reversed(RECORDS))
+    assert len(index) == 3 and ids(index.search()) == ['g4', 'g3', 'g2']
+    assert ids(index.search(player='bob')) == [] and index._postings['player'].get('bob') is None
+
+
+def test_search_route():
+    """Test that games are indexed as they end and found through the search route"""
+    original = chess_app.game_index
+    chess_app.game_index = MemoryGameIndex()
+    try:
+        client = chess_app.app.test_client()
+        white = chess_app.socketio.test_client(chess_app.app)
+        game_id = client.post('/api/games').get_json()['game_id']
+        white.emit('join_game', {'game_id': game_id, 'color': 'white', 'player': '  '})
+        assert white.get_received()[0]['name'] == 'error'
+        white.emit('join_game', {'game_id': game_id, 'color': 'white', 'player': 'alice'})
+        for from_row, from_col, to_row, to_col in [(6, 5, 5, 5), (1, 4, 3, 4), (6, 6, 4, 6), (0, 3, 4, 7)]:
+            client.post(f'/api/games/{game_id}/move', json={
+                'from_row': from_row, 'from_col': from_col, 'to_row': to_row, 'to_col': to_col})
+        white.disconnect()
+
+        body = client.get('/api/search/games', query_string={
+            'player': 'alice', 'result': '0-1', 'termination': 'checkmate', 'opening': '1.f3 e5'}).get_json()
+        assert [entry['id'] for entry in body['games']] == [game_id] and body['next_cursor'] is None
+        assert body['games'][0]['white'] == 'alice' and body['games'][0]['black'] is None
+
+        # Taking the mate back drops the entry until the game ends again
+        client.post(f'/api/games/{game_id}/undo', json={'count': 1})
+        assert client.get('/api/search/games', query_string={'player': 'alice'}).get_json()['games'] == []
+        client.post(f'/api/games/{game_id}/move', json={'from_row': 0, 'from_col': 3, 'to_row': 4, 'to_col': 7})
+        assert len(client.get('/api/search/games', query_string={'player': 'alice'}).get_json()['games']) == 1
+        assert client.get('/api/search/games', query_string={'opening': '1.e4'}).get_json()['games'] == []
+        for query in ('result=win', 'termination=resigned', 'opening=1.e5', 'limit=0', 'cursor=bad',
+                      'created_after=yesterday'):
+            assert client.get(f'/api/search/games?{query}').status_code == 400, query
+    finally:
+        chess_app.game_index = original
+
+
+if __name__ == "__main__":
+    test_opening_keys()
+    test_indexes()
+    test_memory_index_is_bounded()
+    test_search_route()
+    print("✅ All game index tests passed")
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Test script for per-game locking and the expected_ply precondition
+"""
+
+import threading
+
+import chess_app
+from chess_engine.locks import GameLocks
+
+E2E4 = {'from_row': 6, 'from_col': 4, 'to_row': 4, 'to_col': 4}
+
+
+def new_game(client):
+    return client.post('/api/games').get_json()['game_id']
+
+
+def test_lock_registry():
+    """Test one reentrant lock per game, dropped once nobody holds it"""
+    locks = GameLocks()
+    lock = locks('a')
+    assert locks('a') is lock and locks('b') is not lock
+    with lock, locks('a'):
+        assert len(locks) == 1
+    del lock
+    assert len(locks) == 0
+
+
+def test_racing_moves_are_linearized():
+    """Test that of many threads moving from the same ply, exactly one wins"""
+    client = chess_app.app.test_client()
+    game_id = new_game(client)
+    barrier = threading.Barrier(8)
+    responses = []
+
+    def race():
+        barrier.wait()
+        response = chess_app.app.test_client().post(f'/api/games/{game_id}/move', json={**E2E4, 'expected_ply': 0})
+        responses.append((response.status_code, response.get_json()))
+
+    threads = [threading.Thread(target=race) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(status for status, _ in responses) == [200] + [409] * 7
+    for status, body in responses:
+        if status == 409:
+            assert body['message'] == chess_app.STALE_PLY_MESSAGE and body['ply'] == 1 and body['version'] == 1
+    state = client.get(f'/api/games/{game_id}').get_json()
+    assert len(state['move_history']) == 1 and state['current_player'] == 'black'
+
+
+def test_games_do_not_wait_on_each_other():
+    """Test that a held game lock blocks moves on that game only"""
+    client = chess_app.app.test_client()
+    busy, free = new_game(client), new_game(client)
+    statuses = {}
+
+    def move(game_id):
+        statuses[game_id] = chess_app.app.test_client().post(f'/api/games/{game_id}/move', json=E2E4).status_code
+
+    with chess_app.game_locks(busy):
+        blocked = threading.Thread(target=move, args=(busy,))
+        blocked.start()
+        other = threading.Thread(target=move, args=(free,))
+        other.start()
+        other.join(timeout=5)
+        assert statuses == {free: 200}
+        blocked.join(timeout=0.2)
+        assert blocked.is_alive()
+    blocked.join(timeout=5)
+    assert statuses == {free: 200, busy: 200}
+
+
+def test_reads_wait_for_the_lock():
+    """Test that state reads wait for a move in progress and missing games are 404s"""
+    client = chess_app.app.test_client()
+    game_id = new_game(client)
+    paths = ['', '/fen', '/pgn', '/book', '/tablebase']
+    statuses = {}
+
+    def read():
+        reader = chess_app.app.test_client()
+        for path in paths:
+            statuses[path] = reader.get(f'/api/games/{game_id}{path}').status_code
+
+    with chess_app.game_locks(game_id):
+        reader = threading.Thread(target=read)
+        reader.start()
+        reader.join(timeout=0.2)
+        assert reader.is_alive() and statuses == {}
+    reader.join(timeout=5)
+    assert statuses == {path: 200 for path in paths}
+
+    for route in ('engine_move', 'undo'):
+        assert client.post(f'/api/games/missing/{route}', json={}).status_code == 404
+
+
+def test_expected_ply_on_every_route():
+    """Test the precondition on REST moves, undo, engine moves and socket moves"""
+    client = chess_app.app.test_client()
+    game_id = new_game(client)
+    response = client.post(f'/api/games/{game_id}/move', json={**E2E4, 'expected_ply': 'one'})
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'expected_ply must be a non-negative integer'
+    response = client.post(f'/api/games/{game_id}/move', json={**E2E4, 'expected_ply': 0})
+    assert response.status_code == 200 and response.get_json()['ply'] == 1
+
+    response = client.post(f'/api/games/{game_id}/undo', json={'expected_ply': 0})
+    assert response.status_code == 409 and response.get_json()['ply'] == 1
+    response = client.post(f'/api/games/{game_id}/engine_move', json={'expected_ply': 0})
+    assert response.status_code == 409
+    response = client.post(f'/api/games/{game_id}/engine_move', json={'expected_ply': 1})
+    assert response.status_code == 200 and response.get_json()['ply'] == 2
+
+    socket = chess_app.socketio.test_client(chess_app.app)
+    ack = socket.emit('make_move', {'game_id': game_id, 'from_row': 6, 'from_col': 3, 'to_row': 4, 'to_col': 3,
+                                    'expected_ply': 1, 'version': 1}, callback=True)
+    assert not ack['success'] and ack['message'] == chess_app.STALE_PLY_MESSAGE
+    assert ack['sync']['type'] == 'delta' and [move['ply'] for move in ack['sync']['moves']] == [2]
+    ack = socket.emit('make_move', {'game_id': game_id, 'from_row': 6, 'from_col': 3, 'to_row': 4, 'to_col': 3,
+                                    'expected_ply': 2}, callback=True)
+    assert ack['success'] and ack['move']['ply'] == 3
+    response = client.post(f'/api/games/{game_id}/undo', json={'count': 3, 'expected_ply': 3})
+    assert response.status_code == 200 and response.get_json()['game_state']['move_history'] == []
+    socket.disconnect()
+
+
+def test_engine_search_runs_outside_the_lock():
+    """Test that a move landing during the engine's search voids the engine move"""
+    client = chess_app.app.test_client()
+    game_id = new_game(client)
+    original_search, original_pool = chess_app.search_position, chess_app.search_pool
+
+    def search_while_moving(position, difficulty, **kwargs):
+        # Another request plays while the engine thinks; the lock is not held here
+        assert client.post(f'/api/games/{game_id}/move', json=E2E4).status_code == 200
+        return original_search(position, 'easy', **kwargs)
+
+    chess_app.search_position, chess_app.search_pool = search_while_moving, None
+    try:
+        response = client.post(f'/api/games/{game_id}/engine_move', json={'use_book': False})
+    finally:
+        chess_app.search_position, chess_app.search_pool = original_search, original_pool
+    assert response.status_code == 409
+    assert response.get_json()['message'] == chess_app.SEARCH_CONFLICT_MESSAGE
+    assert response.get_json()['ply'] == 1
+
+
+if __name__ == "__main__":
+    test_lock_registry()
+    test_racing_moves_are_linearized()
+    test_games_do_not_wait_on_each_other()
+    test_reads_wait_for_the_lock()
+    test_expected_ply_on_every_route()
+    test_engine_search_runs_outside_the_lock()
+    print("✅ All locking tests passed")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test script for the matchmaking queue and the seek events
+"""
+
+import chess_app
+from chess_engine.matchmaking import MAX_RATING_BAND, MatchmakingQueue
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def sids(pairs):
+    return [(white.sid, black.sid) for white, black in pairs]
+
+
+def test_pairs_neighbours_within_band():
+    """Test rating-ordered pairing, pools per time control and colors by waiting time"""
+    clock = FakeClock()
+    queue = MatchmakingQueue(clock)
+    queue.add('a', 1500)
+    clock.now = 0.5
+    queue.add('b', 1580)
+    queue.add('c', 2000)
+    queue.add('d', 1540, '300+0')
+    queue.add('e', 1480, '300+2')
+    assert len(queue) == 5
+    assert sids(queue.tick()) == [('a', 'b')]
+    assert 'a' not in queue and 'c' in queue and len(queue) == 3
+
+    clock.now = 1.0
+    queue.add('f', 1990)
+    queue.add('g', 1560, '300+2')
+    assert sorted(sids(queue.tick())) == [('c', 'f'), ('e', 'g')]
+    assert list(queue._seekers) == ['d']
+
+
+def test_band_widens_with_waiting():
+    """Test that a distant pair matches once one of them has waited long enough"""
+    clock = FakeClock()
+    queue = MatchmakingQueue(clock)
+    queue.add('low', 1200)
+    queue.add('high', 1600)
+    assert queue.tick() == []
+    clock.now = 5.0                             # 100 + 5 * 50 = 350: still too far
+    assert queue.tick() == []
+    clock.now = 6.0
+    assert sids(queue.tick()) == [('low', 'high')]
+
+    queue.add('x', 100)
+    queue.add('y', 100 + MAX_RATING_BAND + 1)
+    clock.now = 1000.0
+    assert queue.tick() == [] and len(queue) == 2
+
+
+def test_replace_and_remove():
+    """Test that a second seek replaces the first and that removal finds its entry"""
+    queue = MatchmakingQueue(FakeClock())
+    for number, rating in enumerate((1500, 1500, 1700, 1500)):
+        queue.add(f'p{number}', rating)
+    queue.add('p2', 1900, '60+0')
+    assert queue.remove('p1') and not queue.remove('p1') and not queue.remove('nobody')
+    assert queue._pools[None] == [(1500, 0.0, 'p0'), (1500, 0.0, 'p3')]
+    assert sids(queue.tick()) == [('p0', 'p3')] and None not in queue._pools
+
+
+def test_seek_events_start_games():
+    """Test seek, cancel_seek and the automatic join of matched players"""
+    white = chess_app.socketio.test_client(chess_app.app)
+    black = chess_app.socketio.test_client(chess_app.app)
+    loner = chess_app.socketio.test_client(chess_app.app)
+
+    white.emit('seek', {'rating': 1234, 'time_control': '180'})
+    assert white.get_received() == [{'name': 'seeking', 'args': [{'rating': 1234, 'time_control': '180+0'}],
+                                     'namespace': '/'}]
+    loner.emit('seek', {'rating': 50})
+    assert loner.get_received()[0]['name'] == 'error'
+    loner.emit('seek', {})
+    loner.emit('cancel_seek')
+    assert [message['args'][0] for message in loner.get_received()][-1] == {'cancelled': True}
+
+    black.emit('seek', {'rating': 1250, 'time_control': '180+0', 'player': 'bob'})
+    black.get_received()
+    chess_app.run_matchmaking_tick()
+    found = {}
+    for name, client in (('white', white), ('black', black)):
+        events = {message['name']: message['args'][0] for message in client.get_received()}
+        assert events['game_sync']['type'] == 'snapshot'
+        # The earlier seeker plays white
+        assert events['match_found']['color'] == name
+        found[name] = events['match_found']
+    assert found['white']['game_id'] == found['black']['game_id']
+    assert found['white']['time_control'] == '180+0'
+
+    game = chess_app.games.get(found['white']['game_id'])
+    assert None not in game.players.values() and game.clock is not None
+    assert game.pgn_tags == {'Black': 'bob'}
+    ack = white.emit('make_move', {'game_id': game.game_id, 'from_row': 6, 'from_col': 4,
+                                   'to_row': 4, 'to_col': 4}, callback=True)
+    assert ack['success']
+    assert [message['name'] for message in black.get_received()] == ['move_made']
+
+    loner.emit('seek', {})
+    loner.disconnect()
+    assert len(chess_app.matchmaker) == 0
+    white.disconnect()
+    black.disconnect()
+
+
+if __name__ == "__main__":
+    test_pairs_neighbours_within_band()
+    test_band_widens_with_waiting()
+    test_replace_and_remove()
+    test_seek_events_start_games()
+    print("✅ All matchmaking tests passed")
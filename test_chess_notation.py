@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test script for FEN and PGN import/export
+"""
+
+import chess_app
+from chess_engine import ChessGame
+from chess_engine.bitboard import Position
+from chess_engine.notation import move_to_san, parse_san
+
+RUY_LOPEZ_PGN = """[Event "Test Match"]
+[White "Alice"]
+[Result "*"]
+
+1. e4 {best by test} e5 2.Nf3 (2. f4 exf4) Nc6 3. Bb5 a6 $1 4. Ba4 Nf6
+5. O-O Be7 6. Re1 b5 7. Bb3 d6 8. c3 O-O 9. h3 Nb8 10. d4 Nbd7 *
+"""
+
+
+def test_fen_round_trip():
+    """Test that games created from FEN export the same FEN"""
+    fen = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1'
+    game = ChessGame.from_fen('test', fen)
+    assert game.to_fen() == fen
+    assert len(game.legal_moves()) == 48
+    assert ChessGame('start').to_fen() == 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+
+def test_fen_setup_validation():
+    """Test that impossible setups are rejected"""
+    for fen in ['8/8/8/8/8/8/8/4K3 w - - 0 1', '4k3/8/8/8/8/8/4R3/4K3 w - - 0 1',
+                # Castling rights with no rook on h1, or with the king off e8
+                '4k3/8/8/8/8/8/8/4K3 w K - 0 1', 'r2k3r/8/8/8/8/8/8/R3K2R w q - 0 1',
+                # En passant squares on the wrong rank or with no pawn that just moved
+                '4k3/8/8/8/4P3/8/8/4K3 w - e3 0 1', '4k3/8/8/8/8/8/8/4K3 b - e3 0 1']:
+        try:
+            ChessGame.from_fen('test', fen)
+        except ValueError:
+            continue
+        raise AssertionError(f"accepted {fen}")
+
+
+def test_import_and_export_routes():
+    """Test the from_fen, from_pgn and pgn routes, including rejected input"""
+    client = chess_app.app.test_client()
+    response = client.post('/api/games/from_fen', json={'fen': '4k3/8/8/8/8/8/8/R3K3 w Q - 0 1'})
+    assert response.status_code == 200 and response.get_json()['fen'] == '4k3/8/8/8/8/8/8/R3K3 w Q - 0 1'
+    for body in ({'fen': '4k3/8/8/8/8/8/8/4K3 w K - 0 1'}, {'fen': 5}, {}):
+        response = client.post('/api/games/from_fen', json=body)
+        assert response.status_code == 400 and 'error' in response.get_json()
+
+    response = client.post('/api/games/from_pgn', json={'pgn': RUY_LOPEZ_PGN})
+    assert response.status_code == 200 and response.get_json()['moves'] == 20
+    game_id = response.get_json()['game_id']
+    response = client.post('/api/games/from_pgn', data=RUY_LOPEZ_PGN, content_type='application/x-chess-pgn')
+    assert response.status_code == 200
+    for body in ({'pgn': 5}, {'pgn': ['1. e4']}, {'pgn': '1. e4 e5 2. Ke3 *'}, {}):
+        response = client.post('/api/games/from_pgn', json=body)
+        assert response.status_code == 400 and 'error' in response.get_json()
+
+    response = client.get(f'/api/games/{game_id}/pgn')
+    assert response.status_code == 200 and response.mimetype == 'application/x-chess-pgn'
+    assert '[White "Alice"]' in response.get_data(as_text=True)
+    assert client.get('/api/games/missing/pgn').status_code == 404
+
+
+def test_san_disambiguation():
+    """Test SAN for ambiguous piece moves and promotions"""
+    position = Position.from_fen('4k3/1P6/8/8/8/8/8/R4RK1 w - - 0 1')
+    assert move_to_san(position, parse_san(position, 'Rad1')) == 'Rad1'
+    assert move_to_san(position, parse_san(position, 'b8=Q')) == 'b8=Q+'
+    position = Position.from_fen('4k3/8/8/8/8/8/8/R3K2R w KQ - 0 1')
+    assert move_to_san(position, parse_san(position, '0-0')) == 'O-O'
+    assert move_to_san(position, parse_san(position, 'Rhg1')) == 'Rg1'
+
+
+def test_pgn_round_trip():
+    """Test importing PGN with comments and variations, then exporting it"""
+    game = ChessGame.from_pgn('test', RUY_LOPEZ_PGN)
+    assert len(game.move_history) == 20
+    assert game.to_fen() == 'r1bq1rk1/2pnbppp/p2p1n2/1p2p3/3PP3/1BP2N1P/PP3PP1/RNBQR1K1 w - - 1 11'
+    pgn = game.to_pgn()
+    assert '[White "Alice"]' in pgn and '5. O-O Be7' in pgn
+    assert ChessGame.from_pgn('copy', pgn).to_fen() == game.to_fen()
+
+
+def test_pgn_rejects_illegal_moves():
+    """Test that an illegal move reports its move number"""
+    try:
+        ChessGame.from_pgn('test', '1. e4 e5 2. Ke3 *')
+    except ValueError as e:
+        assert 'Move 3' in str(e)
+    else:
+        raise AssertionError("accepted an illegal move")
+
+
+if __name__ == "__main__":
+    test_fen_round_trip()
+    test_fen_setup_validation()
+    test_import_and_export_routes()
+    test_san_disambiguation()
+    test_pgn_round_trip()
+    test_pgn_rejects_illegal_moves()
+    print("✅ All notation tests passed")
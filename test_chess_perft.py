@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Test script for the perft move generator suite
+"""
+
+from chess_engine.bitboard import Position
+from chess_engine.perft import REFERENCE_POSITIONS, divide, main, run_suite
+
+
+def test_reference_suite():
+    """Test every reference position against its published node counts"""
+    for result in run_suite(depth=2):
+        assert result.passed, result.to_dict()
+
+
+def test_divide_sums_to_perft():
+    """Test that per-move counts add up to the reference total"""
+    name, fen, counts = REFERENCE_POSITIONS[1]
+    assert sum(divide(Position.from_fen(fen), 2).values()) == counts[1]
+
+
+def test_cli_exit_code():
+    """Test that the CLI exits cleanly on a passing run"""
+    assert main(['--depth', '1']) == 0
+
+
+def test_invalid_fen_rejected():
+    """Test that malformed FENs raise ValueError"""
+    for fen in ['8/8/8 w - -', 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNX w KQkq - 0 1',
+                '8/8/8/8/8/8/8/8 x - - 0 1', '8/8/8/8/8/8/8/8 w - z9 0 1']:
+        try:
+            Position.from_fen(fen)
+        except ValueError:
+            continue
+        raise AssertionError(f"accepted {fen}")
+
+
+if __name__ == "__main__":
+    test_reference_suite()
+    test_divide_sums_to_perft()
+    test_cli_exit_code()
+    test_invalid_fen_rejected()
+    print("✅ All perft tests passed")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Test script for the server-side chess search engine
+"""
+
+import chess_app
+from chess_engine import ChessGame
+from chess_engine.movegen import move_to_uci
+from chess_engine.parallel import ParallelSearch, SharedTranspositionTable, create_parallel_search
+from chess_engine.search import EXACT, LOWER_BOUND, MATE_THRESHOLD, SearchEngine, TranspositionTable, search_position
+
+
+def scholars_mate_setup():
+    """Game where white has Qxf7# available"""
+    game = ChessGame('test')
+    for move in [(6, 4, 4, 4), (1, 4, 3, 4), (7, 5, 4, 2), (0, 1, 2, 2), (7, 3, 5, 5), (1, 0, 2, 0)]:
+        assert game.make_move(*move)[0]
+    return game
+
+
+def test_finds_mate_in_one():
+    """Test that the engine spots a mate in one"""
+    result = SearchEngine().search(scholars_mate_setup().position, 3)
+    assert move_to_uci(result.move) == 'f3f7'
+    assert result.score > MATE_THRESHOLD
+
+
+def test_search_is_deterministic():
+    """Test that depth-limited searches repeat exactly"""
+    game = ChessGame('test')
+    first = search_position(game.position, 'easy', time_limit=60)
+    second = search_position(game.position, 'easy', time_limit=60)
+    assert first.move == second.move and first.nodes == second.nodes
+    assert first.depth == 2
+
+
+def test_transposition_table_is_bounded():
+    """Test that the table never grows past its slot count"""
+    table = TranspositionTable(size=8)
+    for key in range(100):
+        table.store(key, 1, 0, 0, 0)
+    assert len(table.entries) == 8
+    assert table.probe(99) is not None
+
+
+def test_shared_transposition_table():
+    """Test packed entries, depth-preferred replacement and torn slots reading as misses"""
+    table = SharedTranspositionTable(size=8)
+    key = (1 << 63) + 5
+    table.store(key, 5, -MATE_THRESHOLD - 7, LOWER_BOUND, 0x7FFF)
+    assert table.probe(key) == (key, 5, -MATE_THRESHOLD - 7, LOWER_BOUND, 0x7FFF)
+    assert table.probe(key + 8) is None
+    table.store(key + 8, 4, 10, EXACT, 1)                   # same slot, shallower: kept out
+    assert table.probe(key + 8) is None and table.probe(key) is not None
+    table.store(key + 8, 5, 10, EXACT, 1)
+    assert table.probe(key + 8) == (key + 8, 5, 10, EXACT, 1) and table.probe(key) is None
+
+    index = ((key + 8) % 8) * 2
+    table.slots[index + 1] ^= 1 << 40                       # half of a concurrent write
+    assert table.probe(key + 8) is None
+    table.clear()
+    assert not any(table.slots)
+
+
+def test_parallel_search():
+    """Test that a Lazy SMP pool finds the mate, and falls back in-process while busy"""
+    assert create_parallel_search(1) is None
+    pool = ParallelSearch(2, tt_size=1 << 12)
+    try:
+        position = scholars_mate_setup().position
+        result = pool.search(position, 3, time_limit=30)
+        assert move_to_uci(result.move) == 'f3f7' and result.score > MATE_THRESHOLD
+        result = pool.search_position(ChessGame('test').position, 'easy', time_limit=30)
+        assert result.depth == 2 and result.nodes > 0
+        assert pool.tt.probe(ChessGame('test').position.zobrist) is not None
+
+        with pool._lock:
+            result = pool.search(position, 1)
+        assert move_to_uci(result.move) == 'f3f7'
+
+        original = chess_app.search_pool
+        chess_app.search_pool = pool
+        try:
+            client = chess_app.app.test_client()
+            game_id = client.post('/api/games').get_json()['game_id']
+            data = client.post(f'/api/games/{game_id}/engine_move',
+                               json={'difficulty': 'easy', 'use_book': False}).get_json()
+            assert data['success'] and data['search']['depth'] == 2
+        finally:
+            chess_app.search_pool = original
+    finally:
+        pool.close()
+    assert not any(process.is_alive() for process in pool._processes)
+
+
+def test_engine_move_route():
+    """Test that engine_move searches, plays and reports the move, and rejects bad requests"""
+    client = chess_app.app.test_client()
+    game_id = client.post('/api/games').get_json()['game_id']
+    for from_row, from_col, to_row, to_col in [(6, 4, 4, 4), (1, 4, 3, 4), (7, 5, 4, 2), (0, 1, 2, 2),
+                                               (7, 3, 5, 5), (1, 0, 2, 0)]:
+        assert client.post(f'/api/games/{game_id}/move', json={
+            'from_row': from_row, 'from_col': from_col, 'to_row': to_row, 'to_col': to_col}).status_code == 200
+
+    response = client.post(f'/api/games/{game_id}/engine_move', json={'difficulty': 'easy', 'use_book': False})
+    data = response.get_json()
+    assert response.status_code == 200 and data['success'] and not data['book']
+    assert (data['from'], data['to']) == ([5, 5], [1, 5]) and data['game_over']
+    assert data['search']['depth'] >= 1 and data['search']['move'] == 'f3f7'
+    assert client.get(f'/api/games/{game_id}').get_json()['version'] == 7
+
+    assert client.post(f'/api/games/{game_id}/engine_move', json={}).status_code == 400
+    assert client.post(f'/api/games/{game_id}/engine_move', json={'difficulty': 'grandmaster'}).status_code == 400
+    assert client.post('/api/games/missing/engine_move', json={}).status_code == 404
+
+
+if __name__ == "__main__":
+    test_finds_mate_in_one()
+    test_search_is_deterministic()
+    test_transposition_table_is_bounded()
+    test_shared_transposition_table()
+    test_parallel_search()
+    test_engine_move_route()
+    print("✅ All chess search tests passed")
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Test script for the memory and SQLite game stores
+"""
+
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import chess_app
+from chess_engine import ChessGame
+from chess_engine.store import MemoryGameStore, SqliteGameStore, create_game_store
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_memory_store_lru_and_ttl():
+    """Test LRU capacity and TTL eviction of idle and finished games"""
+    clock = FakeClock()
+    store = MemoryGameStore(max_games=2, idle_ttl=100, finished_ttl=10, clock=clock)
+    for game_id in ('a', 'b'):
+        store[game_id] = ChessGame(game_id)
+    assert store.get('a') is not None      # 'a' is now most recently used
+    store['c'] = ChessGame('c')
+    assert 'b' not in store and 'a' in store and 'c' in store
+
+    store.get('a').game_over = True
+    clock.now = 50
+    assert store.evict_expired() == 1
+    assert 'a' not in store and 'c' in store
+    clock.now = 500
+    assert store.evict_expired() == 1
+    assert len(store) == 0
+
+
+def test_sqlite_store_persists_moves():
+    """Test that moves, undos and players survive reopening the database"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'games.db')
+        store = SqliteGameStore(path)
+        game = ChessGame('g1')
+        store.add(game)
+        for move in [(6, 4, 4, 4), (1, 4, 3, 4), (7, 6, 5, 5)]:
+            assert game.make_move(*move)[0]
+            store.save_move(game)
+        game.unmake_move()
+        game.players['white'] = 'sid-1'
+        store.save(game)
+        fen = game.to_fen()
+        store.close()
+
+        reopened = SqliteGameStore(path)
+        loaded = reopened.get('g1')
+        assert loaded is not game
+        assert loaded.to_fen() == fen and len(loaded.move_history) == 2
+        assert loaded.players['white'] == 'sid-1'
+        assert loaded.version == game.version == 4 and loaded.undo_version == 4
+        assert [move['version'] for move in loaded.move_history] == [1, 2]
+        assert reopened.summaries()[0]['id'] == 'g1'
+        assert reopened.get('missing') is None
+        reopened.close()
+
+
+def check_listing(store):
+    start = datetime(2024, 1, 1)
+    for number in range(5):
+        game = ChessGame(f'g{number}')
+        game.created_at = start + timedelta(minutes=number)
+        store.add(game)
+    version = store.listing_version()
+
+    page, cursor = store.list_games(limit=2)
+    assert [summary['id'] for summary in page] == ['g4', 'g3']
+    page, cursor = store.list_games(limit=2, cursor=cursor)
+    assert [summary['id'] for summary in page] == ['g2', 'g1']
+    page, cursor = store.list_games(limit=2, cursor=cursor)
+    assert [summary['id'] for summary in page] == ['g0'] and cursor is None
+
+    game = store.get('g1')
+    game.players['white'] = 'sid-1'
+    store.save(game)
+    game = store.get('g2')
+    game.players = {'white': 'sid-2', 'black': 'sid-3'}
+    store.save(game)
+    game = store.get('g3')
+    game.game_over = True
+    store.save(game)
+    assert store.listing_version() != version
+
+    open_games, _ = store.list_games(open_seat='any')
+    assert [summary['id'] for summary in open_games] == ['g4', 'g1', 'g0']
+    assert open_games[1]['open_seats'] == ['black']
+    white_open, _ = store.list_games(open_seat='white')
+    assert [summary['id'] for summary in white_open] == ['g4', 'g0']
+    finished, _ = store.list_games(status='finished')
+    assert [summary['id'] for summary in finished] == ['g3']
+    window, _ = store.list_games(created_after=(start + timedelta(minutes=1)).isoformat(),
+                                 created_before=(start + timedelta(minutes=4)).isoformat())
+    assert [summary['id'] for summary in window] == ['g3', 'g2']
+
+    store.remove('g4')
+    assert store.list_games(open_seat='any', limit=1)[0][0]['id'] == 'g1'
+    try:
+        store.list_games(cursor='not a cursor')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("accepted a malformed cursor")
+
+
+def test_listing_pagination_and_filters():
+    """Test cursor pages and status/open-seat/time filters in both stores"""
+    check_listing(MemoryGameStore())
+    with tempfile.TemporaryDirectory() as directory:
+        store = SqliteGameStore(os.path.join(directory, 'games.db'))
+        check_listing(store)
+        store.close()
+
+
+def test_games_route():
+    """Test /api/games pages, filters, bad arguments and ETag revalidation"""
+    original = chess_app.games
+    chess_app.games = MemoryGameStore()
+    chess_app.listing_cache.clear()
+    try:
+        start = datetime(2024, 1, 1)
+        for number in range(3):
+            game = ChessGame(f'g{number}')
+            game.created_at = start + timedelta(minutes=number)
+            chess_app.games.add(game)
+        client = chess_app.app.test_client()
+
+        response = client.get('/api/games?limit=2')
+        body = response.get_json()
+        assert response.status_code == 200 and [game['id'] for game in body['games']] == ['g2', 'g1']
+        body = client.get('/api/games', query_string={'limit': 2, 'cursor': body['next_cursor']}).get_json()
+        assert [game['id'] for game in body['games']] == ['g0'] and body['next_cursor'] is None
+        body = client.get('/api/games', query_string={
+            'open_seat': 'white', 'created_before': (start + timedelta(minutes=1)).isoformat()}).get_json()
+        assert [game['id'] for game in body['games']] == ['g0']
+
+        for query in ('status=paused', 'open_seat=red', 'limit=0', 'limit=ten',
+                      'created_after=yesterday', 'cursor=not-a-cursor'):
+            assert client.get(f'/api/games?{query}').status_code == 400, query
+
+        etag = client.get('/api/games').headers['ETag']
+        assert client.get('/api/games', headers={'If-None-Match': etag}).status_code == 304
+        game = chess_app.games.get('g0')
+        game.game_over = True
+        chess_app.games.save(game)
+        response = client.get('/api/games?status=finished', headers={'If-None-Match': etag})
+        assert response.status_code == 200 and [game['id'] for game in response.get_json()['games']] == ['g0']
+    finally:
+        chess_app.games = original
+        chess_app.listing_cache.clear()
+
+
+def test_create_game_store():
+    """Test store selection from CHESS_GAME_STORE values"""
+    assert isinstance(create_game_store('memory'), MemoryGameStore)
+    try:
+        create_game_store('redis://localhost')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("accepted an unsupported store")
+
+
+if __name__ == "__main__":
+    test_memory_store_lru_and_ttl()
+    test_sqlite_store_persists_moves()
+    test_listing_pagination_and_filters()
+    test_games_route()
+    test_create_game_store()
+    print("✅ All game store tests passed")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Test script for endgame tablebase generation and probing
+"""
+
+import tempfile
+
+import chess_app
+from chess_engine import ChessGame, Position
+from chess_engine.movegen import move_to_uci
+from chess_engine.search import MATE_SCORE, MATE_THRESHOLD, search_position
+from chess_engine.tablebase import (
+    DEFAULT_TABLES, ILLEGAL, LOSS_BASE, Tablebase, build_tables, load_tablebase, material_signature,
+    table_index,
+)
+
+_directory = None
+
+
+def tables():
+    """Directory holding KQvK, KRvK and KPvK, built once (about 20s)"""
+    global _directory
+    if _directory is None:
+        _directory = tempfile.TemporaryDirectory()
+        build_tables(_directory.name)
+    return _directory.name
+
+
+def probe(tablebase, fen):
+    result = tablebase.probe(Position.from_fen(fen))
+    return result and (result.wdl, result.dtm)
+
+
+def test_signature_and_mirrored_index():
+    """Test signatures and that a color-swapped position maps onto the same entry"""
+    position = Position.from_fen('8/8/8/3k4/8/8/8/R3K3 w - - 0 1')
+    mirrored = Position.from_fen('r3k3/8/8/8/3K4/8/8/8 b - - 0 1')
+    assert material_signature(position) == 'KRvK'
+    assert material_signature(mirrored) == 'KvKR'
+    assert table_index(position) == table_index(mirrored, mirror=True)
+
+
+def test_longest_mates():
+    """Test the longest wins against the known maximum distances to mate"""
+    directory = tables()
+    for signature, longest in (('KQvK', 19), ('KRvK', 31), ('KPvK', 55)):
+        with open(f'{directory}/{signature}.tb', 'rb') as f:
+            values = f.read()
+        half = len(values) // 2
+        # Mate in 10, 16 and 28 moves for white to move; one ply more for black
+        assert max(value for value in values[:half] if value < LOSS_BASE) == longest
+        assert max(value - LOSS_BASE for value in values[half:] if LOSS_BASE <= value < ILLEGAL) == longest + 1
+
+
+def test_probe_known_positions():
+    """Test win/draw/loss and distance to mate for hand-checked positions"""
+    tablebase = Tablebase(tables())
+    assert tablebase.signatures == sorted(DEFAULT_TABLES) and tablebase.max_pieces == 3
+    assert probe(tablebase, 'k7/8/1K6/8/8/8/8/6Q1 w - - 0 1') == (1, 1)        # Qg8#
+    assert probe(tablebase, 'k7/1Q6/1K6/8/8/8/8/8 b - - 0 1') == (-1, 0)       # checkmated
+    assert probe(tablebase, 'k7/8/1K6/8/8/8/8/7R w - - 0 1') == (1, 1)         # Rh8#
+    assert probe(tablebase, 'k7/8/1K6/8/8/8/8/Q7 b - - 0 1') == (-1, 2)        # only Kb8
+    assert probe(tablebase, 'K7/8/1k6/8/8/8/8/q7 w - - 0 1') == (-1, 2)        # colors swapped
+    assert probe(tablebase, '4k3/4P3/4K3/8/8/8/8/8 b - - 0 1') == (0, None)    # stalemate
+    assert probe(tablebase, 'k7/P7/8/8/8/8/8/7K w - - 0 1') == (0, None)       # rook pawn
+    assert probe(tablebase, '8/8/8/8/8/8/3kP3/7K b - - 0 1') == (0, None)      # Kxe2
+    assert probe(tablebase, '4k3/8/4K3/4P3/8/8/8/8 w - - 0 1') == (1, 21)
+    assert probe(tablebase, '8/8/8/8/8/8/8/KBk5 w - - 0 1') == (0, None)       # no table needed
+    # An en passant square nobody can capture on does not matter; castling rights do
+    assert probe(tablebase, '8/8/8/8/4P3/8/8/k3K3 b - e3 0 1') == probe(tablebase, '8/8/8/8/4P3/8/8/k3K3 b - - 0 1')
+    assert tablebase.probe(Position.from_fen('4k3/8/8/8/8/8/8/R3K3 w Q - 0 1')) is None
+    assert tablebase.probe(Position.initial()) is None
+
+    move, result = tablebase.best_move(Position.from_fen('8/4P3/8/8/8/8/k7/4K3 w - - 0 1'))
+    assert move_to_uci(move) == 'e7e8q' and (result.wdl, result.dtm) == (1, 13)
+    tablebase.close()
+
+
+def test_game_and_search_use_tablebase():
+    """Test ChessGame.probe_tablebase and that the search answers from the tables"""
+    tablebase = load_tablebase(tables())
+    game = ChessGame.from_fen('tb', 'k7/8/1K6/8/8/8/8/7R w - - 0 1')
+    assert game.probe_tablebase(tablebase) == {
+        'wdl': 'win', 'dtm': 1, 'best_move': {'from': [7, 7], 'to': [0, 7], 'promotion': None}
+    }
+    assert ChessGame('start').probe_tablebase(tablebase) is None
+
+    result = search_position(game.position, 'easy', tablebase=tablebase)
+    assert result.tablebase and result.nodes == 0
+    assert move_to_uci(result.move) == 'h1h8' and result.score == MATE_SCORE - 1
+
+    # Four pieces are searched, with captures into KQvK scored from the table
+    position = Position.from_fen('8/8/8/8/8/3k4/1r6/KQ6 w - - 0 1')
+    result = search_position(position, 'easy', tablebase=tablebase)
+    assert not result.tablebase and move_to_uci(result.move)[2:] == 'b2'
+    assert result.score > MATE_THRESHOLD
+    assert load_tablebase(None) is None
+    tablebase.close()
+
+
+def test_tablebase_route():
+    """Test the tablebase route with and without tables loaded"""
+    client = chess_app.app.test_client()
+    game_id = client.post('/api/games/from_fen', json={'fen': 'k7/8/1K6/8/8/8/8/Q7 b - - 0 1'}).get_json()['game_id']
+    original = chess_app.tablebase
+    chess_app.tablebase = load_tablebase(tables())
+    try:
+        result = client.get(f'/api/games/{game_id}/tablebase').get_json()['result']
+        assert result == {'wdl': 'loss', 'dtm': 2, 'best_move': {'from': [0, 0], 'to': [0, 1], 'promotion': None}}
+        assert client.get('/api/games/missing/tablebase').status_code == 404
+        chess_app.tablebase.close()
+        chess_app.tablebase = None
+        assert client.get(f'/api/games/{game_id}/tablebase').get_json() == {'result': None}
+    finally:
+        chess_app.tablebase = original
+
+
+if __name__ == "__main__":
+    test_signature_and_mirrored_index()
+    test_longest_mates()
+    test_probe_known_positions()
+    test_game_and_search_use_tablebase()
+    test_tablebase_route()
+    print("✅ All tablebase tests passed")